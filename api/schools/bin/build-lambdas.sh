@@ -12,8 +12,8 @@ DIST_DIR="$ROOT_DIR/dist"
 mkdir -p $DIST_DIR
 
 # Define subdirectories for each Lambda and their corresponding zip names
-LAMBDA_DIRS=("get-school-by-id" "get-schools-by-district" "get-schools-nearby")
-LAMBDA_ZIPS=("get-school-by-id.zip" "get-schools-by-district.zip" "get-schools-nearby.zip")
+LAMBDA_DIRS=("get-school-by-id" "get-schools-by-district" "get-schools-nearby" "get-district-tile" "search-schools")
+LAMBDA_ZIPS=("get-school-by-id.zip" "get-schools-by-district.zip" "get-schools-nearby.zip" "get-district-tile.zip" "search-schools.zip")
 
 # Create a temporary directory for Lambda dependencies
 TMP_DIR="$ROOT_DIR/tmp_lambda_dir"
@@ -36,6 +36,9 @@ for i in "${!LAMBDA_DIRS[@]}"; do
   # Copy the Python file from the src directory to the temporary directory
   cp "$SRC_DIR/$LAMBDA_DIR/$LAMBDA_DIR.py" "$TMP_DIR/"
 
+  # Copy the modules shared by the schools service
+  cp "$SRC_DIR/shared/"*.py "$TMP_DIR/"
+
   # Create the zip file in the dist directory
   echo "Creating $ZIP_FILE..."
   cd "$TMP_DIR"
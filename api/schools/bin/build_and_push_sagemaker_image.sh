@@ -45,7 +45,7 @@ ECR_REPO="$AWS_ACCOUNT.dkr.ecr.$AWS_REGION.amazonaws.com/$IMAGE_NAME:$NEW_VERSIO
 
 # Build, tag, and push the Docker image
 echo "Building Docker image..."
-docker build -t "$IMAGE_NAME" .
+docker build -f src/sagemaker-school-district/dockerfile -t "$IMAGE_NAME" src
 
 echo "Tagging Docker image..."
 docker tag "$IMAGE_NAME:latest" "$ECR_REPO"
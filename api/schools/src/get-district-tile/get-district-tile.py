@@ -0,0 +1,190 @@
+from lambda_runtime import InitTimer, client
+init = InitTimer('get_district_tile')
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+from botocore.exceptions import BotoCoreError, ClientError
+from cache import TTLCache
+from instrumentation import NULL_TIMER, RequestTimer, get_logger, log_debug_json
+from serialization import accepted_encodings, header
+from tile_archive import COMPRESSION_GZIP, ROOT_FETCH_SIZE, TileArchiveReader, zxy_to_tile_id
+
+logger = get_logger("get-district-tile")
+init.mark('imports')
+
+# Initialize S3 client; tiles are read from the archive with byte-range requests
+s3 = client('s3')
+init.mark('clients')
+
+# Environment variables
+TILES_BUCKET = os.getenv('TILES_BUCKET')
+TILES_KEY = os.getenv('TILES_KEY', 'district_tiles.pmtiles')
+
+if not TILES_BUCKET:
+    raise ValueError("Environment variable TILES_BUCKET must be set")
+
+# How long browsers and CDNs may reuse a tile (max-age of the Cache-Control header)
+TILE_CACHE_SECONDS = int(os.getenv('TILE_CACHE_SECONDS', '86400'))
+
+# Warm-container cache of tile bytes, keyed by archive ETag and tile id
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '300'))
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', '2000'))
+
+# Highest zoom level accepted in a request, whatever the archive holds
+MAX_ZOOM = 22
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+TILE_SUFFIXES = ('.mvt', '.pbf')
+
+tile_cache = TTLCache(TILE_CACHE_SIZE, CACHE_TTL_SECONDS)
+archive = None
+init.emit()
+
+class TileArchive:
+    """The tile archive in S3, pinned to the ETag of the object it was opened from.
+
+    Opening it reads the header and root directory in one range request; later ranges are
+    conditional on the ETag, so a replaced archive fails with PreconditionFailed instead of
+    mixing directories and data from two files.
+    """
+
+    def __init__(self, timer=NULL_TIMER):
+        with timer.phase('s3_open'):
+            response = s3.get_object(Bucket=TILES_BUCKET, Key=TILES_KEY, Range=f'bytes=0-{ROOT_FETCH_SIZE - 1}')
+            self.etag = response['ETag']
+            self.head = response['Body'].read()
+        self.timer = timer
+        self.reader = TileArchiveReader(self.read_range)
+
+    def read_range(self, offset, length):
+        # The header and root directory, and often the metadata, are already in the first range
+        if offset + length <= len(self.head):
+            return self.head[offset:offset + length]
+
+        with self.timer.phase('s3_range'):
+            response = s3.get_object(
+                Bucket=TILES_BUCKET,
+                Key=TILES_KEY,
+                Range=f'bytes={offset}-{offset + length - 1}',
+                IfMatch=self.etag,
+            )
+            return response['Body'].read()
+
+    def get_tile(self, z, x, y, timer=NULL_TIMER):
+        """Return the tile's (stored bytes, response ETag), or None if the archive has no such tile."""
+        key = (self.etag, zxy_to_tile_id(z, x, y))
+        cached = tile_cache.get(key)
+        if cached is not None:
+            return cached or None
+
+        # The reader calls read_range without a timer, so range reads are timed against the current request
+        self.timer = timer
+        data = self.reader.get_tile(z, x, y)
+        result = None if data is None else (data, '"%s"' % hashlib.blake2b(data, digest_size=8).hexdigest())
+        # Missing tiles are cached too, as an empty tuple
+        tile_cache.put(key, result or ())
+        return result
+
+def get_tile(z, x, y, timer=NULL_TIMER):
+    """Read a tile, reopening the archive once if it was replaced since it was opened."""
+    global archive
+    if archive is None:
+        archive = TileArchive(timer)
+
+    try:
+        return archive.get_tile(z, x, y, timer)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'PreconditionFailed':
+            raise
+        logger.info("Tile archive was replaced, reopening it")
+        archive = TileArchive(timer)
+        return archive.get_tile(z, x, y, timer)
+
+def parse_tile_path(path_params):
+    """Return (z, x, y) from the path parameters, or raise ValueError."""
+    y = path_params.get('y') or ''
+    for suffix in TILE_SUFFIXES:
+        if y.endswith(suffix):
+            y = y[:-len(suffix)]
+            break
+
+    try:
+        z, x, y = int(path_params.get('z')), int(path_params.get('x')), int(y)
+    except (TypeError, ValueError):
+        raise ValueError('z, x and y must be integers.')
+
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < (1 << z) or not 0 <= y < (1 << z):
+        raise ValueError(f'Tile {z}/{x}/{y} does not exist.')
+    return z, x, y
+
+def lambda_handler(event, context):
+    # Log the incoming event for debugging
+    log_debug_json(logger, "Received event", event)
+    timer = RequestTimer('get_district_tile', logger=logger)
+
+    # Define CORS headers
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',  # Allow all origins
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',  # Allow specific HTTP methods
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization'  # Allow specific headers
+    }
+
+    try:
+        z, x, y = parse_tile_path(event.get('pathParameters') or {})
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': cors_headers,
+            'body': json.dumps({'error': str(e)})
+        }
+
+    try:
+        tile = get_tile(z, x, y, timer)
+        reader = archive.reader
+    except (BotoCoreError, ClientError, ValueError) as e:
+        logger.error(f"Error reading tile {z}/{x}/{y} from the tile archive: {e}")
+        return {
+            'statusCode': 500,
+            'headers': cors_headers,
+            'body': json.dumps({'error': 'Error reading tile'})
+        }
+
+    cache_headers = {'Cache-Control': f'public, max-age={TILE_CACHE_SECONDS}'}
+
+    # No tile within the archive's zoom levels means no districts there: an empty tile, not an error
+    if not tile:
+        in_range = reader.header['min_zoom'] <= z <= reader.header['max_zoom']
+        timer.emit(zoom=z, found=False)
+        return {
+            'statusCode': 204 if in_range else 404,
+            'headers': {**cors_headers, **cache_headers} if in_range else cors_headers,
+            'body': '' if in_range else json.dumps({'error': f'No tiles at zoom {z}.'})
+        }
+
+    data, etag = tile
+    headers = {**cors_headers, **cache_headers, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+    if header(event, 'If-None-Match') == etag:
+        timer.emit(zoom=z, found=True, not_modified=True)
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': ''
+        }
+
+    # Tiles are stored gzip-compressed and sent as they are to clients that accept gzip
+    if reader.tile_compression == COMPRESSION_GZIP:
+        if 'gzip' in accepted_encodings(event):
+            headers['Content-Encoding'] = 'gzip'
+        else:
+            data = gzip.decompress(data)
+
+    timer.emit(zoom=z, found=True, bytes=len(data))
+    return {
+        'statusCode': 200,
+        'headers': {**headers, 'Content-Type': MVT_CONTENT_TYPE},
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True
+    }
@@ -1,35 +1,127 @@
+from lambda_runtime import InitTimer, client
+init = InitTimer('get_school_by_id')
+
 import json
 import os
-import boto3
+import random
+import time
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from cache import DATA_VERSION_KEY
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import NULL_TIMER, RequestTimer, get_logger, log_debug_json
+from school_snapshot import SnapshotLoader, project
+from serialization import compress_response, deserialize_item, dumps
+
+logger = get_logger("get-school-by-id")
+init.mark('imports')
 
-# Initialize DynamoDB client (adjust as needed for your setup)
-dynamodb = boto3.resource('dynamodb')
+# Initialize DynamoDB client (adjust as needed for your setup); items are deserialized to native types
+dynamodb = client('dynamodb')
 table_name = os.environ['TABLE_NAME']  # Set this in Lambda's environment variables
-table = dynamodb.Table(table_name)
+init.mark('clients')
+
+# Most ids accepted by one batch request, and the BatchGetItem limit per call
+MAX_BATCH_IDS = int(os.getenv('MAX_BATCH_IDS', '300'))
+BATCH_GET_SIZE = 100
+
+# Attempts per BatchGetItem call while DynamoDB keeps returning UnprocessedKeys
+BATCH_GET_MAX_ATTEMPTS = 8
+
+# Serve reads from the columnar schools snapshot while it matches the table's data version
+USE_SCHOOLS_SNAPSHOT = os.getenv('USE_SCHOOLS_SNAPSHOT', 'false').lower() == 'true'
+
+# Directory holding the snapshot (a Lambda layer under /opt, or /tmp), and where it is downloaded from
+SCHOOLS_SNAPSHOT_DIR = os.getenv('SCHOOLS_SNAPSHOT_DIR', '/tmp/schools-snapshot')
+SCHOOLS_SNAPSHOT_BUCKET = os.getenv('SCHOOLS_SNAPSHOT_BUCKET')
+SCHOOLS_SNAPSHOT_KEY = os.getenv('SCHOOLS_SNAPSHOT_KEY', 'schools_snapshot.bin')
+
+# How often the seeder's data version stamp is re-read to decide whether the snapshot is current
+DATA_VERSION_CHECK_SECONDS = float(os.getenv('DATA_VERSION_CHECK_SECONDS', '60'))
 
-# Custom JSON encoder for handling Decimal objects
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)  # Convert Decimal to float
-        return super(DecimalEncoder, self).default(obj)
+schools_snapshot = None
+if USE_SCHOOLS_SNAPSHOT:
+    schools_snapshot = SnapshotLoader(
+        dynamodb, table_name, SCHOOLS_SNAPSHOT_DIR,
+        client('s3') if SCHOOLS_SNAPSHOT_BUCKET else None, SCHOOLS_SNAPSHOT_BUCKET, SCHOOLS_SNAPSHOT_KEY,
+        DATA_VERSION_CHECK_SECONDS, logger,
+    )
+    schools_snapshot.current()
+init.mark('snapshot')
+init.emit(snapshot=bool(schools_snapshot and schools_snapshot.fresh))
 
-def get_school_by_id(school_id):
+def get_school_by_id(school_id, timer=NULL_TIMER):
+    # The seeder's version stamp shares the table but isn't a school
+    if school_id == DATA_VERSION_KEY:
+        return None
     try:
         # Query DynamoDB for a school by school_id
-        response = table.get_item(
-            Key={'school_id': school_id}
-        )
-        return response.get('Item', None)
+        with timer.phase('dynamodb_get'):
+            response = dynamodb.get_item(
+                TableName=table_name,
+                Key={'school_id': {'S': school_id}}
+            )
+        item = response.get('Item')
+        return deserialize_item(item) if item else None
     except ClientError as e:
-        print(f"Error getting school from DynamoDB: {e}")
+        logger.error(f"Error getting school from DynamoDB: {e}")
         return None
 
+def batch_get_chunk(school_ids, fields):
+    """Fetch up to BATCH_GET_SIZE schools, retrying UnprocessedKeys with exponential backoff and jitter."""
+    request = {'Keys': [{'school_id': {'S': school_id}} for school_id in school_ids]}
+    if fields:
+        # The key is always projected so results can be matched back to the request
+        names = ['school_id'] + [field for field in fields if field != 'school_id']
+        request['ProjectionExpression'] = ', '.join(f'#f{i}' for i in range(len(names)))
+        request['ExpressionAttributeNames'] = {f'#f{i}': name for i, name in enumerate(names)}
+
+    items = []
+    request_items = {table_name: request}
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, min(1.0, 0.02 * 2 ** attempt)))
+
+        # Clients are thread-safe, so every chunk shares the module-level one
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        items.extend(response['Responses'].get(table_name, []))
+
+        request_items = response.get('UnprocessedKeys')
+        if not request_items:
+            return [deserialize_item(item) for item in items]
+
+    raise RuntimeError(f"BatchGetItem still has unprocessed keys after {BATCH_GET_MAX_ATTEMPTS} attempts")
+
+def get_schools_by_ids(school_ids, fields=None, timer=NULL_TIMER):
+    """Return the schools for school_ids in request order, with None for ids that don't exist."""
+    # The seeder's version stamp is never read, so it is reported missing like an unknown id
+    unique_ids = [school_id for school_id in dict.fromkeys(school_ids) if school_id != DATA_VERSION_KEY]
+    chunks = [unique_ids[i:i + BATCH_GET_SIZE] for i in range(0, len(unique_ids), BATCH_GET_SIZE)]
+    if not chunks:
+        return [None] * len(school_ids)
+
+    with timer.phase('dynamodb_batch_get'):
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            found = {item['school_id']: item for chunk in executor.map(lambda chunk: batch_get_chunk(chunk, fields), chunks) for item in chunk}
+
+    return [found.get(school_id) for school_id in school_ids]
+
+def snapshot_schools_json(snapshot, school_ids, fields, timer=NULL_TIMER):
+    """Return the JSON array of the schools for school_ids in request order (null for unknown ids) and the unknown ids."""
+    with timer.phase('snapshot_lookup'):
+        documents = [None if school_id == DATA_VERSION_KEY else snapshot.get(school_id) for school_id in school_ids]
+    missing = [school_id for school_id, document in zip(school_ids, documents) if document is None]
+
+    with timer.phase('serialization'):
+        if fields:
+            # The key is always included, as in the BatchGetItem projection
+            names = ['school_id'] + [field for field in fields if field != 'school_id']
+            return dumps([project(document, names) if document else None for document in documents]), missing
+        return '[' + ','.join(document or 'null' for document in documents) + ']', missing
+
 def lambda_handler(event, context):
     # Log the incoming event for debugging
-    print(f"Received event: {json.dumps(event)}")
+    log_debug_json(logger, "Received event", event)
+    timer = RequestTimer('get_school_by_id', logger=logger)
 
     # Define CORS headers
     cors_headers = {
@@ -44,20 +136,64 @@ def lambda_handler(event, context):
     # Check if school_id is in path params
     if 'school_id' in path_params and path_params['school_id']:
         school_id = path_params['school_id']
-        school = get_school_by_id(school_id)
-        if school:
-            return {
+        snapshot = schools_snapshot.current(timer) if schools_snapshot else None
+        if snapshot is not None:
+            # Documents are stored serialized, so a hit is returned as is
+            with timer.phase('snapshot_lookup'):
+                body = None if school_id == DATA_VERSION_KEY else snapshot.get(school_id)
+        else:
+            school = get_school_by_id(school_id, timer)
+            with timer.phase('serialization'):
+                body = dumps(school) if school else None
+
+        if body:
+            timer.emit()
+            return compress_response({
                 'statusCode': 200,
-                'body': json.dumps(school, cls=DecimalEncoder)
-            }
+                'body': body
+            }, event)
         else:
             return {
                 'statusCode': 404,
-                'body': json.dumps({'error': 'School not found'}, cls=DecimalEncoder)
+                'body': json.dumps({'error': 'School not found'})
             }
     
+    # Batch request: ?ids=<id>,<id>,...&fields=<field>,<field>,...
+    query_params = event.get('queryStringParameters', {}) or {}
+    if query_params.get('ids'):
+        school_ids = [school_id for school_id in query_params['ids'].split(',') if school_id]
+        fields = [field for field in query_params.get('fields', '').split(',') if field]
+        if not school_ids or len(school_ids) > MAX_BATCH_IDS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Provide between 1 and {MAX_BATCH_IDS} ids per request.'})
+            }
+
+        snapshot = schools_snapshot.current(timer) if schools_snapshot else None
+        if snapshot is not None:
+            schools_json, missing = snapshot_schools_json(snapshot, school_ids, fields, timer)
+            body = f'{{"schools":{schools_json},"missing":{dumps(missing)}}}'
+        else:
+            try:
+                schools = get_schools_by_ids(school_ids, fields, timer)
+            except (ClientError, RuntimeError) as e:
+                logger.error(f"Error getting schools from DynamoDB: {e}")
+                return {
+                    'statusCode': 500,
+                    'body': json.dumps({'error': 'Error getting schools'})
+                }
+
+            missing = [school_id for school_id, school in zip(school_ids, schools) if school is None]
+            with timer.phase('serialization'):
+                body = dumps({'schools': schools, 'missing': missing})
+        timer.emit(requested=len(school_ids), missing=len(missing))
+        return compress_response({
+            'statusCode': 200,
+            'body': body
+        }, event)
+
     # If school_id is not provided
     return {
         'statusCode': 400,
-        'body': json.dumps({'error': 'Invalid request. Please provide school_id.'}, cls=DecimalEncoder)
+        'body': json.dumps({'error': 'Invalid request. Please provide school_id or ids.'})
     }
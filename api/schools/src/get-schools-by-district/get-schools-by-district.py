@@ -1,37 +1,64 @@
+from lambda_runtime import InitTimer, client
+init = InitTimer('get_schools_by_district')
+
 import json
 import os
-import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+from district_query import parse_page_params, query_district_json, snapshot_district_json
+from instrumentation import NULL_TIMER, RequestTimer, get_logger, log_debug_json
+from school_snapshot import SnapshotLoader
+from serialization import compress_response
+
+logger = get_logger("get-schools-by-district")
+init.mark('imports')
 
-# Initialize DynamoDB client (adjust as needed for your setup)
-dynamodb = boto3.resource('dynamodb')
+# Initialize DynamoDB client (adjust as needed for your setup); items are deserialized to native types
+dynamodb = client('dynamodb')
 table_name = os.environ['TABLE_NAME']  # Set this in Lambda's environment variables
-table = dynamodb.Table(table_name)
+init.mark('clients')
+
+# Serve reads from the columnar schools snapshot while it matches the table's data version
+USE_SCHOOLS_SNAPSHOT = os.getenv('USE_SCHOOLS_SNAPSHOT', 'false').lower() == 'true'
+
+# Directory holding the snapshot (a Lambda layer under /opt, or /tmp), and where it is downloaded from
+SCHOOLS_SNAPSHOT_DIR = os.getenv('SCHOOLS_SNAPSHOT_DIR', '/tmp/schools-snapshot')
+SCHOOLS_SNAPSHOT_BUCKET = os.getenv('SCHOOLS_SNAPSHOT_BUCKET')
+SCHOOLS_SNAPSHOT_KEY = os.getenv('SCHOOLS_SNAPSHOT_KEY', 'schools_snapshot.bin')
+
+# How often the seeder's data version stamp is re-read to decide whether the snapshot is current
+DATA_VERSION_CHECK_SECONDS = float(os.getenv('DATA_VERSION_CHECK_SECONDS', '60'))
 
-# Custom JSON encoder for handling Decimal objects
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)  # Convert Decimal to float
-        return super(DecimalEncoder, self).default(obj)
+schools_snapshot = None
+if USE_SCHOOLS_SNAPSHOT:
+    schools_snapshot = SnapshotLoader(
+        dynamodb, table_name, SCHOOLS_SNAPSHOT_DIR,
+        client('s3') if SCHOOLS_SNAPSHOT_BUCKET else None, SCHOOLS_SNAPSHOT_BUCKET, SCHOOLS_SNAPSHOT_KEY,
+        DATA_VERSION_CHECK_SECONDS, logger,
+    )
+    schools_snapshot.current()
+init.mark('snapshot')
+init.emit(snapshot=bool(schools_snapshot and schools_snapshot.fresh))
+
+def get_schools_by_district(district_id, fields=None, limit=None, cursor=None, timer=NULL_TIMER):
+    """Return (count, JSON array, next cursor) for the schools of a district, or None on a DynamoDB error."""
+    # Read the snapshot while it is current, and DynamoDB otherwise
+    snapshot = schools_snapshot.current(timer) if schools_snapshot else None
+    if snapshot is not None:
+        return snapshot_district_json(snapshot, district_id, fields, limit, cursor, timer)
 
-def get_schools_by_district(district_id):
     try:
-        # Query the DistrictIndex to get schools by district_id
-        response = table.query(
-            IndexName='DistrictIndex',  # Specify the GSI name
-            KeyConditionExpression=Key('district_id').eq(district_id)
-        )
-        return response.get('Items', [])  # Return the list of schools
+        # Query the DistrictIndex page by page to get schools by district_id; cursors are tied to the
+        # table's data version when the snapshot loader has read it
+        data_version = schools_snapshot.table_version if schools_snapshot else None
+        return query_district_json(dynamodb, table_name, district_id, fields, limit, cursor, timer, data_version)
     except ClientError as e:
-        print(f"Error querying DynamoDB: {e}")
+        logger.error(f"Error querying DynamoDB: {e}")
         return None
 
 def lambda_handler(event, context):
     # Log the incoming event for debugging
-    print(f"Received event: {json.dumps(event)}")
+    log_debug_json(logger, "Received event", event)
+    timer = RequestTimer('get_schools_by_district', logger=logger)
 
     # Get query parameters from the event
     query_params = event.get('queryStringParameters', {}) or {}  # Default to empty dictionary if not present
@@ -39,20 +66,36 @@ def lambda_handler(event, context):
     # Check if district_id is in query params
     if 'district_id' in query_params and query_params['district_id']:
         district_id = query_params['district_id']
-        schools = get_schools_by_district(district_id)
-        if schools:
+        try:
+            limit, cursor, fields = parse_page_params(query_params)
+            result = get_schools_by_district(district_id, fields, limit, cursor, timer)
+        except ValueError as e:
             return {
-                'statusCode': 200,
-                'body': json.dumps(schools, cls=DecimalEncoder)
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)})
             }
+
+        # Without limit or cursor every page is returned as a plain list, as before pagination
+        paginated = limit is not None or cursor is not None
+        if result is not None and (result[0] or paginated):
+            count, schools_json, next_cursor = result
+            if paginated:
+                body = f'{{"schools":{schools_json},"next_cursor":{json.dumps(next_cursor)}}}'
+            else:
+                body = schools_json
+            timer.emit(schools=count)
+            return compress_response({
+                'statusCode': 200,
+                'body': body
+            }, event)
         else:
             return {
                 'statusCode': 404,
-                'body': json.dumps({'error': 'District not found or no schools in district'}, cls=DecimalEncoder)
+                'body': json.dumps({'error': 'District not found or no schools in district'})
             }
     
     # If district_id is not provided
     return {
         'statusCode': 400,
-        'body': json.dumps({'error': 'Invalid request. Please provide district_id.'}, cls=DecimalEncoder)
+        'body': json.dumps({'error': 'Invalid request. Please provide district_id.'})
     }
@@ -1,14 +1,26 @@
+from lambda_runtime import InitTimer, client
+init = InitTimer('get_schools_nearby')
+
 import os
-import boto3
+import math
+import time
 import json
 from botocore.exceptions import BotoCoreError, ClientError
-from decimal import Decimal
+from cache import DATA_VERSION_KEY, TTLCache
+from district_query import parse_page_params, query_district_json
+from instrumentation import RequestTimer, get_logger, log_debug_json
+from proximity_query import parse_proximity_params, search_nearby
+from serialization import compress_response, dumps
+
+logger = get_logger("get-schools-nearby")
+init.mark('imports')
 
 # Initialize SageMaker Runtime client
-sagemaker_runtime = boto3.client('sagemaker-runtime')
+sagemaker_runtime = client('sagemaker-runtime')
 
-# Initialize the database client
-dynamodb = boto3.resource('dynamodb')
+# Initialize the database client; items are deserialized to native types
+dynamodb = client('dynamodb')
+init.mark('clients')
 
 # Environment variables
 SAGEMAKER_ENDPOINT_NAME = os.getenv('SAGEMAKER_ENDPOINT_NAME')
@@ -17,6 +29,76 @@ TABLE_NAME = os.getenv('TABLE_NAME')
 if not SAGEMAKER_ENDPOINT_NAME or not TABLE_NAME:
     raise ValueError("Environment variables SAGEMAKER_ENDPOINT_NAME and TABLE_NAME must be set")
 
+# Resolve districts in-process from the district grid, calling SageMaker only for border points
+LOCAL_DISTRICT_LOOKUP = os.getenv('LOCAL_DISTRICT_LOOKUP', 'false').lower() == 'true'
+
+# Directory holding the district grid and records (a Lambda layer under /opt, or /tmp)
+DISTRICT_DATA_DIR = os.getenv('DISTRICT_DATA_DIR', '/tmp/district-data')
+
+# Bucket the district data is downloaded from at init when it isn't in DISTRICT_DATA_DIR
+DISTRICT_DATA_BUCKET = os.getenv('DISTRICT_DATA_BUCKET')
+DISTRICT_GRID_KEY = os.getenv('DISTRICT_GRID_KEY', 'district_grid.bin')
+DISTRICT_RECORDS_KEY = os.getenv('DISTRICT_RECORDS_KEY', 'district_records.json')
+
+# Warm-container caches: quantized lat/lng cell -> district record, and GEOID -> serialized schools
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '300'))
+DISTRICT_CACHE_SIZE = int(os.getenv('DISTRICT_CACHE_SIZE', '10000'))
+SCHOOLS_CACHE_SIZE = int(os.getenv('SCHOOLS_CACHE_SIZE', '1000'))
+
+# Geohash cells whose schools are kept for radius and k-nearest searches
+CELLS_CACHE_SIZE = int(os.getenv('CELLS_CACHE_SIZE', '5000'))
+
+# Decimal places coordinates are rounded to for the district cache (4 is roughly 11 m)
+CACHE_COORDINATE_DECIMALS = int(os.getenv('CACHE_COORDINATE_DECIMALS', '4'))
+
+# How often the seeder's data version stamp is re-read; a new stamp clears both caches
+DATA_VERSION_CHECK_SECONDS = float(os.getenv('DATA_VERSION_CHECK_SECONDS', '60'))
+
+district_cache = TTLCache(DISTRICT_CACHE_SIZE, CACHE_TTL_SECONDS)
+schools_cache = TTLCache(SCHOOLS_CACHE_SIZE, CACHE_TTL_SECONDS)
+cells_cache = TTLCache(CELLS_CACHE_SIZE, CACHE_TTL_SECONDS)
+data_version = None
+data_version_checked_at = float('-inf')
+
+def load_district_lookup():
+    """Load the district grid and records, or return None to resolve every point with SageMaker."""
+    if not LOCAL_DISTRICT_LOOKUP:
+        return None
+
+    # The grid needs numpy, which is only imported when the local lookup is enabled
+    from district_grid import DistrictGrid
+
+    start_time = time.perf_counter()
+    try:
+        paths = []
+        for key in (DISTRICT_GRID_KEY, DISTRICT_RECORDS_KEY):
+            path = os.path.join(DISTRICT_DATA_DIR, os.path.basename(key))
+            if not os.path.exists(path):
+                if not DISTRICT_DATA_BUCKET:
+                    raise FileNotFoundError(f"{path} not found and DISTRICT_DATA_BUCKET is not set")
+                os.makedirs(DISTRICT_DATA_DIR, exist_ok=True)
+                client('s3').download_file(DISTRICT_DATA_BUCKET, key, f"{path}.partial")
+                os.replace(f"{path}.partial", path)
+            paths.append(path)
+
+        grid = DistrictGrid.load(paths[0])
+        with open(paths[1]) as records_file:
+            records = json.load(records_file)
+
+        # Grid labels are row positions, so both files must come from the same build
+        if grid.num_districts != len(records):
+            raise ValueError(f"District grid covers {grid.num_districts} districts but there are {len(records)} records")
+    except Exception:
+        logger.exception("Local district lookup disabled, resolving every point with SageMaker")
+        return None
+
+    logger.info(f"Loaded {len(records)} districts for local lookup in {time.perf_counter() - start_time:.2f}s")
+    return grid, records
+
+district_lookup = load_district_lookup()
+init.mark('district_data')
+init.emit(local_lookup=district_lookup is not None)
+
 ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "https://dev.fourhorizonsed.com",
@@ -24,28 +106,77 @@ ALLOWED_ORIGINS = [
     "https://app.fourhorizonsed.com",
 ]
 
-# Custom JSON encoder for handling Decimal objects
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)  # Convert Decimal to float
-        return super(DecimalEncoder, self).default(obj)
-
 def validate_origin(origin):
     """Validates if the request origin is allowed."""
     if origin in ALLOWED_ORIGINS:
         return origin
     raise ValueError("Origin not allowed.")
 
+def check_data_version(timer):
+    """Clear the caches when the seeder has stamped a new data version since the last check."""
+    global data_version, data_version_checked_at
+
+    now = time.monotonic()
+    if now - data_version_checked_at < DATA_VERSION_CHECK_SECONDS:
+        return
+    data_version_checked_at = now
+
+    try:
+        with timer.phase('data_version_check'):
+            item = dynamodb.get_item(TableName=TABLE_NAME, Key={'school_id': {'S': DATA_VERSION_KEY}}).get('Item', {})
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Could not read the data version, keeping cached entries: {str(e)}")
+        return
+
+    version = item.get('data_version', {}).get('S')
+    if version != data_version:
+        if data_version is not None:
+            logger.info(f"Data version changed from {data_version} to {version}, clearing caches")
+        district_cache.clear()
+        schools_cache.clear()
+        cells_cache.clear()
+        data_version = version
+
+def resolve_district(lat, lng, timer):
+    """Return the district record containing the point ({} if none) and where it was resolved."""
+    if district_lookup is not None:
+        grid, records = district_lookup
+        with timer.phase('local_lookup'):
+            idx = grid.lookup(lat, lng)
+        if idx >= 0:
+            return records[idx], 'local'
+        if idx == grid.OUTSIDE:
+            return {}, 'local'
+
+    # Points in the same small cell almost always share a district, so reuse earlier answers
+    cell = (round(lat, CACHE_COORDINATE_DECIMALS), round(lng, CACHE_COORDINATE_DECIMALS))
+    result = district_cache.get(cell)
+    if result is not None:
+        return result, 'cache'
+
+    # Border points (and every point without the local data) need the exact polygon test
+    with timer.phase('sagemaker_call'):
+        response = sagemaker_runtime.invoke_endpoint(
+            EndpointName=SAGEMAKER_ENDPOINT_NAME,
+            ContentType='application/json',
+            Body=json.dumps({'lat': lat, 'lng': lng})
+        )
+        # Parse SageMaker response
+        result = json.loads(response['Body'].read().decode('utf-8'))
+
+    district_cache.put(cell, result)
+    return result, 'sagemaker'
+
 def lambda_handler(event, context):
     # Log the incoming event for debugging
-    print(f"Received event: {json.dumps(event)}")
+    log_debug_json(logger, "Received event", event)
+    timer = RequestTimer('get_schools_nearby', logger=logger)
 
     try:
         # Validate origin
         origin = event.get('headers', {}).get('origin')
         if not origin:
-            print('Origin header is missing.')
+            logger.warning('Origin header is missing.')
             return {
                 'statusCode': 400,
                 'headers': {
@@ -59,7 +190,7 @@ def lambda_handler(event, context):
         try:
             allowed_origin = validate_origin(origin)
         except ValueError as e:
-            print(json.dumps({'error': str(e)}))
+            logger.warning(str(e))
             return {
                 'statusCode': 403,
                 'headers': {
@@ -72,7 +203,7 @@ def lambda_handler(event, context):
 
         # Handle CORS preflight request
         if event['httpMethod'] == 'OPTIONS':
-            print('Handle CORS preflight request')
+            logger.debug('Handle CORS preflight request')
             return {
                 'statusCode': 200,
                 'headers': {
@@ -89,7 +220,7 @@ def lambda_handler(event, context):
         lng = query_params.get('lng')
 
         if not lat or not lng:
-            print(json.dumps({'error': 'Missing query parameters: lat and lng are required'}))
+            logger.warning('Missing query parameters: lat and lng are required')
             return {
                 'statusCode': 400,
                 'headers': {
@@ -100,24 +231,68 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing query parameters: lat and lng are required'})
             }
 
-        # Convert lat and lng to float
-        lat = float(lat)
-        lng = float(lng)
+        # radius_km or k asks for the schools closest to the point instead of those in its district
+        proximity = 'radius_km' in query_params or 'k' in query_params
 
-        # Call the SageMaker endpoint
-        payload = {'lat': lat, 'lng': lng}
-        response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=SAGEMAKER_ENDPOINT_NAME,
-            ContentType='application/json',
-            Body=json.dumps(payload)
-        )
-        # Parse SageMaker response
-        result = json.loads(response['Body'].read().decode('utf-8'))
+        # Coordinates, then optional pagination (limit, cursor) and field selection (fields) of the schools
+        try:
+            try:
+                lat, lng = float(lat), float(lng)
+            except ValueError:
+                raise ValueError('lat and lng must be numbers.')
+            if not (math.isfinite(lat) and math.isfinite(lng) and abs(lat) <= 90 and abs(lng) <= 180):
+                raise ValueError('lat must be between -90 and 90, and lng between -180 and 180.')
+
+            limit, cursor, fields = parse_page_params(query_params)
+            if proximity:
+                radius_km, k = parse_proximity_params(query_params)
+                # Results are ranked by distance from one point, so there is no next page to continue
+                if cursor is not None:
+                    raise ValueError('cursor is not supported with radius_km or k. Use limit, k or a smaller radius_km.')
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': allowed_origin,
+                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
+        paginated = limit is not None or cursor is not None
+
+        check_data_version(timer)
+
+        if proximity:
+            schools, searched_radius, truncated = search_nearby(dynamodb, TABLE_NAME, lat, lng, radius_km, k, fields, cells_cache, timer, limit)
+            with timer.phase('serialization'):
+                body = dumps({'documents': schools, 'radius_km': searched_radius, 'truncated': truncated})
+            logger.debug("Response body: %s", body)
+            timer.emit(
+                search='proximity',
+                schools=len(schools),
+                radius_km=searched_radius,
+                truncated=truncated,
+                **cells_cache.stats('cells_cache'),
+            )
+
+            return compress_response({
+                'statusCode': 200,
+                'headers': {
+                    'Access-Control-Allow-Origin': allowed_origin,
+                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+                },
+                'body': body
+            }, event)
+
+        # Resolve the district locally, from the cache, or with the SageMaker endpoint
+        result, source = resolve_district(lat, lng, timer)
 
         # Extract GEOID
         geoid = result.get('GEOID')
         if not geoid:
-            print(json.dumps({'error': 'No matching district found'}))
+            logger.info(f"No matching district found for ({lat}, {lng})")
             return {
                 'statusCode': 404,
                 'headers': {
@@ -128,34 +303,55 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'No matching district found'})
             }
 
-        # Query documents using GEOID
-        table = dynamodb.Table(TABLE_NAME)
-        db_response = table.query(
-            IndexName='DistrictIndex',  # Adjust to your index name if applicable
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('district_id').eq(geoid)
-        )
+        # Reuse the serialized schools of the district, or query every page of them using GEOID.
+        # Pages and projections are queried directly, since the cache only holds full districts.
+        if paginated or fields:
+            try:
+                school_count, documents_json, next_cursor = query_district_json(dynamodb, TABLE_NAME, geoid, fields, limit, cursor, timer, data_version)
+            except ValueError as e:
+                # A cursor issued for another district, or before the data version changed
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Access-Control-Allow-Origin': allowed_origin,
+                        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+        else:
+            cached = schools_cache.get(geoid)
+            if cached is None:
+                count, documents_json, _ = query_district_json(dynamodb, TABLE_NAME, geoid, timer=timer)
+                cached = (count, documents_json)
+                schools_cache.put(geoid, cached)
+            school_count, documents_json = cached
 
-        documents = db_response.get('Items', [])
-        print(json.dumps({
-                'district': result,
-                'documents': documents
-            }, cls=DecimalEncoder))
+        # Serialize the response body once and log it only at DEBUG level
+        with timer.phase('serialization'):
+            body = f'{{"district":{dumps(result)},"documents":{documents_json}'
+            body += f',"next_cursor":{dumps(next_cursor)}}}' if paginated else '}'
+        logger.debug("Response body: %s", body)
+        timer.emit(
+            district_id=geoid,
+            district_source=source,
+            schools=school_count,
+            **district_cache.stats('district_cache'),
+            **schools_cache.stats('schools_cache'),
+        )
 
-        return {
+        return compress_response({
             'statusCode': 200,
             'headers': {
                     'Access-Control-Allow-Origin': allowed_origin,
                     'Access-Control-Allow-Methods': 'GET, OPTIONS',
                     'Access-Control-Allow-Headers': 'Content-Type, Authorization'
                 },
-            'body': json.dumps({
-                'district': result,
-                'documents': documents
-            }, cls=DecimalEncoder)
-        }
+            'body': body
+        }, event)
 
     except (BotoCoreError, ClientError) as e:
-        print(json.dumps({'error': f"Error calling SageMaker endpoint: {str(e)}"}))
+        logger.error(f"Error calling SageMaker endpoint: {str(e)}")
         return {
             'statusCode': 500,
             'headers': {
@@ -166,7 +362,7 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': f"Error calling SageMaker endpoint: {str(e)}"})
         }
     except Exception as e:
-        print(json.dumps({'error': str(e)}))
+        logger.exception(str(e))
         return {
             'statusCode': 500,
             'headers': {
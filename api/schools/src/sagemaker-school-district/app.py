@@ -1,13 +1,25 @@
 import os
 import json
-import tempfile
+import hashlib
+import threading
+import time
+import resource
+from collections import OrderedDict
 import boto3
-from flask import Flask, request, jsonify
+import numpy as np
+from flask import Flask, Response, request, jsonify
 import geopandas as gpd
+import shapely
 from shapely.geometry import Point
-from rtree import index
+from packed_index import PackedIndex
+from district_grid import DistrictGrid, BOUNDARY, OUTSIDE
+from lazy_geometries import LazyGeometries
+from simplified_geometries import SimplifiedGeometries
+from artifacts import cached_etag, fetch_artifacts, head_etags
+from instrumentation import NULL_TIMER, RequestTimer, get_logger, log_debug_json
 
 app = Flask(__name__)
+logger = get_logger("school-district")
 
 # Environment variables
 S3_BUCKET = os.getenv("S3_BUCKET")
@@ -16,86 +28,433 @@ S3_KEY = os.getenv("S3_KEY")
 if not S3_BUCKET or not S3_KEY:
     raise ValueError("Environment variables S3_BUCKET and S3_KEY must be set")
 
-# Global GeoDataFrame variable and spatial index
-gdf = None
-spatial_idx = None
+# Data loading mode: "eager" reads the whole GeoDataFrame, "lazy" memory-maps the parquet
+# file and decodes geometries one row group at a time on first access
+DATA_LOAD_MODE = os.getenv("DATA_LOAD_MODE", "eager")
 
-# Load geospatial data and spatial index at startup
+if DATA_LOAD_MODE not in ("eager", "lazy"):
+    raise ValueError("DATA_LOAD_MODE must be either 'eager' or 'lazy'")
+
+# Comma-separated attribute columns returned for a district (all non-geometry columns by default)
+RESPONSE_COLUMNS = [column for column in os.getenv("RESPONSE_COLUMNS", "").split(",") if column]
+
+# Local directory where S3 artifacts are cached, keyed on their ETag, across container restarts
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", "/tmp/artifacts")
+
+# Number of decoded row groups kept in lazy mode; 0 keeps every decoded row group
+GEOMETRY_CACHE_ROW_GROUPS = int(os.getenv("GEOMETRY_CACHE_ROW_GROUPS", "0"))
+
+# Spatial index backend: "rtree" (libspatialindex files) or "packed" (flat Hilbert R-tree)
+SPATIAL_INDEX_BACKEND = os.getenv("SPATIAL_INDEX_BACKEND", "rtree")
+
+if SPATIAL_INDEX_BACKEND not in ("rtree", "packed"):
+    raise ValueError("SPATIAL_INDEX_BACKEND must be either 'rtree' or 'packed'")
+
+# Resolve points inside interior grid cells from the precomputed district grid
+USE_DISTRICT_GRID = os.getenv("USE_DISTRICT_GRID", "false").lower() == "true"
+
+# Test points against the simplified geometry columns first, falling back to full resolution
+# only near their boundaries (eager mode only)
+USE_SIMPLIFIED_GEOMETRIES = os.getenv("USE_SIMPLIFIED_GEOMETRIES", "false").lower() == "true"
+
+# Maximum number of points accepted in a single batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100000"))
+
+# Content type for compact binary batches: little-endian float64 (lat, lng) pairs
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+# Number of district geometries kept prepared; 0 prepares every geometry at load time
+PREPARED_CACHE_SIZE = int(os.getenv("PREPARED_CACHE_SIZE", "0"))
+
+# Seconds between checks for new artifacts in S3; 0 loads the data once at startup only
+DATA_RELOAD_SECONDS = float(os.getenv("DATA_RELOAD_SECONDS", "0"))
+
+# Response header carrying the data version; SageMaker returns it to callers as CustomAttributes
+DATA_VERSION_HEADER = "X-Amzn-SageMaker-Custom-Attributes"
+
+class DistrictData:
+    """One version of the district data and its spatial indexes.
+
+    A request reads the current instance once and uses it throughout, so swapping in a newly
+    loaded version never changes the data under a request in flight.
+    """
+
+    def __init__(self, paths, etags):
+        # Local artifact paths this version was loaded from, the ETags they were downloaded with and their version
+        self.paths = paths
+        self.etags = etags
+        self.version = data_version(etags)
+
+        # GeoDataFrame (eager mode only) and spatial indexes
+        self.gdf = None
+        self.spatial_idx = None
+        self.district_tree = None
+        self.district_grid = None
+        self.simplified_geometries = None
+
+        # District geometries and their precomputed, geometry-free response records
+        self.geometries = None
+        self.district_records = None
+        self.district_json = None
+
+        # Least recently used prepared geometries when PREPARED_CACHE_SIZE is set
+        self.prepared_lru = OrderedDict()
+        self.prepared_lock = threading.Lock()
+
+# The version being served, replaced as a whole by reload_data()
+district_data = None
+reload_lock = threading.Lock()
+
+# Artifacts this configuration needs
+def artifact_keys():
+    keys = [S3_KEY]
+    if SPATIAL_INDEX_BACKEND == "packed":
+        keys.append("spatial_index.packed")
+    else:
+        keys.extend(["spatial_index.idx", "spatial_index.dat"])
+    if USE_DISTRICT_GRID:
+        keys.append("district_grid.bin")
+    return keys
+
+# Short version id of an artifact set, from the ETags of its objects (None for missing ones)
+def data_version(etags):
+    digest = hashlib.blake2b(digest_size=6)
+    for key in sorted(etags):
+        digest.update(f"{key}={etags[key]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+# Load geospatial data and spatial index into a new DistrictData, leaving the one being served untouched
 def load_data():
-    global gdf, spatial_idx
-    print("Loading geospatial data and spatial index...")
-
-    s3 = boto3.client("s3")
-    
-    # Create a temporary file to store the Parquet file
-    with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as temp_file:
-        s3.download_fileobj(S3_BUCKET, S3_KEY, temp_file)
-        temp_file.flush()  # Ensure data is written
-        
-        # Load the Parquet file using GeoPandas from the temporary file
-        gdf = gpd.read_parquet(temp_file.name)
-    
-    # Load spatial index files from S3 (idx and dat)
-    spatial_index_path = "/tmp/spatial_index"
-    
-    idx_file_path = f"{spatial_index_path}.idx"
-    dat_file_path = f"{spatial_index_path}.dat"
-
-    # Download index files from S3
-    s3.download_file(S3_BUCKET, "spatial_index.idx", idx_file_path)
-    s3.download_file(S3_BUCKET, "spatial_index.dat", dat_file_path)
-
-    # Load the spatial index from the downloaded files
-    spatial_idx = index.Index(spatial_index_path)
-    
-    print("Data and spatial index loaded successfully")
+    logger.info(f"Loading geospatial data and spatial index ({DATA_LOAD_MODE} mode)...")
+    start_time = time.perf_counter()
+
+    # Fetch every artifact this configuration needs in parallel
+    keys = artifact_keys()
+    paths = fetch_artifacts(boto3.client("s3"), S3_BUCKET, keys, ARTIFACT_CACHE_DIR)
+    if paths[S3_KEY] is None:
+        raise FileNotFoundError(f"s3://{S3_BUCKET}/{S3_KEY} not found")
+    data = DistrictData(paths, {key: cached_etag(paths[key]) for key in keys})
+    logger.info(f"Phase fetch: {time.perf_counter() - start_time:.2f}s")
+
+    phase_start = time.perf_counter()
+    if DATA_LOAD_MODE == "lazy":
+        # Geometries are decoded (and prepared) per row group on first access
+        data.geometries = LazyGeometries(paths[S3_KEY], GEOMETRY_CACHE_ROW_GROUPS, prepare=not PREPARED_CACHE_SIZE)
+        data.district_records = data.geometries.read_attributes(RESPONSE_COLUMNS or None)
+        if USE_SIMPLIFIED_GEOMETRIES:
+            logger.warning("Simplified geometries are only used in eager mode")
+    else:
+        gdf = data.gdf = gpd.read_parquet(paths[S3_KEY])
+
+        # Prepare the district geometries up front unless they are prepared lazily
+        data.geometries = gdf.geometry.to_numpy()
+        if not PREPARED_CACHE_SIZE:
+            shapely.prepare(data.geometries)
+
+        # Precompute the response record of every district
+        attributes = gdf[RESPONSE_COLUMNS] if RESPONSE_COLUMNS else gdf.select_dtypes(exclude="geometry")
+        data.district_records = json.loads(attributes.to_json(orient="records"))
+
+        # Build an in-memory STRtree over the district geometries for batch queries
+        data.district_tree = shapely.STRtree(data.geometries)
+
+        if USE_SIMPLIFIED_GEOMETRIES:
+            data.simplified_geometries = SimplifiedGeometries.from_geodataframe(gdf)
+            if data.simplified_geometries is None:
+                logger.warning("No simplified geometry columns found, using full-resolution polygon tests only")
+            else:
+                logger.info(f"Simplified geometries loaded at tolerances {data.simplified_geometries.tolerances}")
+
+    # Keep every district record pre-serialized as JSON as well
+    data.district_json = [json.dumps(record) for record in data.district_records]
+    logger.info(f"Phase districts: {time.perf_counter() - phase_start:.2f}s")
+
+    # Load the spatial index for the configured backend
+    phase_start = time.perf_counter()
+    if SPATIAL_INDEX_BACKEND == "packed":
+        data.spatial_idx = load_packed_index(data, paths["spatial_index.packed"])
+    else:
+        data.spatial_idx = load_rtree_index(paths["spatial_index.idx"], paths["spatial_index.dat"])
+
+    if USE_DISTRICT_GRID:
+        data.district_grid = load_district_grid(data, paths["district_grid.bin"])
+    logger.info(f"Phase indexes: {time.perf_counter() - phase_start:.2f}s")
+
+    # Peak resident memory, reported by Linux in kilobytes
+    peak_memory_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(f"Data and spatial index version {data.version} loaded successfully in {time.perf_counter() - start_time:.2f}s "
+                f"(peak RSS {peak_memory_mb:.0f} MB)")
+    return data
+
+# Open the libspatialindex R-tree from its idx and dat files
+def load_rtree_index(idx_file_path, dat_file_path):
+    from rtree import index
+
+    if idx_file_path is None or dat_file_path is None:
+        raise FileNotFoundError("spatial_index.idx and spatial_index.dat are required by the rtree backend")
+
+    # Both files share the same base name in the artifact cache
+    return index.Index(os.path.splitext(idx_file_path)[0])
+
+# Memory-map the packed index, or build it from the district bounds if it isn't published
+def load_packed_index(data, packed_index_path):
+    if packed_index_path is None:
+        logger.warning("Packed index not available, building it from the district bounds")
+        if DATA_LOAD_MODE == "lazy":
+            return PackedIndex.build(data.geometries.bounds())
+        return PackedIndex.build(shapely.bounds(data.geometries))
+
+    return PackedIndex.load(packed_index_path)
+
+# Memory-map the district grid, skipping it if it is missing or was built for other data
+def load_district_grid(data, district_grid_path):
+    if district_grid_path is None:
+        logger.warning("District grid not available, using exact polygon tests only")
+        return None
+
+    grid = DistrictGrid.load(district_grid_path)
+    if grid.num_districts != len(data.geometries):
+        logger.warning(f"District grid covers {grid.num_districts} districts instead of {len(data.geometries)}, ignoring it")
+        return None
+
+    return grid
+
+# Called in each pre-forked worker: libspatialindex reads its files through a file offset that
+# forked processes would otherwise share, so each worker opens its own handle
+def reopen_spatial_index():
+    if SPATIAL_INDEX_BACKEND == "rtree":
+        paths = district_data.paths
+        district_data.spatial_idx = load_rtree_index(paths["spatial_index.idx"], paths["spatial_index.dat"])
+
+# Load every artifact again once the districts file changed in S3 and swap the new version in.
+# The indexes are keyed by its row order, so they are expected to be uploaded before it.
+# Memory holds both versions until requests still using the old one have finished.
+# on_reload runs before reload_lock is released, so a master holding it across forks (see
+# gunicorn.conf.py) never forks a worker while any part of a reload is running.
+def reload_data(on_reload=None):
+    global district_data
+    with reload_lock:
+        etag = head_etags(boto3.client("s3"), S3_BUCKET, [S3_KEY])[S3_KEY]
+        if etag is None or etag == district_data.etags[S3_KEY]:
+            return False
+
+        data = load_data()
+        previous_version, district_data = district_data.version, data
+        logger.info(f"Data version {previous_version} replaced by {data.version}")
+
+        if on_reload is not None:
+            on_reload()
+    return True
+
+# Poll S3 for new artifacts every DATA_RELOAD_SECONDS, calling on_reload after each swap
+def start_reload_thread(on_reload=None):
+    if not DATA_RELOAD_SECONDS:
+        return None
+
+    def poll():
+        while True:
+            time.sleep(DATA_RELOAD_SECONDS)
+            try:
+                reload_data(on_reload)
+            except Exception:
+                logger.exception(f"Data reload failed, still serving version {district_data.version}")
+
+    thread = threading.Thread(target=poll, name="data-reload", daemon=True)
+    thread.start()
+    logger.info(f"Checking for new data every {DATA_RELOAD_SECONDS:g}s")
+    return thread
 
 # Load the geospatial data at startup
-load_data()
+district_data = load_data()
 
 # Query the district
-def query_district(lat, lng):
+def query_district(data, lat, lng, timer=NULL_TIMER):
+    # Points inside an interior grid cell are answered without a polygon test
+    if data.district_grid is not None:
+        with timer.phase("grid_lookup"):
+            idx = data.district_grid.lookup(lat, lng)
+        if idx == OUTSIDE:
+            return {"error": "No matching district found"}
+        if idx != BOUNDARY:
+            return data.district_records[idx]
+
     point = Point(lng, lat)
 
     # Get bounding box of the point (for spatial indexing)
     point_bounds = point.bounds
 
     # Get candidate geometries that intersect with the bounding box of the point
-    potential_matches = list(spatial_idx.intersection(point_bounds))
+    with timer.phase("index_probe"):
+        potential_matches = list(data.spatial_idx.intersection(point_bounds))
 
     # Further filter the geometries that actually contain the point
-    for idx in potential_matches:
-        if gdf.geometry[idx].contains(point):
-            # Convert geometry to GeoJSON-like format
-            district = gdf.iloc[idx].to_dict()
+    with timer.phase("contains_test"):
+        match = next((idx for idx in potential_matches if point_in_district(data, idx, point)), None)
+
+    if match is None:
+        return {"error": "No matching district found"}
+
+    # Look up the precomputed district record
+    district = data.district_records[match]
+    log_debug_json(logger, "Matched district", district)
+    return district
+
+# Test a point against the simplified levels of a district, then its full geometry if needed.
+# When every full geometry is prepared, a single prepared test is cheaper than the band test.
+def point_in_district(data, idx, point):
+    if data.simplified_geometries is not None and PREPARED_CACHE_SIZE:
+        return data.simplified_geometries.contains(idx, point, lambda idx, point: district_contains(data, idx, point))
+    return district_contains(data, idx, point)
+
+# Test a point against a prepared district geometry
+def district_contains(data, idx, point):
+    geometry = data.geometries[idx]
+    if not PREPARED_CACHE_SIZE:
+        return geometry.contains(point)
+
+    # Keep at most PREPARED_CACHE_SIZE geometries prepared, evicting the least recently used
+    with data.prepared_lock:
+        if idx in data.prepared_lru:
+            data.prepared_lru.move_to_end(idx)
+        else:
+            shapely.prepare(geometry)
+            data.prepared_lru[idx] = True
+            if len(data.prepared_lru) > PREPARED_CACHE_SIZE:
+                evicted, _ = data.prepared_lru.popitem(last=False)
+                shapely.destroy_prepared(data.geometries[evicted])
+        return geometry.contains(point)
+
+# Match a batch of points to district positions in a single vectorized pass (-1 when unmatched)
+def match_districts(data, lats, lngs, timer=NULL_TIMER):
+    lats = np.asarray(lats, dtype="float64")
+    lngs = np.asarray(lngs, dtype="float64")
 
-            # Remove the geometry key
-            district.pop('geometry', None)
+    # Resolve interior grid cells first and run the exact test only for the remaining points
+    if data.district_grid is not None:
+        with timer.phase("grid_lookup"):
+            matches = data.district_grid.lookup_many(lats, lngs)
+            pending = np.flatnonzero(matches == BOUNDARY)
+        with timer.phase("contains_test"):
+            matches[pending] = match_districts_exact(data, lats[pending], lngs[pending])
+        return np.where(matches == OUTSIDE, -1, matches)
 
-            # Print the district dictionary after removal
-            print("District data after removing geometry:")
-            print(json.dumps(district, indent=4))  # Pretty-print the dictionary
+    with timer.phase("contains_test"):
+        return match_districts_exact(data, lats, lngs)
 
-            return district  # Return the matching district
-    
-    return {"error": "No matching district found"}
+# Match points to district positions with a vectorized predicate pass (-1 when unmatched)
+def match_districts_exact(data, lats, lngs):
+    points = shapely.points(lngs, lats)
+
+    # Pairs of (point position, district position) where the point lies within the district
+    if data.simplified_geometries is not None:
+        point_idx, district_idx = data.district_tree.query(points)
+        within = data.simplified_geometries.contains_xy(
+            district_idx, lngs[point_idx], lats[point_idx],
+            lambda idx, x, y: shapely.contains_xy(data.geometries[idx], x, y),
+        )
+        point_idx, district_idx = point_idx[within], district_idx[within]
+    elif data.district_tree is not None:
+        point_idx, district_idx = data.district_tree.query(points, predicate="within")
+    else:
+        point_idx, district_idx = match_candidates(data, lats, lngs)
+
+    # Keep the first matching district per point, mirroring query_district
+    order = np.lexsort((district_idx, point_idx))
+    point_idx, district_idx = point_idx[order], district_idx[order]
+    first = np.unique(point_idx, return_index=True)[1]
+
+    matches = np.full(len(points), -1, dtype="int64")
+    matches[point_idx[first]] = district_idx[first]
+
+    return matches
+
+# Without an STRtree (lazy mode), probe the spatial index per point and test the candidates in one pass
+def match_candidates(data, lats, lngs):
+    pairs = [
+        (i, idx)
+        for i, (lat, lng) in enumerate(zip(lats, lngs))
+        for idx in data.spatial_idx.intersection((lng, lat, lng, lat))
+    ]
+    if not pairs:
+        return np.empty(0, dtype="int64"), np.empty(0, dtype="int64")
+
+    point_idx, district_idx = np.array(pairs, dtype="int64").T
+    within = shapely.contains_xy(data.geometries.take(district_idx), lngs[point_idx], lats[point_idx])
+    return point_idx[within], district_idx[within]
+
+# Query the districts for a batch of points, in input order (None when unmatched)
+def query_districts(data, lats, lngs):
+    return [data.district_records[idx] if idx >= 0 else None for idx in match_districts(data, lats, lngs)]
+
+# Parse a batch request body into latitude and longitude arrays
+def parse_batch(req):
+    if req.mimetype == BINARY_CONTENT_TYPE:
+        coords = np.frombuffer(req.get_data(), dtype="<f8")
+        if coords.size % 2:
+            raise ValueError("Binary body must contain (lat, lng) float64 pairs")
+        coords = coords.reshape(-1, 2)
+    else:
+        coords = np.array(
+            [(p["lat"], p["lng"]) if isinstance(p, dict) else p for p in req.json["points"]],
+            dtype="float64",
+        ).reshape(-1, 2)
+
+    if len(coords) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch size {len(coords)} exceeds the limit of {MAX_BATCH_SIZE}")
+
+    return coords[:, 0], coords[:, 1]
+
+def is_batch_request(req):
+    if req.mimetype == BINARY_CONTENT_TYPE:
+        return True
+    data = req.get_json(silent=True)
+    return isinstance(data, dict) and "points" in data
 
 # Inference endpoint
 @app.route("/invocations", methods=["POST"])
 def invocations():
+    # The whole request is answered from the version current when it arrived
+    data = district_data
     try:
-        data = request.json
-        lat = float(data["lat"])
-        lng = float(data["lng"])
-        result = query_district(lat, lng)
-        return jsonify(result)
+        if is_batch_request(request):
+            timer = RequestTimer("district_batch", logger=logger)
+            with timer.phase("parse"):
+                lats, lngs = parse_batch(request)
+
+            matches = match_districts(data, lats, lngs, timer)
+
+            # Assemble the response from the pre-serialized district records
+            with timer.phase("serialization"):
+                results = ",".join(data.district_json[idx] if idx >= 0 else "null" for idx in matches)
+                response = Response(f'{{"results":[{results}]}}', mimetype="application/json")
+
+            timer.emit(points=len(matches), data_version=data.version)
+            response.headers[DATA_VERSION_HEADER] = f"data_version={data.version}"
+            return response
+
+        timer = RequestTimer("district_query", logger=logger)
+        body = request.json
+        lat = float(body["lat"])
+        lng = float(body["lng"])
+        result = query_district(data, lat, lng, timer)
+
+        with timer.phase("serialization"):
+            response = jsonify(result)
+
+        timer.emit(data_version=data.version)
+        response.headers[DATA_VERSION_HEADER] = f"data_version={data.version}"
+        return response
     except Exception as e:
+        logger.exception("Invocation failed")
         return jsonify({"error": str(e)}), 500
 
 # Health check endpoint
 @app.route("/ping", methods=["GET"])
 def ping():
-    return jsonify({"status": "healthy"}), 200
+    if district_data is None:
+        return jsonify({"status": "loading"}), 503
+    return jsonify({"status": "healthy", "data_version": district_data.version}), 200
 
 if __name__ == "__main__":
+    start_reload_thread()
     app.run(host="0.0.0.0", port=8080)
@@ -0,0 +1,85 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from instrumentation import get_logger
+
+logger = get_logger("school-district.artifacts")
+
+# Objects above the threshold are fetched as parallel ranged GETs of MULTIPART_CHUNK_SIZE bytes
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_RANGE_CONCURRENCY = 8
+
+
+def fetch_artifacts(s3, bucket, keys, cache_dir):
+    """Download S3 objects concurrently into cache_dir, skipping those whose ETag is unchanged.
+
+    Returns a dict mapping each key to its local path, or to None if the object doesn't exist.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max(len(keys), 1)) as executor:
+        paths = executor.map(lambda key: fetch_artifact(s3, bucket, key, cache_dir), keys)
+        return dict(zip(keys, paths))
+
+
+def head_etags(s3, bucket, keys):
+    """Return the current ETag of each S3 object, or None for objects that don't exist, fetched concurrently."""
+    with ThreadPoolExecutor(max_workers=max(len(keys), 1)) as executor:
+        return dict(zip(keys, executor.map(lambda key: head_etag(s3, bucket, key), keys)))
+
+
+def head_etag(s3, bucket, key):
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def cached_etag(path):
+    """Return the ETag a cached artifact was downloaded with, or None if it isn't cached."""
+    if path is None or not os.path.exists(f"{path}.etag"):
+        return None
+    with open(f"{path}.etag") as etag_file:
+        return etag_file.read()
+
+
+def fetch_artifact(s3, bucket, key, cache_dir):
+    start_time = time.perf_counter()
+    path = os.path.join(cache_dir, key)
+    etag_path = f"{path}.etag"
+
+    etag = head_etag(s3, bucket, key)
+    if etag is None:
+        logger.warning(f"Artifact s3://{bucket}/{key} not found")
+        return None
+
+    # A warm cache holds the object next to the ETag it was downloaded with
+    if os.path.exists(path) and os.path.exists(etag_path):
+        with open(etag_path) as etag_file:
+            if etag_file.read() == etag:
+                logger.info(f"Artifact {key}: cache hit ({etag}) in {time.perf_counter() - start_time:.2f}s")
+                return path
+
+    # Download next to the target and rename, so an interrupted download never looks cached
+    config = TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNK_SIZE,
+        max_concurrency=MAX_RANGE_CONCURRENCY,
+    )
+    partial_path = f"{path}.partial"
+    s3.download_file(bucket, key, partial_path, Config=config)
+    os.replace(partial_path, path)
+
+    with open(etag_path, "w") as etag_file:
+        etag_file.write(etag)
+
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    logger.info(f"Artifact {key}: downloaded {size_mb:.1f} MB in {time.perf_counter() - start_time:.2f}s")
+    return path
@@ -0,0 +1,147 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow.parquet as pq
+import shapely
+
+from lazy_geometries import LazyGeometries
+from main import read_bounds
+from packed_index import hilbert_values
+
+# Schools spatially joined per worker task; each task only decodes the row groups its points overlap
+PARTITION_SIZE = 5000
+
+# Report statuses, for schools whose district_id is not already the one their coordinates fall in
+CORRECTED = "corrected"
+ADDED = "added"
+UNMATCHED = "unmatched"
+NO_COORDINATES = "no_coordinates"
+
+def join_partition(geoparquet_file_path, lats, lngs):
+    """Row position of the district containing each point, or -1, in one vectorized pass.
+
+    Only districts whose bounding box overlaps the points are decoded. Like the endpoint's batch
+    matching, a point inside several districts gets the one with the lowest row position.
+    """
+    bounds = read_bounds(geoparquet_file_path)
+    rows = np.flatnonzero(
+        (bounds[:, 0] <= lngs.max()) & (bounds[:, 2] >= lngs.min())
+        & (bounds[:, 1] <= lats.max()) & (bounds[:, 3] >= lats.min())
+    )
+
+    matches = np.full(len(lats), -1, dtype="int64")
+    if not len(rows):
+        return matches
+
+    # The file is Hilbert-sorted, so a compact partition touches few row groups
+    tree = shapely.STRtree(LazyGeometries(geoparquet_file_path, prepare=False).take(rows))
+    point_idx, local_idx = tree.query(shapely.points(lngs, lats), predicate="within")
+
+    order = np.lexsort((local_idx, point_idx))
+    point_idx, local_idx = point_idx[order], local_idx[order]
+    first = np.unique(point_idx, return_index=True)[1]
+    matches[point_idx[first]] = rows[local_idx[first]]
+    return matches
+
+def coordinates(schools, lat_attribute, lng_attribute):
+    """Latitude and longitude arrays of the schools, NaN where a coordinate is missing or invalid."""
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+
+    lats = np.array([number(school.get(lat_attribute)) for school in schools], dtype="float64")
+    lngs = np.array([number(school.get(lng_attribute)) for school in schools], dtype="float64")
+    invalid = ~(np.isfinite(lats) & np.isfinite(lngs) & (np.abs(lats) <= 90) & (np.abs(lngs) <= 180))
+    lats[invalid] = lngs[invalid] = math.nan
+    return lats, lngs
+
+def assign_districts(geoparquet_file_path, lats, lngs, workers):
+    """District row position of every point (-1 when unmatched or without coordinates).
+
+    Points are sorted along a Hilbert curve and cut into PARTITION_SIZE runs, so every worker
+    task covers a compact area and reads only the districts around it.
+    """
+    valid = np.flatnonzero(np.isfinite(lats))
+    matches = np.full(len(lats), -1, dtype="int64")
+    if not len(valid):
+        return matches
+
+    points = np.column_stack([lngs[valid], lats[valid], lngs[valid], lats[valid]])
+    ordered = valid[np.argsort(hilbert_values(points), kind="stable")]
+    partitions = [ordered[start:start + PARTITION_SIZE] for start in range(0, len(ordered), PARTITION_SIZE)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            join_partition,
+            [geoparquet_file_path] * len(partitions),
+            [lats[partition] for partition in partitions],
+            [lngs[partition] for partition in partitions],
+        )
+        for partition, partition_matches in zip(partitions, results):
+            matches[partition] = partition_matches
+    return matches
+
+def write_json(path, data):
+    # Write next to the destination and rename, so an interruption never leaves it truncated
+    with open(f"{path}.partial", "w") as output_file:
+        json.dump(data, output_file, separators=(",", ":"))
+    os.replace(f"{path}.partial", path)
+
+if __name__ == "__main__":
+    # Command-line argument parsing
+    parser = argparse.ArgumentParser(description="Assign every school the district its coordinates fall in, and report the schools whose district_id was wrong.")
+    parser.add_argument("--schools", default="../../data/sources/schools.json", help="Path to the JSON array of schools.")
+    parser.add_argument("--districts", default="../../data/output/school_districts.parquet", help="Path to the districts GeoParquet file built by main.py.")
+    parser.add_argument("--output", default="../../data/output/schools.json", help="Where to write the schools with corrected district ids (the seeder's --file).")
+    parser.add_argument("--report", default="../../data/output/district_mismatches.csv", help="Where to write the schools whose district id changed or could not be assigned.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("--district-attribute", default="district_id", help="School attribute holding the district id.")
+    parser.add_argument("--geoid-column", default="GEOID", help="District column the district id is taken from.")
+    parser.add_argument("--key-attribute", default="school_id", help="School attribute identifying a school in the report.")
+    parser.add_argument("--lat-attribute", default="lat", help="School attribute holding the latitude.")
+    parser.add_argument("--lng-attribute", default="lng", help="School attribute holding the longitude.")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    with open(args.schools) as schools_file:
+        schools = json.load(schools_file)
+    geoids = pq.read_table(args.districts, columns=[args.geoid_column]).column(0).to_pylist()
+
+    lats, lngs = coordinates(schools, args.lat_attribute, args.lng_attribute)
+    matches = assign_districts(args.districts, lats, lngs, args.workers)
+
+    counts = {"matched": 0, CORRECTED: 0, ADDED: 0, UNMATCHED: 0, NO_COORDINATES: 0}
+    with open(f"{args.report}.partial", "w", newline="") as report_file:
+        report = csv.writer(report_file)
+        report.writerow([args.key_attribute, args.lat_attribute, args.lng_attribute, "previous_district_id", "district_id", "status"])
+
+        for school, lat, match in zip(schools, lats, matches):
+            previous = school.get(args.district_attribute)
+            if math.isnan(lat):
+                status, district_id = NO_COORDINATES, previous
+            elif match < 0:
+                status, district_id = UNMATCHED, previous
+            else:
+                # GEOIDs are strings with leading zeros, so numeric ids in the file never match
+                district_id = geoids[match]
+                if previous == district_id:
+                    counts["matched"] += 1
+                    continue
+                status = ADDED if previous in (None, "") else CORRECTED
+                school[args.district_attribute] = district_id
+
+            counts[status] += 1
+            report.writerow([school.get(args.key_attribute), school.get(args.lat_attribute), school.get(args.lng_attribute), previous, district_id, status])
+    os.replace(f"{args.report}.partial", args.report)
+
+    write_json(args.output, schools)
+    print(f"Assigned districts to {len(schools)} schools in {time.perf_counter() - start_time:.1f}s: " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+    print(f"Schools written to {args.output}, mismatches to {args.report}")
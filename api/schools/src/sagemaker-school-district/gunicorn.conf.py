@@ -0,0 +1,47 @@
+import gc
+import multiprocessing
+import os
+import signal
+
+# Production server settings for the district service, see serve.sh
+bind = "0.0.0.0:8080"
+
+# One worker per core by default; each worker serves one request at a time
+workers = int(os.getenv("WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("THREADS", "1"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+
+# Load the district data once in the master so the workers share it copy-on-write
+preload_app = True
+
+def when_ready(server):
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in workers
+    gc.freeze()
+    server.log.info(f"District service ready with {workers} workers x {threads} threads")
+
+    # New data is loaded in the master, then HUP replaces the workers gracefully: new workers fork
+    # with the new version while the old ones finish their requests on the previous one
+    import app
+
+    def on_reload():
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        os.kill(server.pid, signal.SIGHUP)
+
+    # The reload thread runs boto3, thread pools and pyarrow in the master, and a fork while it
+    # holds one of their locks would leave the new worker deadlocked on a copy of it. Gunicorn
+    # forks on HUP and whenever a worker dies, so every fork of the master waits for a reload in
+    # progress and holds reload_lock until it is done. Gunicorn has no hook in the master after a
+    # fork, so these are fork handlers rather than pre_fork. A worker that dies during a reload is
+    # replaced once the load finishes; the other workers keep serving meanwhile.
+    os.register_at_fork(
+        before=app.reload_lock.acquire,
+        after_in_parent=app.reload_lock.release,
+        after_in_child=app.reload_lock.release,
+    )
+    app.start_reload_thread(on_reload)
+
+def post_fork(server, worker):
+    import app
+    app.reopen_spatial_index()
@@ -0,0 +1,95 @@
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow.parquet as pq
+import shapely
+
+
+class LazyGeometries:
+    """Row-indexed view of the geometries of a memory-mapped GeoParquet file.
+
+    Geometries are decoded from WKB one row group at a time, on first access, and at most
+    cache_size row groups stay decoded (0 keeps every decoded row group).
+    """
+
+    def __init__(self, path, cache_size=0, prepare=True):
+        self.parquet_file = pq.ParquetFile(path, memory_map=True)
+        self.cache_size = cache_size
+        self.prepare = prepare
+
+        geo_metadata = json.loads(self.parquet_file.schema_arrow.metadata[b"geo"])
+        self.geometry_column = geo_metadata["primary_column"]
+
+        # Simplified copies of the geometries are stored as further geometry columns
+        self.geometry_columns = set(geo_metadata["columns"])
+
+        # GeoParquet 1.1 bounding box columns are not part of the district attributes
+        covering = geo_metadata["columns"][self.geometry_column].get("covering", {})
+        self.covering_columns = {path[0] for path in covering.get("bbox", {}).values()}
+
+        # First row of every row group, plus the total row count
+        metadata = self.parquet_file.metadata
+        self.row_offsets = [0]
+        for i in range(metadata.num_row_groups):
+            self.row_offsets.append(self.row_offsets[-1] + metadata.row_group(i).num_rows)
+
+        self._row_groups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.row_offsets[-1]
+
+    def __getitem__(self, idx):
+        row_group = bisect_right(self.row_offsets, idx) - 1
+        return self.row_group(row_group)[idx - self.row_offsets[row_group]]
+
+    def take(self, indices):
+        """Return an object array with the geometries of the given rows."""
+        indices = np.asarray(indices, dtype="int64")
+        row_groups = np.searchsorted(self.row_offsets, indices, side="right") - 1
+
+        result = np.empty(len(indices), dtype=object)
+        for row_group in np.unique(row_groups):
+            selected = row_groups == row_group
+            result[selected] = self.row_group(row_group)[indices[selected] - self.row_offsets[row_group]]
+        return result
+
+    def row_group(self, row_group):
+        """Return the decoded geometries of a row group, decoding it if needed."""
+        with self._lock:
+            geometries = self._row_groups.get(row_group)
+            if geometries is not None:
+                self._row_groups.move_to_end(row_group)
+                return geometries
+
+        table = self.parquet_file.read_row_group(row_group, columns=[self.geometry_column])
+        geometries = shapely.from_wkb(table.column(0).to_numpy(zero_copy_only=False))
+        if self.prepare:
+            shapely.prepare(geometries)
+
+        with self._lock:
+            self._row_groups[row_group] = geometries
+            if self.cache_size and len(self._row_groups) > self.cache_size:
+                self._row_groups.popitem(last=False)
+        return geometries
+
+    def bounds(self):
+        """Return the (n, 4) bounds of every geometry, decoding one row group at a time."""
+        return np.concatenate([
+            shapely.bounds(shapely.from_wkb(
+                self.parquet_file.read_row_group(i, columns=[self.geometry_column]).column(0).to_numpy(zero_copy_only=False)
+            ))
+            for i in range(self.parquet_file.metadata.num_row_groups)
+        ])
+
+    def read_attributes(self, columns=None):
+        """Read non-geometry columns (all of them by default) as a list of row dicts."""
+        if columns is None:
+            columns = [
+                name for name in self.parquet_file.schema_arrow.names
+                if name not in self.geometry_columns and name not in self.covering_columns
+            ]
+        return self.parquet_file.read(columns=columns).to_pylist()
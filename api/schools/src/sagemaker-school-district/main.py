@@ -1,32 +1,128 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from shapely.geometry import shape
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pyogrio
 from rtree import index
+from packed_index import PackedIndex, hilbert_values
+from simplified_geometries import column_name
+
+# The district grid is shared with the get-schools-nearby Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+from district_grid import DistrictGrid
+from vector_tiles import build_tile_archive
+
+# Number of districts per Parquet row group
+ROW_GROUP_SIZE = 256
+
+# Shapefile features read and simplified per worker task, and the number of worker processes
+CHUNK_SIZE = 500
+CONVERT_WORKERS = os.cpu_count()
+
+# Tolerances in degrees of the simplified geometry columns (roughly 1.1 km and 110 m)
+SIMPLIFY_TOLERANCES = (0.01, 0.001)
+
+# Zoom levels and district attributes of the vector tiles
+TILE_MIN_ZOOM = 3
+TILE_MAX_ZOOM = 10
+TILE_ATTRIBUTES = ["GEOID", "NAME"]
+
+def read_shapefile_chunk(shapefile_path, start, stop):
+    # Read features [start, stop) and add topology-preserving simplifications, tested before the full-resolution geometry
+    gdf = gpd.read_file(shapefile_path, rows=slice(start, stop))
+    for tolerance in SIMPLIFY_TOLERANCES:
+        gdf[column_name(tolerance)] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    return gdf
 
 def convert_shapefile_to_geoparquet(shapefile_path, output_file_path):
-    # Load the shapefile
-    gdf = gpd.read_file(shapefile_path)
+    # Read and simplify the shapefile in chunks across a process pool
+    feature_count = pyogrio.read_info(shapefile_path)["features"]
+    starts = range(0, feature_count, CHUNK_SIZE)
+    with ProcessPoolExecutor(max_workers=CONVERT_WORKERS) as executor:
+        chunks = list(executor.map(
+            read_shapefile_chunk,
+            [shapefile_path] * len(starts), starts, [min(start + CHUNK_SIZE, feature_count) for start in starts],
+        ))
+    gdf = pd.concat(chunks, ignore_index=True)
 
-    # Save to GeoParquet
-    gdf.to_parquet(output_file_path, compression="snappy")
-    print(f"GeoParquet file created: {output_file_path}")
+    for tolerance in SIMPLIFY_TOLERANCES:
+        print(f"Simplified at {tolerance}: {gdf[column_name(tolerance)].count_coordinates().sum()} of {gdf.geometry.count_coordinates().sum()} vertices")
+
+    # Sort along a Hilbert curve so each row group holds spatially close districts
+    gdf = gdf.iloc[np.argsort(hilbert_values(gdf.bounds.to_numpy()), kind="stable")].reset_index(drop=True)
+
+    # Save to GeoParquet, in small row groups so the endpoint can decode geometries lazily. The bbox
+    # covering column gives every row group min/max statistics, so bbox-filtered reads skip row groups
+    gdf.to_parquet(output_file_path, compression="snappy", row_group_size=ROW_GROUP_SIZE, write_covering_bbox=True)
+    print(f"GeoParquet file created: {output_file_path} ({len(gdf)} districts in {pq.ParquetFile(output_file_path).num_row_groups} row groups)")
+
+def read_bounds(geoparquet_file_path):
+    # Row bounds from the bbox covering column, without decoding any geometry
+    bbox = pq.read_table(geoparquet_file_path, columns=["bbox"]).column("bbox").combine_chunks()
+    return np.column_stack([bbox.field(name).to_numpy() for name in ("xmin", "ymin", "xmax", "ymax")])
 
 def build_geoparquet_index(geoparquet_file_path, spatial_index_path):
+    # Bulk-load a persistent R-tree index from the bounds in row (Hilbert) order, replacing any previous one
+    bounds = read_bounds(geoparquet_file_path)
+    for extension in (".idx", ".dat"):
+        if os.path.exists(spatial_index_path + extension):
+            os.remove(spatial_index_path + extension)
+    spatial_index = index.Index(spatial_index_path, ((idx, tuple(row), None) for idx, row in enumerate(bounds)))
+    spatial_index.close()
+
+    print(f"Spatial index created: {spatial_index_path}.dat")
+
+def build_packed_index(geoparquet_file_path, packed_index_path):
+    # Bulk-load a packed Hilbert R-tree from the geometry bounds, in row order
+    PackedIndex.build(read_bounds(geoparquet_file_path)).save(packed_index_path)
+
+    print(f"Packed spatial index created: {packed_index_path}")
+
+def build_district_grid(geoparquet_file_path, district_grid_path):
+    # Load GeoParquet file
+    gdf = gpd.read_parquet(geoparquet_file_path)
+
+    # Label the grid cells that lie fully inside a single district, keyed by row position
+    grid = DistrictGrid.build(gdf.geometry.to_numpy())
+    grid.save(district_grid_path)
+
+    print(f"District grid created: {district_grid_path} ({len(grid.starts)} cells)")
+
+def build_district_records(geoparquet_file_path, district_records_path):
     # Load GeoParquet file
     gdf = gpd.read_parquet(geoparquet_file_path)
 
-    # Create a persistent R-tree index
-    spatial_index = index.Index(spatial_index_path)
+    # District attributes in row order, matching the grid labels and the endpoint's response records
+    gdf.select_dtypes(exclude="geometry").to_json(district_records_path, orient="records")
+
+    print(f"District records created: {district_records_path}")
 
-    # Populate the index
-    for idx, geometry in enumerate(gdf.geometry):
-        spatial_index.insert(idx, geometry.bounds)
+def build_district_tiles(geoparquet_file_path, district_tiles_path):
+    # Load GeoParquet file
+    gdf = gpd.read_parquet(geoparquet_file_path)
 
-    print(f"Spatial index created: {spatial_index_path}.dat")   
+    # Pre-render boundary tiles for every zoom into one PMTiles archive, with row positions as feature ids
+    attributes = gdf[[column for column in TILE_ATTRIBUTES if column in gdf.columns]].to_dict(orient="records")
+    tiles = build_tile_archive(gdf.geometry.to_numpy(), attributes, district_tiles_path, TILE_MIN_ZOOM, TILE_MAX_ZOOM)
 
+    print(f"District tiles created: {district_tiles_path} ({tiles} tiles, {os.path.getsize(district_tiles_path)} bytes)")
 
-shapefile_path = "../data/sources/EDGE_SCHOOLDISTRICT_TL_23_SY2223.shp"
-parquetfile_path = "../data/output/school_districts.parquet"
-spatial_index_path = "../data/output/spatial_index"
+if __name__ == "__main__":
+    shapefile_path = "../data/sources/EDGE_SCHOOLDISTRICT_TL_23_SY2223.shp"
+    parquetfile_path = "../data/output/school_districts.parquet"
+    spatial_index_path = "../data/output/spatial_index"
+    packed_index_path = "../data/output/spatial_index.packed"
+    district_grid_path = "../data/output/district_grid.bin"
+    district_records_path = "../data/output/district_records.json"
+    district_tiles_path = "../data/output/district_tiles.pmtiles"
 
-convert_shapefile_to_geoparquet(shapefile_path, parquetfile_path)
-build_geoparquet_index(parquetfile_path, spatial_index_path)
\ No newline at end of file
+    convert_shapefile_to_geoparquet(shapefile_path, parquetfile_path)
+    build_geoparquet_index(parquetfile_path, spatial_index_path)
+    build_packed_index(parquetfile_path, packed_index_path)
+    build_district_grid(parquetfile_path, district_grid_path)
+    build_district_records(parquetfile_path, district_records_path)
+    build_district_tiles(parquetfile_path, district_tiles_path)
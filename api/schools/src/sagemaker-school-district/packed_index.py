@@ -0,0 +1,179 @@
+import mmap
+import struct
+from bisect import bisect_right
+
+import numpy as np
+
+# File layout: a 32-byte header followed by the node boxes (float64 minx, miny, maxx, maxy),
+# the node indices (uint32) and the level bounds (uint32), all little-endian
+MAGIC = b"PKRT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII12x")
+
+DEFAULT_NODE_SIZE = 16
+HILBERT_MAX = (1 << 16) - 1
+
+
+def hilbert_values(bounds, extent=None):
+    """Return the 32-bit Hilbert curve value of the center of each (minx, miny, maxx, maxy) row."""
+    bounds = np.asarray(bounds, dtype="float64")
+    if extent is None:
+        extent = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+
+    width = max(extent[2] - extent[0], 1e-12)
+    height = max(extent[3] - extent[1], 1e-12)
+    x = np.floor(HILBERT_MAX * ((bounds[:, 0] + bounds[:, 2]) / 2 - extent[0]) / width).astype("uint32")
+    y = np.floor(HILBERT_MAX * ((bounds[:, 1] + bounds[:, 3]) / 2 - extent[1]) / height).astype("uint32")
+
+    # Branch-free Hilbert index, vectorized from https://github.com/rawrunprotected/hilbert_curves
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C = C ^ ((a & (c >> 2)) ^ (b & (d >> 2)))
+    D = D ^ ((b & (c >> 2)) ^ ((a ^ b) & (d >> 2)))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C = C ^ ((a & (c >> 4)) ^ (b & (d >> 4)))
+    D = D ^ ((b & (c >> 4)) ^ ((a ^ b) & (d >> 4)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return ((i1 << 1) | i0).astype("uint32")
+
+
+class PackedIndex:
+    """Static packed Hilbert R-tree stored as flat arrays of node boxes and indices.
+
+    Level 0 holds one box per item in Hilbert order and every level above it holds the
+    union of up to node_size consecutive boxes of the level below, ending with the root.
+    For a leaf box the index is the item id; for any other box it is the position of
+    its first child.
+    """
+
+    def __init__(self, boxes, indices, level_bounds, num_items, node_size=DEFAULT_NODE_SIZE):
+        self.boxes = boxes
+        self.indices = indices
+        self.level_bounds = [int(bound) for bound in level_bounds]
+        self.num_items = num_items
+        self.node_size = node_size
+
+        # Flat memoryviews make scalar element access much cheaper than numpy indexing
+        self._flat_boxes = memoryview(np.ascontiguousarray(boxes).reshape(-1))
+        self._flat_indices = memoryview(np.ascontiguousarray(indices))
+
+    @classmethod
+    def build(cls, bounds, node_size=DEFAULT_NODE_SIZE):
+        """Bulk-load the tree from an (n, 4) array of item bounds, item ids being row positions."""
+        bounds = np.asarray(bounds, dtype="float64").reshape(-1, 4)
+        num_items = len(bounds)
+        if not num_items:
+            raise ValueError("Cannot build a packed index without items")
+
+        order = np.argsort(hilbert_values(bounds), kind="stable")
+        level_boxes = [bounds[order]]
+        level_indices = [order.astype("uint32")]
+        level_bounds = [num_items]
+
+        # Pack each level into parent boxes until a single root remains
+        while len(level_boxes[-1]) > 1:
+            children = level_boxes[-1]
+            starts = np.arange(0, len(children), node_size)
+            parents = np.column_stack([
+                np.minimum.reduceat(children[:, 0], starts),
+                np.minimum.reduceat(children[:, 1], starts),
+                np.maximum.reduceat(children[:, 2], starts),
+                np.maximum.reduceat(children[:, 3], starts),
+            ])
+            level_boxes.append(parents)
+            level_indices.append((starts + level_bounds[-1] - len(children)).astype("uint32"))
+            level_bounds.append(level_bounds[-1] + len(parents))
+
+        return cls(
+            np.ascontiguousarray(np.concatenate(level_boxes)),
+            np.concatenate(level_indices),
+            level_bounds,
+            num_items,
+            node_size,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a packed index previously written with save()."""
+        with open(path, "rb") as index_file:
+            buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, node_size, num_items, num_nodes, num_levels = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} packed index")
+
+        offset = HEADER.size
+        boxes = np.frombuffer(buffer, dtype="<f8", count=num_nodes * 4, offset=offset).reshape(-1, 4)
+        offset += boxes.nbytes
+        indices = np.frombuffer(buffer, dtype="<u4", count=num_nodes, offset=offset)
+        offset += indices.nbytes
+        level_bounds = np.frombuffer(buffer, dtype="<u4", count=num_levels, offset=offset)
+
+        return cls(boxes, indices, level_bounds, num_items, node_size)
+
+    def save(self, path):
+        with open(path, "wb") as index_file:
+            index_file.write(HEADER.pack(
+                MAGIC, VERSION, self.node_size, self.num_items, len(self.boxes), len(self.level_bounds)
+            ))
+            index_file.write(np.asarray(self.boxes, dtype="<f8").tobytes())
+            index_file.write(np.asarray(self.indices, dtype="<u4").tobytes())
+            index_file.write(np.asarray(self.level_bounds, dtype="<u4").tobytes())
+
+    def intersection(self, bounds):
+        """Return the ids of the items whose boxes intersect (minx, miny, maxx, maxy)."""
+        minx, miny, maxx, maxy = bounds
+        boxes = self._flat_boxes
+        indices = self._flat_indices
+        level_bounds = self.level_bounds
+
+        results = []
+        stack = [len(self.boxes) - 1]
+
+        # Nodes hold too few boxes for numpy to pay off, so test them one by one
+        while stack:
+            start = stack.pop()
+            end = min(start + self.node_size, level_bounds[bisect_right(level_bounds, start)])
+            matches = results if start < self.num_items else stack
+
+            for position in range(start, end):
+                offset = position * 4
+                if (boxes[offset] <= maxx and boxes[offset + 1] <= maxy
+                        and boxes[offset + 2] >= minx and boxes[offset + 3] >= miny):
+                    matches.append(indices[position])
+
+        return results
@@ -0,0 +1,10 @@
+#!/bin/sh
+# SageMaker starts the container as "docker run <image> serve", so arguments are ignored
+
+if [ "$SERVER_MODE" = "development" ]; then
+  # Flask's single-process development server
+  exec python /app.py
+fi
+
+# Pre-forked gunicorn workers sharing the data loaded by the master
+exec gunicorn --config /gunicorn.conf.py --chdir / app:app
@@ -0,0 +1,83 @@
+import numpy as np
+import shapely
+
+# Simplified geometry columns are named after their tolerance in millionths of a degree
+COLUMN_PREFIX = "geometry_simplified_"
+
+# Slack on each tolerance so floating point error in the distance test can't misclassify a point
+TOLERANCE_MARGIN = 1.001
+
+
+def column_name(tolerance):
+    return f"{COLUMN_PREFIX}{round(tolerance * 1e6)}"
+
+
+def column_tolerance(column):
+    """Tolerance in degrees of a column named by column_name(), or None for other columns."""
+    suffix = column[len(COLUMN_PREFIX):] if column.startswith(COLUMN_PREFIX) else ""
+    return int(suffix) / 1e6 if suffix.isdigit() else None
+
+
+class SimplifiedGeometries:
+    """Coarse-to-fine point-in-district tests over topology-preserving simplifications.
+
+    A Douglas-Peucker simplification with tolerance t stays within t of the original boundary,
+    so a point farther than t from the simplified boundary is on the same side of both. Each
+    level answers the points outside its tolerance band and passes the others on to the next
+    finer level, and the last ones to the full-resolution test.
+    """
+
+    def __init__(self, levels):
+        # (tolerance, simplified geometries, their boundaries), coarsest first, all prepared
+        self.levels = []
+        for tolerance, geometries in sorted(levels, key=lambda level: level[0], reverse=True):
+            geometries = np.asarray(geometries, dtype=object)
+            boundaries = shapely.boundary(geometries)
+            shapely.prepare(geometries)
+            shapely.prepare(boundaries)
+            self.levels.append((tolerance * TOLERANCE_MARGIN, geometries, boundaries))
+
+    @classmethod
+    def from_geodataframe(cls, gdf):
+        """Levels from the simplified geometry columns of a GeoDataFrame, or None if it has none."""
+        levels = [
+            (column_tolerance(column), gdf[column].to_numpy())
+            for column in gdf.columns
+            if column_tolerance(column) is not None
+        ]
+        return cls(levels) if levels else None
+
+    @property
+    def tolerances(self):
+        return [tolerance / TOLERANCE_MARGIN for tolerance, _, _ in self.levels]
+
+    def contains(self, idx, point, exact):
+        """Whether district idx contains the point, calling exact(idx, point) only near every boundary."""
+        for tolerance, geometries, boundaries in self.levels:
+            if not boundaries[idx].dwithin(point, tolerance):
+                return geometries[idx].contains(point)
+        return exact(idx, point)
+
+    def contains_xy(self, indices, x, y, exact):
+        """Vectorized contains() over (district, x, y) triples.
+
+        exact(indices, x, y) returns the full-resolution answer for the triples that are
+        within tolerance of every level's boundary.
+        """
+        indices = np.asarray(indices, dtype="int64")
+        result = np.zeros(len(indices), dtype=bool)
+        pending = np.arange(len(indices))
+
+        for tolerance, geometries, boundaries in self.levels:
+            if not len(pending):
+                return result
+            points = shapely.points(x[pending], y[pending])
+            near = shapely.dwithin(boundaries[indices[pending]], points, tolerance)
+
+            decided = pending[~near]
+            result[decided] = shapely.contains_xy(geometries[indices[decided]], x[decided], y[decided])
+            pending = pending[near]
+
+        if len(pending):
+            result[pending] = exact(indices[pending], x[pending], y[pending])
+        return result
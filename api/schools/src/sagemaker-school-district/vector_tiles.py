@@ -0,0 +1,246 @@
+import gzip
+import struct
+
+import numpy as np
+import shapely
+
+from tile_archive import TileArchiveWriter, zxy_to_tile_id
+
+# Tile coordinates per tile side, and the margin kept beyond each edge so strokes join across tiles
+EXTENT = 4096
+BUFFER = 64
+
+# Simplification tolerance in tile units (8 units are about a pixel on a 512 px tile)
+SIMPLIFY_UNITS = 4
+
+# Tiles larger than this (gzip-compressed) are simplified again at twice the tolerance, up to MAX_RESIMPLIFY times
+MAX_TILE_SIZE = 500 * 1024
+MAX_RESIMPLIFY = 4
+
+# Half the side of the Web Mercator world, and the latitude where it is cut off
+WORLD_HALF = 20037508.342789244
+MAX_LATITUDE = 85.0511287798
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POLYGON = 3
+
+
+def to_web_mercator(lngs, lats):
+    lats = np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)
+    x = np.radians(lngs) * 6378137.0
+    y = np.log(np.tan(np.pi / 4 + np.radians(lats) / 2)) * 6378137.0
+    return x, y
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator (minx, miny, maxx, maxy) of a tile."""
+    size = 2 * WORLD_HALF / (1 << z)
+    minx = -WORLD_HALF + x * size
+    maxy = WORLD_HALF - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, z):
+    """Inclusive (x0, y0, x1, y1) tile range covering Web Mercator bounds at zoom z."""
+    n = 1 << z
+    size = 2 * WORLD_HALF / n
+    minx, miny, maxx, maxy = bounds
+    x0 = min(max(int((minx + WORLD_HALF) // size), 0), n - 1)
+    x1 = min(max(int((maxx + WORLD_HALF) // size), 0), n - 1)
+    y0 = min(max(int((WORLD_HALF - maxy) // size), 0), n - 1)
+    y1 = min(max(int((WORLD_HALF - miny) // size), 0), n - 1)
+    return x0, y0, x1, y1
+
+
+# Protocol buffer encoding of the vector tile schema (https://github.com/mapbox/vector-tile-spec)
+def varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def field(number, payload):
+    """Length-delimited field."""
+    return varint((number << 3) | 2) + varint(len(payload)) + payload
+
+
+def packed(number, values):
+    return field(number, b"".join(varint(value) for value in values))
+
+
+def encode_value(value):
+    if isinstance(value, bool):
+        return varint((7 << 3) | 0) + varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return varint((6 << 3) | 0) + varint((int(value) << 1) ^ (int(value) >> 63))
+    if isinstance(value, (float, np.floating)):
+        return varint((3 << 3) | 1) + struct.pack("<d", float(value))
+    return field(1, str(value).encode("utf-8"))
+
+
+def ring_commands(ring, exterior, cursor):
+    """Geometry commands of one ring of integer tile coordinates, or [] if it collapsed.
+
+    Exterior rings are wound clockwise in tile coordinates (positive area, y pointing down)
+    and interior rings counter-clockwise, as the specification requires.
+    """
+    # Drop the closing point and repeated points left by rounding to the tile grid
+    points = ring[:-1]
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    if len(points) > 1 and np.all(points[0] == points[-1]):
+        points = points[:-1]
+    if len(points) < 3:
+        return []
+
+    x, y = points[:, 0], points[:, 1]
+    area = np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)
+    if area == 0:
+        return []
+    if (area > 0) != exterior:
+        points = points[::-1]
+
+    deltas = np.diff(np.vstack([cursor, points]), axis=0)
+    cursor[:] = points[-1]
+
+    commands = [(1 << 3) | MOVE_TO, zigzag(int(deltas[0, 0])), zigzag(int(deltas[0, 1])), ((len(points) - 1) << 3) | LINE_TO]
+    for dx, dy in deltas[1:]:
+        commands.append(zigzag(int(dx)))
+        commands.append(zigzag(int(dy)))
+    commands.append((1 << 3) | CLOSE_PATH)
+    return commands
+
+
+def polygon_commands(geometry):
+    commands = []
+    cursor = np.zeros(2, dtype="int64")
+    for polygon in shapely.get_parts(geometry):
+        if polygon.geom_type != "Polygon" or polygon.is_empty:
+            continue
+        exterior = ring_commands(shapely.get_coordinates(polygon.exterior).astype("int64"), True, cursor)
+        if not exterior:
+            continue
+        commands += exterior
+        for interior in polygon.interiors:
+            commands += ring_commands(shapely.get_coordinates(interior).astype("int64"), False, cursor)
+    return commands
+
+
+def encode_layer(name, features):
+    """One MVT layer from (id, geometry in tile coordinates, properties) features."""
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, geometry, properties in features:
+        commands = polygon_commands(geometry)
+        if not commands:
+            continue
+
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+
+        encoded.append(field(2,
+            varint((1 << 3) | 0) + varint(int(feature_id))
+            + packed(2, tags)
+            + varint((3 << 3) | 0) + varint(POLYGON)
+            + packed(4, commands)
+        ))
+
+    if not encoded:
+        return None
+    return field(3,
+        varint((15 << 3) | 0) + varint(2)
+        + field(1, name.encode("utf-8"))
+        + b"".join(encoded)
+        + b"".join(field(3, key.encode("utf-8")) for key in keys)
+        + b"".join(field(4, encode_value(value)) for _, value in values)
+        + varint((5 << 3) | 0) + varint(EXTENT)
+    )
+
+
+def render_tile(layer_name, geometries, tree, properties, z, x, y):
+    """The gzip-compressed tile z/x/y of Web Mercator geometries simplified for zoom z, or None if it is empty.
+
+    Tiles over MAX_TILE_SIZE are simplified again at twice the tolerance each time.
+    """
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    scale = EXTENT / (maxx - minx)
+    margin = BUFFER / scale
+
+    candidates = np.sort(tree.query(shapely.box(minx - margin, miny - margin, maxx + margin, maxy + margin)))
+    if not len(candidates):
+        return None
+
+    tolerance = SIMPLIFY_UNITS / scale
+    selected = geometries[candidates]
+    for attempt in range(MAX_RESIMPLIFY + 1):
+        if attempt:
+            tolerance *= 2
+            selected = shapely.simplify(geometries[candidates], tolerance, preserve_topology=True)
+        clipped = shapely.clip_by_rect(selected, minx - margin, miny - margin, maxx + margin, maxy + margin)
+        # Tile coordinates have their origin at the top left corner, with y pointing down
+        local = shapely.transform(clipped, lambda coords: np.rint((coords - (minx, maxy)) * (scale, -scale)))
+        layer = encode_layer(layer_name, (
+            (idx, geometry, properties[idx])
+            for idx, geometry in zip(candidates, local)
+            if not geometry.is_empty
+        ))
+        if layer is None:
+            return None
+
+        tile = gzip.compress(layer, mtime=0)
+        if len(tile) <= MAX_TILE_SIZE:
+            break
+    return tile
+
+
+def build_tile_archive(geometries, properties, path, min_zoom, max_zoom, layer_name="districts"):
+    """Render lon/lat geometries into MVT tiles from min_zoom to max_zoom and pack them into a PMTiles archive.
+
+    properties holds the attributes of every geometry; features are identified by row position.
+    At each zoom the geometries are simplified by SIMPLIFY_UNITS tile units before clipping.
+    Returns the number of tiles written.
+    """
+    bounds = shapely.total_bounds(geometries)
+
+    # Project to Web Mercator once, then simplify per zoom
+    projected = shapely.transform(geometries, lambda coords: np.column_stack(to_web_mercator(coords[:, 0], coords[:, 1])))
+    projected_bounds = shapely.bounds(projected)
+
+    writer = TileArchiveWriter(path)
+    tiles = 0
+    for z in range(min_zoom, max_zoom + 1):
+        tolerance = SIMPLIFY_UNITS * 2 * WORLD_HALF / (1 << z) / EXTENT
+        simplified = shapely.simplify(projected, tolerance, preserve_topology=True)
+        tree = shapely.STRtree(simplified)
+
+        # Only tiles overlapping some district's bounds, in Hilbert (tile id) order
+        coords = set()
+        for district_bounds in projected_bounds:
+            x0, y0, x1, y1 = tile_range(district_bounds, z)
+            coords.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+        for tile_id, x, y in sorted((zxy_to_tile_id(z, x, y), x, y) for x, y in coords):
+            tile = render_tile(layer_name, simplified, tree, properties, z, x, y)
+            if tile is not None:
+                writer.add(tile_id, tile)
+                tiles += 1
+
+    fields = {key: "Number" if isinstance(value, (int, float, np.number)) else "String" for key, value in (properties[0] if properties else {}).items()}
+    writer.finish({
+        "name": layer_name,
+        "format": "pbf",
+        "vector_layers": [{"id": layer_name, "fields": fields, "minzoom": min_zoom, "maxzoom": max_zoom}],
+    }, min_zoom, max_zoom, bounds)
+    return tiles
@@ -0,0 +1,109 @@
+from lambda_runtime import InitTimer, client
+init = InitTimer('search_schools')
+
+import json
+import math
+import os
+from instrumentation import RequestTimer, get_logger, log_debug_json
+from school_search import SearchIndex
+from school_snapshot import SnapshotLoader
+from serialization import compress_response
+
+logger = get_logger("search-schools")
+init.mark('imports')
+
+# Initialize the DynamoDB client, used only to read the data version the index is checked against
+dynamodb = client('dynamodb')
+table_name = os.environ['TABLE_NAME']  # Set this in Lambda's environment variables
+init.mark('clients')
+
+# Directory holding the search index (a Lambda layer under /opt, or /tmp), and where it is downloaded from
+SEARCH_INDEX_DIR = os.getenv('SEARCH_INDEX_DIR', '/tmp/search-index')
+SEARCH_INDEX_BUCKET = os.getenv('SEARCH_INDEX_BUCKET')
+SEARCH_INDEX_KEY = os.getenv('SEARCH_INDEX_KEY', 'school_search.bin')
+
+# How often the seeder's data version stamp is re-read to pick up a new index
+DATA_VERSION_CHECK_SECONDS = float(os.getenv('DATA_VERSION_CHECK_SECONDS', '60'))
+
+# How long browsers and CDNs may reuse a result (max-age of the Cache-Control header)
+SEARCH_CACHE_SECONDS = int(os.getenv('SEARCH_CACHE_SECONDS', '300'))
+
+# Results per request, and the longest query accepted
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_QUERY_LENGTH = 100
+
+search_index = SnapshotLoader(
+    dynamodb, table_name, SEARCH_INDEX_DIR,
+    client('s3') if SEARCH_INDEX_BUCKET else None, SEARCH_INDEX_BUCKET, SEARCH_INDEX_KEY,
+    DATA_VERSION_CHECK_SECONDS, logger, opener=SearchIndex,
+)
+search_index.latest()
+init.mark('search_index')
+init.emit(loaded=search_index.snapshot is not None)
+
+def parse_search_params(query_params):
+    """Return (query, limit, district_id, state, lat, lng) from query string parameters, or raise ValueError."""
+    query = (query_params.get('q') or '').strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q must have between 1 and {MAX_QUERY_LENGTH} characters.')
+
+    limit = query_params.get('limit')
+    if limit is None:
+        limit = DEFAULT_LIMIT
+    elif not limit.isdigit() or not 0 < int(limit) <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}.')
+
+    lat, lng = query_params.get('lat'), query_params.get('lng')
+    if (lat is None) != (lng is None):
+        raise ValueError('lat and lng must be given together.')
+    if lat is not None:
+        try:
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            raise ValueError('lat and lng must be numbers.')
+        if not (math.isfinite(lat) and math.isfinite(lng) and abs(lat) <= 90 and abs(lng) <= 180):
+            raise ValueError('lat must be between -90 and 90, and lng between -180 and 180.')
+
+    return query, int(limit), query_params.get('district_id') or None, query_params.get('state') or None, lat, lng
+
+def lambda_handler(event, context):
+    # Log the incoming event for debugging
+    log_debug_json(logger, "Received event", event)
+    timer = RequestTimer('search_schools', logger=logger)
+
+    # Define CORS headers
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',  # Allow all origins
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',  # Allow specific HTTP methods
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization'  # Allow specific headers
+    }
+
+    try:
+        query, limit, district_id, state, lat, lng = parse_search_params(event.get('queryStringParameters') or {})
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': cors_headers,
+            'body': json.dumps({'error': str(e)})
+        }
+
+    # A stale index is still served: names rarely change, and the alternative is a table scan
+    index = search_index.latest(timer)
+    if index is None:
+        return {
+            'statusCode': 503,
+            'headers': cors_headers,
+            'body': json.dumps({'error': 'Search index is not available'})
+        }
+
+    results = index.search(query, limit, district_id, state, lat, lng, timer)
+    with timer.phase('serialization'):
+        body = f'{{"schools":[{",".join(index.document(row, distance) for row, distance in results)}]}}'
+
+    timer.emit(results=len(results), near=lat is not None, stale=not search_index.fresh)
+    return compress_response({
+        'statusCode': 200,
+        'headers': {**cors_headers, 'Cache-Control': f'public, max-age={SEARCH_CACHE_SECONDS}'},
+        'body': body
+    }, event)
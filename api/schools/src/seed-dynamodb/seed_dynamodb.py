@@ -1,69 +1,397 @@
 import boto3
 import json
 import argparse
+import hashlib
+import math
+import os
+import random
 import sys
+import threading
+import time
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from boto3.dynamodb.types import TypeSerializer
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
 from decimal import Decimal
 
-def convert_floats_to_decimals(obj):
-    """
-    Recursively convert all float values in a JSON-like object to Decimal.
-    """
-    if isinstance(obj, float):
-        return Decimal(str(obj))  # Convert float to Decimal
-    elif isinstance(obj, dict):
-        return {k: convert_floats_to_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_floats_to_decimals(item) for item in obj]
-    else:
-        return obj
+# The data version key, geohash attributes, snapshot and search index formats are shared with the Lambdas that read the table
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+from cache import DATA_VERSION_KEY
+from geohash import GEOHASH_ATTRIBUTE, GEOHASH_PREFIX_ATTRIBUTE, PARTITION_PRECISION, encode
+from school_search import coordinate, write_search_index
+from school_snapshot import write_snapshot
+from serialization import deserialize_item, dumps
+
+# DynamoDB limits: 25 items per batch
+BATCH_SIZE = 25
+
+# Partition key of the Schools table
+KEY_ATTRIBUTE = "school_id"
+
+# Bytes read from the JSON file at a time
+READ_SIZE = 1024 * 1024
+
+# Error codes that mean "slow down" rather than "this request is wrong"
+THROTTLING_ERRORS = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"}
 
 # Command-line argument parsing
 parser = argparse.ArgumentParser(description="Seed a DynamoDB table with data from a JSON file.")
-parser.add_argument("--profile", required=True, help="AWS profile to use for credentials.")
+parser.add_argument("--profile", help="AWS profile to use for credentials (defaults to the standard credential chain).")
 parser.add_argument("--region", required=True, help="AWS region where the DynamoDB table is located.")
 parser.add_argument("--file", required=True, help="Path to the JSON file containing the data.")
+parser.add_argument("--table", default="Schools", help="Name of the DynamoDB table.")
+parser.add_argument("--endpoint-url", help="DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local.")
+parser.add_argument("--workers", type=int, default=16, help="Number of batch writes kept in flight.")
+parser.add_argument("--max-retries", type=int, default=10, help="Attempts per batch before giving up.")
+parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <file>.checkpoint).")
+parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and seed from the first item.")
+parser.add_argument("--diff", action="store_true", help="Only write new or changed items, and delete items missing from the file.")
+parser.add_argument("--lat-attribute", default="lat", help="Attribute holding a school's latitude, used for its geohash.")
+parser.add_argument("--lng-attribute", default="lng", help="Attribute holding a school's longitude, used for its geohash.")
+parser.add_argument("--manifest", help="Content hash manifest used by --diff (defaults to <table>.manifest.json next to the file).")
+parser.add_argument("--snapshot", help="Also write every item to this schools snapshot file, stamped with the new data version, for the read Lambdas.")
+parser.add_argument("--search-index", help="Also write a school name search index to this file, stamped with the new data version, for the search Lambda.")
+parser.add_argument("--district-records", help="district_records.json from main.py, whose NAME of each GEOID is indexed along with the school names.")
+parser.add_argument("--name-attribute", default="name", help="Attribute holding a school's name, for the search index.")
+parser.add_argument("--state-attribute", default="state", help="Attribute holding a school's state, for the search index.")
 args = parser.parse_args()
 
+# Attributes of every school returned by a search, besides the district name from --district-records
+SEARCH_ATTRIBUTES = dict.fromkeys([KEY_ATTRIBUTE, args.name_attribute, "district_id", "city", args.state_attribute, args.lat_attribute, args.lng_attribute])
+
+def iter_json_array(file):
+    """Yield the elements of a top-level JSON array one at a time, reading the file in chunks.
+
+    Floats are parsed straight to Decimal, which is what DynamoDB expects.
+    """
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError(f"{file.name} does not contain a JSON array")
+    position = 1
+
+    while True:
+        # Skip whitespace and the separator before the next element
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise ValueError(f"{file.name} ends before the JSON array is closed")
+            buffer, position = chunk, 0
+
+        if buffer[position] == "]":
+            return
+
+        # Decode the next element, reading more of the file until it is complete
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    raise
+                buffer, position = buffer[position:] + chunk, 0
+
+        yield item
+        position = end
+
+def with_geohash(item):
+    """Add the geohash attributes GeohashIndex is keyed on, for items with valid coordinates.
+
+    Items whose coordinates are missing, not numbers or out of range are written without them.
+    """
+    lat, lng = coordinate(item.get(args.lat_attribute), 90), coordinate(item.get(args.lng_attribute), 180)
+    if math.isnan(lat) or math.isnan(lng):
+        return item
+    geohash = encode(lat, lng)
+    return {**item, GEOHASH_ATTRIBUTE: geohash, GEOHASH_PREFIX_ATTRIBUTE: geohash[:PARTITION_PRECISION]}
+
+def serialize_item(item, serializer=TypeSerializer()):
+    return {k: serializer.serialize(v) for k, v in with_geohash(item).items()}
+
+def canonical_value(value):
+    """Normalize a DynamoDB attribute value so equal data always hashes the same way."""
+    (kind, data), = value.items()
+    if kind == "N":
+        return {kind: str(Decimal(data).normalize())}
+    if kind == "NS":
+        return {kind: sorted(str(Decimal(n).normalize()) for n in data)}
+    if kind in ("SS", "BS"):
+        return {kind: sorted(data)}
+    if kind == "M":
+        return {kind: {k: canonical_value(v) for k, v in data.items()}}
+    if kind == "L":
+        return {kind: [canonical_value(v) for v in data]}
+    return value
+
+def content_hash(serialized_item):
+    """Hash of an item in DynamoDB JSON form, identical for a file item and its stored copy."""
+    canonical = json.dumps({k: canonical_value(v) for k, v in serialized_item.items()}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+def collect_artifact_rows(key, serialized_item):
+    """Keep what --snapshot and --search-index need of an item, read the way the Lambdas read it from the table."""
+    if snapshot_rows is None and search_rows is None:
+        return
+    school = deserialize_item(serialized_item)
+    if snapshot_rows is not None:
+        snapshot_rows[key] = (key, school.get("district_id"), dumps(school))
+    if search_rows is not None:
+        summary = {attribute: school[attribute] for attribute in SEARCH_ATTRIBUTES if attribute in school}
+        search_rows[key] = (school.get(args.name_attribute), school.get("district_id"), school.get(args.state_attribute),
+                            school.get(args.lat_attribute), school.get(args.lng_attribute), summary)
+
+def iter_put_requests(items, skip, current_hashes):
+    """Yield puts for every item after the first skip, hashing all of them for the next manifest."""
+    for i, item in enumerate(items):
+        serialized = serialize_item(item)
+        current_hashes[item[KEY_ATTRIBUTE]] = content_hash(serialized)
+        collect_artifact_rows(item[KEY_ATTRIBUTE], serialized)
+        if i >= skip:
+            yield {"PutRequest": {"Item": serialized}}
+
+def iter_changed_requests(items, previous_hashes, current_hashes, changes):
+    """Yield puts for new or changed items, then deletes for items no longer in the file.
+
+    current_hashes is filled in with the hash of every item, for the next manifest.
+    """
+    for item in items:
+        serialized = serialize_item(item)
+        key = item[KEY_ATTRIBUTE]
+        current_hashes[key] = content_hash(serialized)
+        collect_artifact_rows(key, serialized)
+
+        previous = previous_hashes.get(key)
+        if previous == current_hashes[key]:
+            changes["unchanged"] += 1
+            continue
+        changes["changed" if previous else "inserted"] += 1
+        yield {"PutRequest": {"Item": serialized}}
+
+    for key in previous_hashes.keys() - current_hashes.keys():
+        changes["deleted"] += 1
+        yield {"DeleteRequest": {"Key": {KEY_ATTRIBUTE: {"S": key}}}}
+
+def iter_batches(requests):
+    """Group write requests into batches of BATCH_SIZE."""
+    batch = []
+    for request in requests:
+        batch.append(request)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_batch(requests):
+    """Write one batch, retrying throttling and unprocessed items with exponential backoff and full jitter."""
+    request_items = {args.table: requests}
+    for attempt in range(args.max_retries):
+        if attempt:
+            stats.add(retries=1)
+            time.sleep(random.uniform(0, min(20.0, 0.05 * 2 ** attempt)))
+
+        try:
+            response = dynamodb.batch_write_item(RequestItems=request_items)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in THROTTLING_ERRORS:
+                continue
+            raise
+
+        request_items = response.get("UnprocessedItems")
+        if not request_items:
+            return len(requests)
+
+    raise RuntimeError(f"Batch still has unprocessed items after {args.max_retries} attempts")
+
+class Progress:
+    """Thread-safe counters for throughput reporting."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = 0
+        self.retries = 0
+        self.start = time.perf_counter()
+        self.last_report = 0.0
+
+    def add(self, items=0, retries=0):
+        with self.lock:
+            self.items += items
+            self.retries += retries
+
+    def report(self, force=False):
+        elapsed = time.perf_counter() - self.start
+        if force or elapsed - self.last_report >= 1.0:
+            self.last_report = elapsed
+            sys.stdout.write(f"\rWritten {self.items} items in {elapsed:.0f}s ({self.items / max(elapsed, 1e-9):.0f} items/s, {self.retries} retries)   ")
+            sys.stdout.flush()
+
+def load_manifest():
+    """Return the content hash of every stored item, from the manifest or else from a table scan."""
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("table") == args.table:
+            return manifest["hashes"]
+        print(f"Ignoring {manifest_path}: it was written for table {manifest.get('table')}")
+
+    print(f"No manifest for {args.table}, hashing the stored items with a parallel scan...")
+
+    def scan_segment(segment):
+        hashes = {}
+        paginator = dynamodb.get_paginator("scan")
+        for page in paginator.paginate(TableName=args.table, Segment=segment, TotalSegments=args.workers):
+            for item in page["Items"]:
+                hashes[item[KEY_ATTRIBUTE]["S"]] = content_hash(item)
+        return hashes
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        hashes = {key: value for segment in executor.map(scan_segment, range(args.workers)) for key, value in segment.items()}
+
+    # The version stamp is not a school and must never be deleted
+    hashes.pop(DATA_VERSION_KEY, None)
+    return hashes
+
+def save_manifest(hashes):
+    with open(f"{manifest_path}.partial", "w") as manifest_file:
+        json.dump({"table": args.table, "hashes": hashes}, manifest_file)
+    os.replace(f"{manifest_path}.partial", manifest_path)
+
+def file_identity(path):
+    stat = os.stat(path)
+    return {"file": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_checkpoint():
+    """Return how many leading items of the file are already written."""
+    if args.restart or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    if {key: checkpoint.get(key) for key in identity} != identity or checkpoint.get("table") != args.table:
+        print(f"Ignoring {checkpoint_path}: it was written for a different file or table")
+        return 0
+    return checkpoint["items_written"]
+
+def save_checkpoint(items_written):
+    # Write next to the checkpoint and rename, so an interruption never leaves it truncated
+    with open(f"{checkpoint_path}.partial", "w") as checkpoint_file:
+        json.dump({**identity, "table": args.table, "items_written": items_written}, checkpoint_file)
+    os.replace(f"{checkpoint_path}.partial", checkpoint_path)
+
 # Create a session with the specified profile and region
 session = boto3.Session(profile_name=args.profile, region_name=args.region)
-dynamodb = session.client('dynamodb')
+dynamodb = session.client(
+    'dynamodb',
+    endpoint_url=args.endpoint_url,
+    # One connection per in-flight batch; throttled batches back off with jitter in write_batch()
+    config=Config(max_pool_connections=args.workers, retries={"mode": "standard", "max_attempts": 3}),
+)
 
-# Load vanilla JSON file
-with open(args.file, 'r') as file:
-    data = json.load(file, parse_float=Decimal)  # Optionally convert floats at load time
+checkpoint_path = args.checkpoint or f"{args.file}.checkpoint"
+manifest_path = args.manifest or os.path.join(os.path.dirname(os.path.abspath(args.file)), f"{args.table}.manifest.json")
+identity = file_identity(args.file)
 
-# Optionally process all data to ensure Decimal conversion
-data = convert_floats_to_decimals(data)
+# A diff run only rewrites what changed, so an interrupted one is simply rerun instead of checkpointed
+skip = 0 if args.diff else load_checkpoint()
+if skip:
+    print(f"Resuming after {skip} items already written (from {checkpoint_path})")
 
-# Initialize the TypeSerializer
-serializer = TypeSerializer()
+# Content hashes of the items in the file, saved as the manifest for the next --diff run
+current_hashes = {}
 
-# DynamoDB limits: 25 items per batch
-BATCH_SIZE = 25
-chunks = [data[i:i + BATCH_SIZE] for i in range(0, len(data), BATCH_SIZE)]
-
-# Process each chunk
-for i, chunk in enumerate(chunks):
-    # Convert each item to DynamoDB JSON format
-    request_items = {
-        "Schools": [
-            {"PutRequest": {"Item": {k: serializer.serialize(v) for k, v in item.items()}}}
-            for item in chunk
-        ]
-    }
-
-    # Batch write the data to DynamoDB
-    response = dynamodb.batch_write_item(RequestItems=request_items)
-    
-    # Overwrite the terminal line
-    sys.stdout.write(f"\rUploaded batch {i+1}/{len(chunks)}")
-    sys.stdout.flush()
-
-    # Handle unprocessed items (if any)
-    while response.get('UnprocessedItems'):
-        sys.stdout.write(f"\rRetrying unprocessed items in batch {i+1}      ")
-        sys.stdout.flush()
-        response = dynamodb.batch_write_item(RequestItems=response['UnprocessedItems'])
-
-print("\nData seeding complete!")
+# Every item of the file by key, including those a resumed or diff run doesn't write, for --snapshot
+# and --search-index; like the table, a key repeated in the file keeps its last item
+snapshot_rows = {} if args.snapshot else None
+search_rows = {} if args.search_index else None
+if args.diff:
+    previous_hashes = load_manifest()
+    changes = {"inserted": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+
+stats = Progress()
+
+# Batches finish out of order, so the checkpoint only advances over a contiguous run of done batches
+done = set()
+next_batch = 0
+
+def checkpoint_completed():
+    global next_batch
+    advanced = False
+    while next_batch in done:
+        done.remove(next_batch)
+        next_batch += 1
+        advanced = True
+    return advanced and not args.diff
+
+with open(args.file, "r") as file, ThreadPoolExecutor(max_workers=args.workers) as executor:
+    in_flight = {}
+    items = iter_json_array(file)
+    if args.diff:
+        batches = iter_batches(iter_changed_requests(items, previous_hashes, current_hashes, changes))
+    else:
+        batches = iter_batches(iter_put_requests(items, skip, current_hashes))
+
+    try:
+        for index, batch in enumerate(batches):
+            # Keep at most two batches per worker queued, so memory stays flat on large files
+            while len(in_flight) >= args.workers * 2:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done.add(in_flight.pop(future))
+                    stats.add(items=future.result())
+                if checkpoint_completed():
+                    save_checkpoint(skip + next_batch * BATCH_SIZE)
+                stats.report()
+
+            in_flight[executor.submit(write_batch, batch)] = index
+
+        for future in wait(in_flight).done:
+            stats.add(items=future.result())
+    finally:
+        # Record progress made before an error or interruption so a rerun resumes from there
+        for future, index in list(in_flight.items()):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                done.add(index)
+        if checkpoint_completed():
+            save_checkpoint(skip + next_batch * BATCH_SIZE)
+
+stats.report(force=True)
+if os.path.exists(checkpoint_path) and not args.diff:
+    os.remove(checkpoint_path)
+
+save_manifest(current_hashes)
+if args.diff:
+    print("\n" + ", ".join(f"{count} {change}" for change, count in changes.items()))
+
+# Stamp a new data version so warm Lambdas drop their cached responses
+data_version = datetime.now(timezone.utc).isoformat()
+dynamodb.put_item(
+    TableName=args.table,
+    Item={KEY_ATTRIBUTE: {"S": DATA_VERSION_KEY}, "data_version": {"S": data_version}}
+)
+
+if args.snapshot:
+    write_snapshot(args.snapshot, snapshot_rows.values(), data_version)
+    print(f"Schools snapshot written to {args.snapshot} ({len(snapshot_rows)} schools, {os.path.getsize(args.snapshot) / 1024 / 1024:.1f} MB)")
+
+if args.search_index:
+    district_names = {}
+    if args.district_records:
+        with open(args.district_records) as records_file:
+            district_names = {record.get("GEOID"): record.get("NAME") for record in json.load(records_file)}
+
+    def iter_search_rows():
+        for name, district_id, state, lat, lng, summary in search_rows.values():
+            district_name = district_names.get(district_id)
+            if district_name:
+                summary["district_name"] = district_name
+            yield name, district_name, district_id, state, lat, lng, dumps(summary)
+
+    write_search_index(args.search_index, iter_search_rows(), data_version)
+    print(f"Search index written to {args.search_index} ({len(search_rows)} schools, {os.path.getsize(args.search_index) / 1024 / 1024:.1f} MB)")
+
+print(f"\nData seeding complete! Data version: {data_version}")
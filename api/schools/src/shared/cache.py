@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+
+# Schools table item holding the version stamp written by the seeder after every run. It has no
+# district_id or geohash, so no index returns it, and get-school-by-id never serves it as a school.
+DATA_VERSION_KEY = "_data_version"
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire ttl seconds after they were stored.
+
+    Meant for warm Lambda containers: it is not thread-safe, and hits/misses count every
+    get() since the container started.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self, prefix):
+        """Counters as keyword arguments for RequestTimer.emit()."""
+        return {f"{prefix}_hits": self.hits, f"{prefix}_misses": self.misses, f"{prefix}_size": len(self._entries)}
@@ -0,0 +1,190 @@
+import mmap
+import struct
+from bisect import bisect_right
+
+import numpy as np
+
+# File layout: a 16-byte header followed by the cell range starts (uint32), the range ends
+# (uint32) and the district labels (int32), all little-endian and sorted by range start
+MAGIC = b"DGRD"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+
+# Labels returned for points that need an exact polygon test, or that lie outside every district
+BOUNDARY = -1
+OUTSIDE = -2
+
+MIN_LEVEL = 4
+DEFAULT_MAX_LEVEL = 14
+
+# Range ends must fit in uint32, so Morton codes are limited to 30 bits
+MAX_LEVEL = 15
+
+# Quadtree cells cover longitude [-180, 180) and latitude [-90, 90) at every level
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+
+def spread_bits(values):
+    """Interleave zeros between the low 16 bits of each value (vectorized)."""
+    values = np.asarray(values, dtype="uint32") & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    values = (values | (values << 1)) & 0x55555555
+    return values
+
+
+def morton_code(ix, iy):
+    """Scalar version of spread_bits(ix) | (spread_bits(iy) << 1) on plain integers."""
+    code = ix | (iy << 32)
+    code = (code | (code << 8)) & 0x00FF00FF00FF00FF
+    code = (code | (code << 4)) & 0x0F0F0F0F0F0F0F0F
+    code = (code | (code << 2)) & 0x3333333333333333
+    code = (code | (code << 1)) & 0x5555555555555555
+    return (code & 0xFFFFFFFF) | ((code >> 32) << 1)
+
+
+def cell_coordinates(lats, lngs, level):
+    """Return the column and row of the cells containing each point at a quadtree level."""
+    cells = 1 << level
+    ix = np.floor((np.asarray(lngs, dtype="float64") - WORLD[0]) / (WORLD[2] - WORLD[0]) * cells)
+    iy = np.floor((np.asarray(lats, dtype="float64") - WORLD[1]) / (WORLD[3] - WORLD[1]) * cells)
+    return np.clip(ix, 0, cells - 1).astype("uint32"), np.clip(iy, 0, cells - 1).astype("uint32")
+
+
+class DistrictGrid:
+    """Multi-resolution quadtree of grid cells labelled with the district that fully contains them.
+
+    Every stored cell is kept as a range of Morton (Z-order) codes at max_level, so resolving
+    a point is a single binary search over the range starts. Cells that no district touches
+    are labelled OUTSIDE, and cells crossed by a district boundary are not stored at all.
+    """
+
+    # Labels of lookup(), for callers that import the module lazily
+    BOUNDARY = BOUNDARY
+    OUTSIDE = OUTSIDE
+
+    def __init__(self, starts, ends, labels, max_level, num_districts):
+        self.starts = starts
+        self.ends = ends
+        self.labels = labels
+        self.max_level = max_level
+        self.num_districts = num_districts
+
+        # Flat memoryviews make scalar element access much cheaper than numpy indexing
+        self._starts = memoryview(np.ascontiguousarray(starts))
+        self._ends = memoryview(np.ascontiguousarray(ends))
+        self._labels = memoryview(np.ascontiguousarray(labels))
+
+    @classmethod
+    def build(cls, geometries, max_level=DEFAULT_MAX_LEVEL):
+        """Rasterize district geometries, labelled by position, onto cells up to max_level."""
+        # Only building needs shapely, so the read-only side stays light enough for Lambda
+        import shapely
+
+        if not MIN_LEVEL <= max_level <= MAX_LEVEL:
+            raise ValueError(f"max_level must be between {MIN_LEVEL} and {MAX_LEVEL}")
+
+        geometries = np.asarray(geometries)
+        tree = shapely.STRtree(geometries)
+        shapely.prepare(geometries)
+
+        # Start from the cells at MIN_LEVEL that overlap the extent of the districts
+        minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+        (x0, x1), (y0, y1) = cell_coordinates([miny, maxy], [minx, maxx], MIN_LEVEL)
+        ix, iy = np.meshgrid(np.arange(x0, x1 + 1, dtype="uint32"), np.arange(y0, y1 + 1, dtype="uint32"))
+        ix, iy = ix.ravel(), iy.ravel()
+
+        starts, ends, labels = [], [], []
+        for level in range(MIN_LEVEL, max_level + 1):
+            width = (WORLD[2] - WORLD[0]) / (1 << level)
+            height = (WORLD[3] - WORLD[1]) / (1 << level)
+            boxes = shapely.box(WORLD[0] + ix * width, WORLD[1] + iy * height,
+                                WORLD[0] + (ix + 1) * width, WORLD[1] + (iy + 1) * height)
+
+            # Count the districts touching each cell and remember one of them
+            cell_idx, district_idx = tree.query(boxes, predicate="intersects")
+            counts = np.bincount(cell_idx, minlength=len(boxes))
+            candidate = np.full(len(boxes), -1, dtype="int64")
+            candidate[cell_idx] = district_idx
+
+            # A cell touched by a single district is interior if the district contains it properly
+            single = np.flatnonzero(counts == 1)
+            interior = single[shapely.contains_properly(geometries[candidate[single]], boxes[single])]
+            outside = np.flatnonzero(counts == 0)
+
+            shift = 2 * (max_level - level)
+            codes = (spread_bits(ix) | (spread_bits(iy) << 1)).astype("uint64")
+            for cells, cell_labels in ((interior, candidate[interior]), (outside, OUTSIDE)):
+                starts.append(codes[cells] << shift)
+                ends.append((codes[cells] + 1) << shift)
+                labels.append(np.broadcast_to(cell_labels, cells.shape).astype("int32"))
+
+            # Split every remaining cell into its four children at the next level
+            mixed = np.ones(len(boxes), dtype=bool)
+            mixed[interior] = False
+            mixed[outside] = False
+            ix = np.repeat(ix[mixed] * 2, 4) + np.tile(np.array([0, 1, 0, 1], dtype="uint32"), mixed.sum())
+            iy = np.repeat(iy[mixed] * 2, 4) + np.tile(np.array([0, 0, 1, 1], dtype="uint32"), mixed.sum())
+
+        starts, ends, labels = np.concatenate(starts), np.concatenate(ends), np.concatenate(labels)
+        order = np.argsort(starts, kind="stable")
+        starts, ends, labels = starts[order], ends[order], labels[order]
+
+        # Merge adjacent ranges with the same label
+        if len(starts):
+            first = np.concatenate([[True], (starts[1:] != ends[:-1]) | (labels[1:] != labels[:-1])])
+            group = np.cumsum(first) - 1
+            merged_ends = np.zeros(first.sum(), dtype="uint64")
+            np.maximum.at(merged_ends, group, ends)
+            starts, ends, labels = starts[first], merged_ends, labels[first]
+
+        return cls(starts.astype("uint32"), ends.astype("uint32"), labels, max_level, len(geometries))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a grid previously written with save()."""
+        with open(path, "rb") as grid_file:
+            buffer = mmap.mmap(grid_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, max_level, num_districts, num_cells = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} district grid")
+
+        offset = HEADER.size
+        starts = np.frombuffer(buffer, dtype="<u4", count=num_cells, offset=offset)
+        ends = np.frombuffer(buffer, dtype="<u4", count=num_cells, offset=offset + 4 * num_cells)
+        labels = np.frombuffer(buffer, dtype="<i4", count=num_cells, offset=offset + 8 * num_cells)
+
+        return cls(starts, ends, labels, max_level, num_districts)
+
+    def save(self, path):
+        with open(path, "wb") as grid_file:
+            grid_file.write(HEADER.pack(MAGIC, VERSION, self.max_level, self.num_districts, len(self.starts)))
+            grid_file.write(np.asarray(self.starts, dtype="<u4").tobytes())
+            grid_file.write(np.asarray(self.ends, dtype="<u4").tobytes())
+            grid_file.write(np.asarray(self.labels, dtype="<i4").tobytes())
+
+    def lookup(self, lat, lng):
+        """Return the district position containing the point, OUTSIDE, or BOUNDARY if unresolved."""
+        cells = 1 << self.max_level
+        ix = min(max(int((lng - WORLD[0]) / (WORLD[2] - WORLD[0]) * cells), 0), cells - 1)
+        iy = min(max(int((lat - WORLD[1]) / (WORLD[3] - WORLD[1]) * cells), 0), cells - 1)
+        code = morton_code(ix, iy)
+
+        i = bisect_right(self._starts, code) - 1
+        if i >= 0 and code < self._ends[i]:
+            return self._labels[i]
+        return BOUNDARY
+
+    def lookup_many(self, lats, lngs):
+        """Vectorized lookup() for arrays of points."""
+        ix, iy = cell_coordinates(lats, lngs, self.max_level)
+        codes = spread_bits(ix) | (spread_bits(iy) << 1)
+
+        i = np.searchsorted(self.starts, codes, side="right") - 1
+        found = i >= 0
+        i = np.maximum(i, 0)
+        found &= codes < self.ends[i]
+
+        return np.where(found, self.labels[i], BOUNDARY)
@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import NULL_TIMER
+from school_snapshot import project
+from serialization import deserialize_item, dumps
+
+# Global secondary index of the Schools table keyed by district_id (no sort key)
+DISTRICT_INDEX = 'DistrictIndex'
+
+# Largest page a caller can ask for with limit
+MAX_PAGE_LIMIT = 1000
+
+# Sources a cursor can be issued by. They order a district's schools differently (DistrictIndex
+# order for DynamoDB, school_id order for the snapshot), so a cursor only continues on its own.
+DYNAMODB_CURSOR = 'dynamodb'
+SNAPSHOT_CURSOR = 'snapshot'
+
+def encode_cursor(last_evaluated_key, source=DYNAMODB_CURSOR, data_version=None):
+    """Turn a low-level LastEvaluatedKey into an opaque URL-safe token, tagged with its source and data version."""
+    token = {'source': source, 'data_version': data_version, 'key': last_evaluated_key}
+    data = json.dumps(token, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, district_id, source=DYNAMODB_CURSOR, data_version=None):
+    """Turn a token from encode_cursor() back into an ExclusiveStartKey, or raise ValueError.
+
+    A cursor issued by the other source, or for another data version when both are known, is
+    rejected: continuing it would skip or repeat schools.
+    """
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor.')
+    if not isinstance(token, dict) or set(token) != {'source', 'data_version', 'key'}:
+        raise ValueError('Invalid cursor.')
+
+    if token['source'] != source or (token['data_version'] and data_version and token['data_version'] != data_version):
+        raise ValueError('Cursor has expired, the schools changed since it was issued. Request the first page again.')
+
+    # A cursor only continues the district it was issued for
+    key = token['key']
+    if (
+        not isinstance(key, dict)
+        or set(key) != {'district_id', 'school_id'}
+        or not all(isinstance(value, dict) and isinstance(value.get('S'), str) and len(value) == 1 for value in key.values())
+        or key['district_id']['S'] != district_id
+    ):
+        raise ValueError('Invalid cursor.')
+    return key
+
+def parse_page_params(query_params):
+    """Return (limit, cursor, fields) from query string parameters, or raise ValueError."""
+    limit = query_params.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or not 0 < int(limit) <= MAX_PAGE_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_LIMIT}.')
+        limit = int(limit)
+
+    fields = [field for field in (query_params.get('fields') or '').split(',') if field]
+    return limit, query_params.get('cursor') or None, fields
+
+def query_district_json(client, table_name, district_id, fields=None, limit=None, cursor=None, timer=NULL_TIMER, data_version=None):
+    """Query the schools of a district with a low-level DynamoDB client and serialize them as a JSON array.
+
+    Follows LastEvaluatedKey until limit schools were read (every page if limit is None),
+    requesting the next page while the current one is serialized. Returns the number of
+    schools, the JSON array and a cursor for the next page (None after the last one).
+    data_version, when known, is the table's data version stamp the cursors are tied to.
+    """
+    kwargs = {
+        'TableName': table_name,
+        'IndexName': DISTRICT_INDEX,
+        'KeyConditionExpression': '#district = :district',
+        'ExpressionAttributeNames': {'#district': 'district_id'},
+        'ExpressionAttributeValues': {':district': {'S': district_id}},
+    }
+    if fields:
+        kwargs['ProjectionExpression'] = ', '.join(f'#f{i}' for i in range(len(fields)))
+        kwargs['ExpressionAttributeNames'].update({f'#f{i}': field for i, field in enumerate(fields)})
+    if cursor:
+        kwargs['ExclusiveStartKey'] = decode_cursor(cursor, district_id, DYNAMODB_CURSOR, data_version)
+
+    count = 0
+    fragments = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        if limit:
+            kwargs['Limit'] = limit
+        pending = executor.submit(client.query, **kwargs)
+
+        while True:
+            with timer.phase('dynamodb_query'):
+                response = pending.result()
+
+            items = response.get('Items', [])
+            count += len(items)
+            last_key = response.get('LastEvaluatedKey')
+
+            # Start reading the next page before serializing this one
+            if last_key and (limit is None or count < limit):
+                kwargs['ExclusiveStartKey'] = last_key
+                if limit:
+                    kwargs['Limit'] = limit - count
+                pending = executor.submit(client.query, **kwargs)
+            else:
+                pending = None
+
+            if items:
+                with timer.phase('serialization'):
+                    fragments.append(dumps([deserialize_item(item) for item in items])[1:-1])
+
+            if pending is None:
+                break
+
+    next_cursor = encode_cursor(last_key, DYNAMODB_CURSOR, data_version) if last_key else None
+    return count, '[' + ','.join(fragments) + ']', next_cursor
+
+def snapshot_district_json(snapshot, district_id, fields=None, limit=None, cursor=None, timer=NULL_TIMER):
+    """Serve query_district_json() from a SchoolSnapshot, with the same result format.
+
+    Schools come in school_id order, and a cursor continues after the school_id it holds. Its
+    cursors are tagged with the snapshot's version, so DynamoDB rejects them and vice versa.
+    """
+    rows = snapshot.district_rows(district_id)
+    if cursor:
+        rows = snapshot.rows_after(rows, decode_cursor(cursor, district_id, SNAPSHOT_CURSOR, snapshot.version)['school_id']['S'])
+    page = rows[:limit] if limit else rows
+
+    with timer.phase('serialization'):
+        if fields:
+            schools_json = dumps([project(snapshot.document(row), fields) for row in page])
+        else:
+            # The stored documents are already serialized the way dumps() would
+            schools_json = '[' + ','.join(snapshot.document(row) for row in page) + ']'
+
+    next_cursor = None
+    if len(page) < len(rows):
+        next_cursor = encode_cursor({'district_id': {'S': district_id}, 'school_id': {'S': snapshot.school_id(page[-1])}}, SNAPSHOT_CURSOR, snapshot.version)
+    return len(page), schools_json, next_cursor
@@ -0,0 +1,102 @@
+import math
+
+# Attributes the seeder writes on every school with coordinates, and the index over them
+GEOHASH_ATTRIBUTE = 'geohash'
+GEOHASH_PREFIX_ATTRIBUTE = 'geohash_prefix'
+GEOHASH_INDEX = 'GeohashIndex'
+
+# Stored geohashes have 9 characters (cells of about 5 m); the index partitions on the first 4 (about 39 x 20 km)
+PRECISION = 9
+PARTITION_PRECISION = 4
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+BASE32_INDEX = {c: i for i, c in enumerate(BASE32)}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def grid_size(precision):
+    """Number of (longitude, latitude) cells a geohash of this precision divides the world into."""
+    bits = 5 * precision
+    return 1 << ((bits + 1) // 2), 1 << (bits // 2)
+
+def encode_cell(ix, iy, precision):
+    """Geohash of the cell in column ix and row iy of the grid of this precision."""
+    bits = 5 * precision
+    lng_bits, lat_bits = (bits + 1) // 2, bits // 2
+
+    # Geohash bits alternate between longitude and latitude, starting with longitude
+    code = 0
+    for i in range(bits):
+        if i % 2 == 0:
+            code = (code << 1) | ((ix >> (lng_bits - 1 - i // 2)) & 1)
+        else:
+            code = (code << 1) | ((iy >> (lat_bits - 1 - i // 2)) & 1)
+    return ''.join(BASE32[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+def encode(lat, lng, precision=PRECISION):
+    columns, rows = grid_size(precision)
+    ix = min(max(int((lng + 180) / 360 * columns), 0), columns - 1)
+    iy = min(max(int((lat + 90) / 180 * rows), 0), rows - 1)
+    return encode_cell(ix, iy, precision)
+
+def decode(geohash):
+    """Center (lat, lng) of a geohash cell."""
+    precision = len(geohash)
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+
+    code = 0
+    for c in geohash:
+        code = (code << 5) | BASE32_INDEX[c]
+
+    ix = iy = 0
+    for i in range(bits):
+        bit = (code >> (bits - 1 - i)) & 1
+        if i % 2 == 0:
+            ix = (ix << 1) | bit
+        else:
+            iy = (iy << 1) | bit
+
+    columns, rows = 1 << lng_bits, 1 << (bits // 2)
+    return (iy + 0.5) / rows * 180 - 90, (ix + 0.5) / columns * 360 - 180
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, min_lng, max_lat, max_lng) around a circle.
+
+    Latitudes stop at the poles, and a box that reaches a pole or is wider than the world spans
+    longitudes -180 to 180. Otherwise longitudes may run past +/-180 where the circle crosses the
+    antimeridian, and covering_cells wraps them onto the cells on the other side.
+    """
+    lat = min(max(lat, -90), 90)
+    lng = (lng + 180) % 360 - 180
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(lat - dlat, -90), min(lat + dlat, 90)
+    if abs(lat) + dlat >= 90:
+        return min_lat, -180, max_lat, 180
+    dlng = dlat / math.cos(math.radians(abs(lat) + dlat))
+    if dlng >= 180:
+        return min_lat, -180, max_lat, 180
+    return min_lat, lng - dlng, max_lat, lng + dlng
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, precision):
+    """Geohashes of every cell of this precision that intersects the box, wrapping at the antimeridian."""
+    columns, rows = grid_size(precision)
+    x0 = math.floor((min_lng + 180) / 360 * columns)
+    x1 = math.floor((max_lng + 180) / 360 * columns)
+    y0 = min(max(int((min_lat + 90) / 180 * rows), 0), rows - 1)
+    y1 = min(max(int((max_lat + 90) / 180 * rows), 0), rows - 1)
+
+    columns_covered = sorted({x % columns for x in range(x0, min(x1, x0 + columns - 1) + 1)})
+    return [encode_cell(ix, iy, precision) for iy in range(y0, y1 + 1) for ix in columns_covered]
+
+def count_covering_cells(min_lat, min_lng, max_lat, max_lng, precision):
+    columns, rows = grid_size(precision)
+    width = min(math.floor((max_lng + 180) / 360 * columns) - math.floor((min_lng + 180) / 360 * columns) + 1, columns)
+    height = min(max(int((max_lat + 90) / 180 * rows), 0), rows - 1) - min(max(int((min_lat + 90) / 180 * rows), 0), rows - 1) + 1
+    return width * height
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
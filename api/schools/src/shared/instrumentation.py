@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import random
+import time
+
+# Log verbosity for every schools service component (DEBUG logs events and payloads)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Fraction of requests whose phase timings are emitted as metrics
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "0.1"))
+
+# CloudWatch namespace of the embedded metric format records
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "SchoolsAPI")
+
+def get_logger(name):
+    """Return a logger at LOG_LEVEL, with a plain handler when the runtime doesn't install one."""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format="%(levelname)s %(name)s %(message)s")
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    return logger
+
+def log_debug_json(logger, message, payload, **dumps_kwargs):
+    """Log a JSON payload at DEBUG level, serializing it only when DEBUG is enabled."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", message, json.dumps(payload, **dumps_kwargs))
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        phases = self.timer.phases
+        phases[self.name] = phases.get(self.name, 0.0) + (time.perf_counter() - self.start) * 1000
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_PHASE = _NullPhase()
+
+class RequestTimer:
+    """Per-request phase timings, emitted for a sample of requests.
+
+    Timings are only recorded for sampled requests (or when DEBUG is enabled), so an
+    unsampled request pays for a single random() call per timer.
+
+        timer = RequestTimer("get_schools_nearby")
+        with timer.phase("dynamodb_query"):
+            ...
+        timer.emit(district_id=geoid)
+    """
+
+    def __init__(self, operation, sample_rate=None, logger=None):
+        self.operation = operation
+        self.phases = {}
+        self.start = time.perf_counter()
+
+        rate = METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.sampled = random.random() < rate or (logger is not None and logger.isEnabledFor(logging.DEBUG))
+
+    def phase(self, name):
+        return _Phase(self, name) if self.sampled else _NULL_PHASE
+
+    def emit(self, **properties):
+        """Print the timings as a CloudWatch embedded metric format record, if sampled."""
+        if not self.sampled:
+            return
+
+        metrics = {f"{name}_ms": round(value, 3) for name, value in self.phases.items()}
+        metrics["total_ms"] = round((time.perf_counter() - self.start) * 1000, 3)
+
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["operation"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in metrics],
+                }],
+            },
+            "operation": self.operation,
+            **metrics,
+            **properties,
+        }, default=str))
+
+# Timer that never records, for callers that don't pass one
+NULL_TIMER = RequestTimer("null", sample_rate=0)
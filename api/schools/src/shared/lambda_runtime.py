@@ -0,0 +1,70 @@
+import os
+import time
+
+from instrumentation import RequestTimer
+
+# Connections each client keeps open; the batch and proximity queries fan out over threads
+MAX_POOL_CONNECTIONS = int(os.getenv("MAX_POOL_CONNECTIONS", "32"))
+
+# Timeouts of a single attempt, well under API Gateway's 29 second limit so retries still fit
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("CONNECT_TIMEOUT_SECONDS", "2"))
+READ_TIMEOUT_SECONDS = float(os.getenv("READ_TIMEOUT_SECONDS", "10"))
+
+# Attempts per call, including the first, with the standard retry mode's backoff
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "3"))
+
+_session = None
+_clients = {}
+
+def client(service_name, **config):
+    """Return the container's low-level client for a service, creating it on first use.
+
+    Clients share one botocore session, so the credential chain and endpoint data are resolved
+    once per container. Connections are pooled with TCP keep-alive, so a warm container reuses
+    them across invocations instead of paying a new TLS handshake. config overrides the
+    botocore Config defaults above.
+    """
+    key = (service_name, tuple(sorted(config.items())))
+    service_client = _clients.get(key)
+    if service_client is None:
+        # boto3 is imported here so modules that only need timing or cached clients don't pay for it
+        import boto3
+        from botocore.config import Config
+
+        global _session
+        if _session is None:
+            _session = boto3.session.Session()
+
+        service_client = _session.client(service_name, config=Config(**{
+            "max_pool_connections": MAX_POOL_CONNECTIONS,
+            "tcp_keepalive": True,
+            "connect_timeout": CONNECT_TIMEOUT_SECONDS,
+            "read_timeout": READ_TIMEOUT_SECONDS,
+            "retries": {"mode": "standard", "max_attempts": MAX_ATTEMPTS},
+            **config,
+        }))
+        _clients[key] = service_client
+    return service_client
+
+class InitTimer(RequestTimer):
+    """Cold-start timings of a Lambda module, emitted once as a <operation>_init metric record.
+
+    Create it before the module's other imports; each mark() records the time since the previous
+    one, and total_ms covers everything from creation to emit().
+
+        init = InitTimer("get_schools_nearby")
+        import ...
+        init.mark("imports")
+        dynamodb = client("dynamodb")
+        init.mark("clients")
+        init.emit()
+    """
+
+    def __init__(self, operation):
+        super().__init__(f"{operation}_init", sample_rate=1)
+        self.last = self.start
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - self.last) * 1000
+        self.last = now
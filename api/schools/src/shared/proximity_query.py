@@ -0,0 +1,207 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from geohash import (
+    GEOHASH_ATTRIBUTE, GEOHASH_INDEX, GEOHASH_PREFIX_ATTRIBUTE, PARTITION_PRECISION,
+    bounding_box, count_covering_cells, covering_cells, decode, haversine_km,
+)
+from instrumentation import NULL_TIMER
+from serialization import deserialize_item
+
+# Largest radius a caller can search, and the most schools a k-nearest search returns
+MAX_RADIUS_KM = 50
+MAX_K = 100
+
+# Most schools any search returns, so a wide radius in a metro stays well under the 6 MB response limit
+MAX_RESULTS = 500
+
+# First radius tried by a k-nearest search without radius_km; it grows until k schools are found
+INITIAL_RADIUS_KM = 2
+
+# Finest geohash precision queried (cells of about 150 x 150 m), and the most cells queried per radius
+MAX_QUERY_PRECISION = 7
+MAX_QUERY_CELLS = 16
+
+# Most 4-character partitions a radius may cover (a 50 km radius covers about 35 at 40 degrees and 55 at 70);
+# near the poles the radius is shrunk until it fits
+MAX_PARTITION_CELLS = 64
+
+# Most Query calls and schools one search reads from DynamoDB, however dense the cells it covers
+MAX_READ_QUERIES = 128
+MAX_READ_ITEMS = 10000
+
+# Cells queried concurrently (botocore keeps 10 connections per client by default)
+QUERY_WORKERS = 10
+
+def parse_proximity_params(query_params):
+    """Return (radius_km, k) from query string parameters, or raise ValueError."""
+    radius_km = query_params.get('radius_km')
+    if radius_km is not None:
+        try:
+            radius_km = float(radius_km)
+        except ValueError:
+            radius_km = None
+        if radius_km is None or not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be greater than 0 and at most {MAX_RADIUS_KM}.')
+
+    k = query_params.get('k')
+    if k is not None:
+        if not k.isdigit() or not 0 < int(k) <= MAX_K:
+            raise ValueError(f'k must be between 1 and {MAX_K}.')
+        k = int(k)
+    return radius_km, k
+
+def query_precision(box):
+    """Finest precision whose cells cover the box in at most MAX_QUERY_CELLS queries.
+
+    Boxes too wide for that are covered by partitions, of which searchable_radius() allows at most MAX_PARTITION_CELLS.
+    """
+    for precision in range(MAX_QUERY_PRECISION, PARTITION_PRECISION, -1):
+        if count_covering_cells(*box, precision) <= MAX_QUERY_CELLS:
+            return precision
+    return PARTITION_PRECISION
+
+def searchable_radius(lat, lng, radius_km):
+    """Largest radius up to radius_km whose bounding box covers at most MAX_PARTITION_CELLS partitions, or 0."""
+    def fits(radius):
+        return count_covering_cells(*bounding_box(lat, lng, radius), PARTITION_PRECISION) <= MAX_PARTITION_CELLS
+
+    if fits(radius_km):
+        return radius_km
+    # The number of cells only grows with the radius, so bisect down to about a metre
+    low, high = 0.0, radius_km
+    while high - low > 0.001:
+        middle = (low + high) / 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+class ReadBudget:
+    """Query calls and schools a search may still read, shared by the threads querying its cells."""
+
+    def __init__(self, queries, items):
+        self.queries = queries
+        self.items = items
+        self.lock = threading.Lock()
+
+    def exhausted(self):
+        with self.lock:
+            return self.queries <= 0 or self.items <= 0
+
+    def spend(self, items):
+        """Charge one Query call that returned this many items."""
+        with self.lock:
+            self.queries -= 1
+            self.items -= items
+
+def query_cell(client, table_name, cell, fields, budget=None):
+    """Schools in a geohash cell, following LastEvaluatedKey, and whether they are all of them.
+
+    A cell is read only partly when budget (a ReadBudget) runs out first.
+    """
+    kwargs = {
+        'TableName': table_name,
+        'IndexName': GEOHASH_INDEX,
+        'KeyConditionExpression': '#prefix = :prefix',
+        'ExpressionAttributeNames': {'#prefix': GEOHASH_PREFIX_ATTRIBUTE},
+        'ExpressionAttributeValues': {':prefix': {'S': cell[:PARTITION_PRECISION]}},
+    }
+    if len(cell) > PARTITION_PRECISION:
+        kwargs['KeyConditionExpression'] += ' AND begins_with(#geohash, :cell)'
+        kwargs['ExpressionAttributeNames']['#geohash'] = GEOHASH_ATTRIBUTE
+        kwargs['ExpressionAttributeValues'][':cell'] = {'S': cell}
+    if fields:
+        # The geohash is always read, since distances are measured from it
+        projected = list(dict.fromkeys([*fields, 'school_id', GEOHASH_ATTRIBUTE]))
+        kwargs['ProjectionExpression'] = ', '.join(f'#f{i}' for i in range(len(projected)))
+        kwargs['ExpressionAttributeNames'].update({f'#f{i}': field for i, field in enumerate(projected)})
+
+    items = []
+    while True:
+        if budget is not None and budget.exhausted():
+            return items, False
+        response = client.query(**kwargs)
+        page = response.get('Items', [])
+        items.extend(deserialize_item(item) for item in page)
+        if budget is not None:
+            budget.spend(len(page))
+        if 'LastEvaluatedKey' not in response:
+            return items, True
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def search_nearby(client, table_name, lat, lng, radius_km=None, k=None, fields=None, cache=None, timer=NULL_TIMER, limit=None):
+    """Find the schools within radius_km of a point, or its k nearest schools, closest first.
+
+    Schools are read from GeohashIndex one covering cell at a time, in parallel and nearest
+    cells first, and filtered by great-circle distance. Without radius_km the search radius
+    starts at INITIAL_RADIUS_KM and grows until k schools are inside it or it reaches
+    MAX_RADIUS_KM. Near the poles the radius stops at searchable_radius(), and a search reads
+    no more than MAX_READ_QUERIES pages and MAX_READ_ITEMS schools. cache (a TTLCache) keeps the
+    schools of each queried cell across calls. At most limit schools are returned, and never
+    more than MAX_RESULTS. Returns the schools, each with a distance_km, the radius that was
+    searched, and whether more schools than were returned matched, or may have.
+    """
+    fields = tuple(fields or ())
+    cap = min(limit or MAX_RESULTS, MAX_RESULTS)
+    wanted = min(k, cap) if k else None
+    max_radius = searchable_radius(lat, lng, radius_km or MAX_RADIUS_KM)
+    # A radius shrunk to fit MAX_PARTITION_CELLS may leave out schools within the one asked for
+    shrunk = max_radius < (radius_km or MAX_RADIUS_KM)
+    if max_radius <= 0:
+        return [], 0, True
+    radius = min(radius_km or INITIAL_RADIUS_KM, max_radius)
+    budget = ReadBudget(MAX_READ_QUERIES, MAX_READ_ITEMS)
+
+    # Schools of the cells read in full so far in this search; a finer cell is served from a coarser one
+    fetched = {}
+
+    def cell_items(cell):
+        for length in range(PARTITION_PRECISION, len(cell) + 1):
+            items = fetched.get(cell[:length])
+            if items is not None:
+                return cell, [item for item in items if item[GEOHASH_ATTRIBUTE].startswith(cell)], True
+        items = cache.get((cell, fields)) if cache is not None else None
+        if items is not None:
+            return cell, items, True
+        items, complete = query_cell(client, table_name, cell, fields, budget)
+        if complete and cache is not None:
+            cache.put((cell, fields), items)
+        return cell, items, complete
+
+    with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as executor:
+        while True:
+            box = bounding_box(lat, lng, radius)
+            cells = sorted(covering_cells(*box, query_precision(box)), key=lambda cell: haversine_km(lat, lng, *decode(cell)))
+            with timer.phase('dynamodb_query'):
+                results = list(executor.map(cell_items, cells))
+            fetched.update((cell, items) for cell, items, complete in results if complete)
+            partial = not all(complete for _, _, complete in results)
+
+            with timer.phase('distance'):
+                found = {}
+                for _, items, _ in results:
+                    for item in items:
+                        distance = haversine_km(lat, lng, *decode(item[GEOHASH_ATTRIBUTE]))
+                        if distance <= radius:
+                            found[item['school_id']] = (distance, item)
+
+            if partial or wanted is None or len(found) >= wanted or radius >= max_radius:
+                break
+
+            # Grow the radius to where the wanted schools are expected at the density seen so far
+            scale = (wanted / len(found)) ** 0.5 * 1.25 if found else 4
+            radius = min(radius * max(scale, 1.5), max_radius)
+
+    with timer.phase('serialization'):
+        nearest = sorted(found.values(), key=lambda pair: pair[0])[:wanted or cap]
+        schools = []
+        for distance, item in nearest:
+            school = {key: value for key, value in item.items() if key not in (GEOHASH_ATTRIBUTE, GEOHASH_PREFIX_ATTRIBUTE) or key in fields}
+            school['distance_km'] = round(distance, 3)
+            schools.append(school)
+    # Fewer than k schools is only a truncation when limit, MAX_RESULTS or a shrunk radius cut them off.
+    # Cells left partly read may hold schools nearer than those returned.
+    truncated = partial or (len(found) > len(nearest) or shrunk) and (k is None or len(nearest) < k)
+    return schools, round(radius, 3), truncated
@@ -0,0 +1,245 @@
+import heapq
+import math
+import re
+import struct
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from geohash import PARTITION_PRECISION, bounding_box, covering_cells, encode, haversine_km
+from instrumentation import NULL_TIMER
+from school_snapshot import StringColumn, map_sections, offsets_of, write_sections
+
+# File layout, written and mapped like the schools snapshot. Rows are sorted by normalized name.
+MAGIC = b"SSRC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII" + "Q" * 16)
+SECTIONS = (
+    "data_version",       # The seeder's data version stamp, UTF-8
+    "name_offsets",       # uint32 per row + 1, into names
+    "names",              # Normalized name of every row, in sorted order
+    "term_list_offsets",  # uint32 per row + 1, into term_lists
+    "term_lists",         # Terms of every row, each preceded and the list followed by a space
+    "document_offsets",   # uint64 per row + 1, into documents
+    "documents",          # JSON summary of every school returned by a search
+    "coordinates",        # float64 latitude and longitude per row, NaN without coordinates
+    "term_offsets",       # uint32 per term + 1, into terms
+    "terms",              # Sorted unique terms of every row
+    "posting_starts",     # uint32 per term + 1: rows of term i are postings[starts[i]:starts[i + 1]]
+    "postings",           # uint32 rows of every term, ascending within a term
+    "cell_offsets",       # uint32 per cell + 1, into cells
+    "cells",              # Sorted geohashes of PARTITION_PRECISION that have schools
+    "cell_starts",        # uint32 per cell + 1: rows of cell i are cell_rows[starts[i]:starts[i + 1]]
+    "cell_rows",          # uint32 rows of every cell
+)
+
+# Filters are indexed as terms that start with a character no normalized word has
+DISTRICT_FILTER = "district_id"
+STATE_FILTER = "state"
+
+# Most postings read to rank every match of a query; rarer words always fall under it. A query whose
+# rarest word is more common is matched by scanning rows in name order, or cells around the point.
+MAX_CANDIDATES = 2000
+
+# Most rows checked by a scan, so common one- or two-letter prefixes stay within a few milliseconds
+MAX_SCANNED_ROWS = 5000
+
+# First and largest radius of the scan around a point
+INITIAL_RADIUS_KM = 10
+MAX_RADIUS_KM = 250
+
+def normalize(text):
+    """Words of a name, lowercased ASCII: accents are stripped, apostrophes dropped and other punctuation splits words."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    return re.sub(r"[^a-z0-9]+", " ", text.replace("'", "")).split()
+
+def filter_term(name, value):
+    return f"={name}={'_'.join(str(value).casefold().split())}"
+
+def coordinate(value, limit):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return value if math.isfinite(value) and abs(value) <= limit else math.nan
+
+def write_search_index(path, rows, data_version):
+    """Write a search index of (name, district name, district_id, state, lat, lng, JSON document) rows.
+
+    Every word of the school and district names is a term, and the rows of a term prefix are
+    one contiguous run of postings. district_id and state are indexed as exact filter terms.
+    """
+    entries = []
+    for name, district_name, district_id, state, lat, lng, document in rows:
+        words = normalize(name or "")
+        terms = list(dict.fromkeys(words + normalize(district_name or "")))
+        if district_id:
+            terms.append(filter_term(DISTRICT_FILTER, district_id))
+        if state:
+            terms.append(filter_term(STATE_FILTER, state))
+        entries.append((" ".join(words).encode("utf-8"), terms, coordinate(lat, 90), coordinate(lng, 180), document.encode("utf-8")))
+    entries.sort(key=lambda entry: (entry[0], entry[4]))
+
+    postings = defaultdict(list)
+    cells = defaultdict(list)
+    for row, (_, terms, lat, lng, _) in enumerate(entries):
+        for term in terms:
+            postings[term.encode("utf-8")].append(row)
+        if not math.isnan(lat):
+            cells[encode(lat, lng, PARTITION_PRECISION).encode("ascii")].append(row)
+
+    terms = sorted(postings)
+    cell_keys = sorted(cells)
+    term_lists = [f" {' '.join(entry[1])} ".encode("utf-8") for entry in entries]
+    sections = [
+        data_version.encode("utf-8"),
+        offsets_of((entry[0] for entry in entries), "I"),
+        b"".join(entry[0] for entry in entries),
+        offsets_of(term_lists, "I"),
+        b"".join(term_lists),
+        offsets_of((entry[4] for entry in entries), "Q"),
+        b"".join(entry[4] for entry in entries),
+        struct.pack(f"<{2 * len(entries)}d", *(value for entry in entries for value in entry[2:4])),
+        offsets_of(terms, "I"),
+        b"".join(terms),
+        offsets_of((postings[term] for term in terms), "I"),
+        b"".join(struct.pack(f"<{len(postings[term])}I", *postings[term]) for term in terms),
+        offsets_of(cell_keys, "I"),
+        b"".join(cell_keys),
+        offsets_of((cells[cell] for cell in cell_keys), "I"),
+        b"".join(struct.pack(f"<{len(cells[cell])}I", *cells[cell]) for cell in cell_keys),
+    ]
+    write_sections(path, HEADER.pack(MAGIC, VERSION, 0, len(entries), len(terms), len(cell_keys), *(len(section) for section in sections)), sections)
+
+class SearchIndex:
+    """Read-only, memory-mapped school name index from write_search_index()."""
+
+    def __init__(self, path):
+        self._mmap, counts, views = map_sections(path, HEADER, MAGIC, VERSION, len(SECTIONS))
+        _, self.num_rows, self.num_terms, self.num_cells = counts
+        sections = dict(zip(SECTIONS, views))
+
+        self.version = bytes(sections["data_version"]).decode("utf-8")
+        self._names = StringColumn(sections["name_offsets"].cast("I"), sections["names"])
+        self._term_lists = StringColumn(sections["term_list_offsets"].cast("I"), sections["term_lists"])
+        self._documents = StringColumn(sections["document_offsets"].cast("Q"), sections["documents"])
+        self._coordinates = sections["coordinates"].cast("d")
+        self._terms = StringColumn(sections["term_offsets"].cast("I"), sections["terms"])
+        self._posting_starts = sections["posting_starts"].cast("I")
+        self._postings = sections["postings"].cast("I")
+        self._cells = StringColumn(sections["cell_offsets"].cast("I"), sections["cells"])
+        self._cell_starts = sections["cell_starts"].cast("I")
+        self._cell_rows = sections["cell_rows"].cast("I")
+        self.size = len(self._mmap)
+
+    def __len__(self):
+        return self.num_rows
+
+    def document(self, row, distance_km=None):
+        """JSON summary of a row's school, with its distance_km if given."""
+        document = str(self._documents[row], "utf-8")
+        if distance_km is None:
+            return document
+        # Documents are JSON objects, so the distance goes before the closing brace
+        return f'{document[:-1]},"distance_km":{round(distance_km, 3)}}}'
+
+    def distance_km(self, row, lat, lng):
+        school_lat, school_lng = self._coordinates[2 * row], self._coordinates[2 * row + 1]
+        return math.inf if math.isnan(school_lat) else haversine_km(lat, lng, school_lat, school_lng)
+
+    def postings(self, term, prefix=True):
+        """(start, end) of the postings of every term starting with term, or of term itself."""
+        i = bisect_left(self._terms, term)
+        if prefix:
+            j = bisect_left(self._terms, term + b"\xff", i)
+        else:
+            j = i + 1 if i < self.num_terms and self._terms[i] == term else i
+        return self._posting_starts[i], self._posting_starts[j]
+
+    def search(self, query, limit=10, district_id=None, state=None, lat=None, lng=None, timer=NULL_TIMER):
+        """Rows of the schools whose school or district name has a word starting with each word of query.
+
+        Without a point, schools whose name starts with the whole query come first, then the
+        others, each in name order. With lat and lng, they are ranked by distance; schools without
+        coordinates come last, and are left out when the rarest word is too common to rank every
+        match. Returns up to limit (row, distance_km or None) pairs.
+        """
+        words = [word.encode("ascii") for word in normalize(query)]
+        if not words:
+            return []
+        filters = [filter_term(name, value).encode("utf-8") for name, value in ((DISTRICT_FILTER, district_id), (STATE_FILTER, state)) if value]
+
+        # Candidates come from the rarest word or filter, and are checked against the others
+        with timer.phase("postings"):
+            ranges = [self.postings(word) for word in words] + [self.postings(term, prefix=False) for term in filters]
+            start, end = min(ranges, key=lambda postings: postings[1] - postings[0])
+        if start == end:
+            return []
+
+        checks = [b" " + word for word in words] + [b" " + term + b" " for term in filters]
+        term_lists = self._term_lists
+
+        def matches(row):
+            terms = term_lists[row]
+            return all(check in terms for check in checks)
+
+        near = lat is not None and lng is not None
+        with timer.phase("search"):
+            if end - start <= MAX_CANDIDATES:
+                rows = [row for row in dict.fromkeys(self._postings[start:end]) if matches(row)]
+                if near:
+                    nearest = heapq.nsmallest(limit, ((self.distance_km(row, lat, lng), row) for row in rows))
+                    return [(row, None if math.isinf(distance) else distance) for distance, row in nearest]
+                phrase = b" ".join(words)
+                return [(row, None) for row in sorted(rows, key=lambda row: (not self._names[row].startswith(phrase), row))[:limit]]
+
+            if near:
+                return self.scan_around(matches, limit, lat, lng)
+            return [(row, None) for row in self.scan_names(matches, limit, b" ".join(words))]
+
+    def scan_names(self, matches, limit, phrase):
+        """The first matching rows in name order, after those whose name starts with phrase."""
+        first = bisect_left(self._names, phrase)
+        last = bisect_left(self._names, phrase + b"\xff", first)
+        order = (row for rows in (range(first, last), range(first), range(last, self.num_rows)) for row in rows)
+
+        found = []
+        leading = []
+        for scanned, row in enumerate(order):
+            if len(found) + len(leading) >= limit or scanned >= MAX_SCANNED_ROWS:
+                break
+            if matches(row):
+                (leading if first <= row < last else found).append(row)
+        return leading + found
+
+    def scan_around(self, matches, limit, lat, lng):
+        """The nearest matching rows, scanning the cells around the point over a growing radius.
+
+        Like search_nearby(), the radius grows to where limit matches are expected at the density
+        seen so far, until that many are within it or it reaches MAX_RADIUS_KM.
+        """
+        found = {}
+        scanned_cells = set()
+        scanned = 0
+        radius = INITIAL_RADIUS_KM
+        while True:
+            for cell in covering_cells(*bounding_box(lat, lng, radius), PARTITION_PRECISION):
+                if cell in scanned_cells:
+                    continue
+                scanned_cells.add(cell)
+                key = cell.encode("ascii")
+                i = bisect_left(self._cells, key)
+                if i == self.num_cells or self._cells[i] != key:
+                    continue
+                for row in self._cell_rows[self._cell_starts[i]:self._cell_starts[i + 1]]:
+                    scanned += 1
+                    if matches(row):
+                        found[row] = self.distance_km(row, lat, lng)
+
+            within = sum(1 for distance in found.values() if distance <= radius)
+            if within >= limit or radius >= MAX_RADIUS_KM or scanned >= MAX_SCANNED_ROWS:
+                break
+            scale = (limit / within) ** 0.5 * 1.25 if within else 4
+            radius = min(radius * max(scale, 1.5), MAX_RADIUS_KM)
+
+        return [(row, distance) for distance, row in heapq.nsmallest(limit, ((distance, row) for row, distance in found.items()))]
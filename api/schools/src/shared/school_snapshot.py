@@ -0,0 +1,276 @@
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+
+from botocore.exceptions import BotoCoreError, ClientError
+from cache import DATA_VERSION_KEY
+from instrumentation import NULL_TIMER, get_logger
+
+# File layout: a header with the byte length of every section, then the sections in this order,
+# each starting on an 8-byte boundary. Rows are sorted by district_id, then school_id; rows
+# without a district_id come last and are not part of any district range.
+MAGIC = b"SSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII" + "Q" * 9)
+SECTIONS = (
+    "data_version",          # The seeder's data version stamp, UTF-8
+    "key_offsets",           # uint32 per row + 1, into keys
+    "keys",                  # school_id of every row, UTF-8
+    "document_offsets",      # uint64 per row + 1, into documents
+    "documents",             # Every school as the JSON document the Lambdas return
+    "slots",                 # uint32 open-addressing hash table of row + 1 (0 is empty), keyed on crc32(school_id)
+    "district_key_offsets",  # uint32 per district + 1, into district_keys
+    "district_keys",         # Sorted district_id of every district, UTF-8
+    "district_starts",       # uint32 per district + 1: rows of district i are [starts[i], starts[i + 1])
+)
+
+def align(size):
+    return (size + 7) & ~7
+
+def offsets_of(blobs, typecode):
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return struct.pack(f"<{len(offsets)}{typecode}", *offsets)
+
+def write_sections(path, header, sections):
+    """Write a header and its sections, each starting on an 8-byte boundary.
+
+    The file is written next to the destination and renamed, so readers never map a partial file.
+    """
+    with open(f"{path}.partial", "wb") as output_file:
+        for data in (header, *sections):
+            output_file.write(data)
+            output_file.write(b"\0" * (align(len(data)) - len(data)))
+    os.replace(f"{path}.partial", path)
+
+def map_sections(path, header, magic, version, num_sections):
+    """Memory-map a file from write_sections().
+
+    header starts with the magic and the format version, and ends with the byte length of each
+    of the num_sections sections. Returns the mapping, the header fields in between and a view
+    of every section.
+    """
+    with open(path, "rb") as mapped_file:
+        mapping = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+    file_magic, file_version, *fields = header.unpack_from(mapping)
+    if file_magic != magic or file_version != version:
+        raise ValueError(f"{path} is not a version {version} {magic.decode('ascii')} file")
+
+    counts, lengths = fields[:-num_sections], fields[-num_sections:]
+    view = memoryview(mapping)
+    sections = []
+    position = align(header.size)
+    for length in lengths:
+        sections.append(view[position:position + length])
+        position += align(length)
+    return mapping, counts, sections
+
+def write_snapshot(path, rows, data_version):
+    """Write a snapshot of (school_id, district_id or None, JSON document) rows."""
+    rows = sorted(
+        ((school_id.encode("utf-8"), district_id.encode("utf-8") if isinstance(district_id, str) else None, document.encode("utf-8"))
+         for school_id, district_id, document in rows),
+        key=lambda row: (row[1] is None, row[1] or b"", row[0]),
+    )
+
+    # Open addressing at a load factor of at most one half keeps probe sequences short
+    num_slots = 1
+    while num_slots < 2 * len(rows):
+        num_slots *= 2
+    slots = [0] * num_slots
+    for row, (school_id, _, _) in enumerate(rows):
+        slot = zlib.crc32(school_id) & (num_slots - 1)
+        while slots[slot]:
+            if rows[slots[slot] - 1][0] == school_id:
+                raise ValueError(f"Duplicate school_id {school_id.decode('utf-8')}")
+            slot = (slot + 1) & (num_slots - 1)
+        slots[slot] = row + 1
+
+    # Like DistrictIndex, which is sparse, districts only cover rows that have a district_id
+    indexed = sum(1 for row in rows if row[1] is not None)
+    district_keys, district_starts = [], []
+    for row in range(indexed):
+        if not district_keys or district_keys[-1] != rows[row][1]:
+            district_keys.append(rows[row][1])
+            district_starts.append(row)
+    district_starts.append(indexed)
+
+    sections = [
+        data_version.encode("utf-8"),
+        offsets_of((row[0] for row in rows), "I"),
+        b"".join(row[0] for row in rows),
+        offsets_of((row[2] for row in rows), "Q"),
+        b"".join(row[2] for row in rows),
+        struct.pack(f"<{num_slots}I", *slots),
+        offsets_of(district_keys, "I"),
+        b"".join(district_keys),
+        struct.pack(f"<{len(district_starts)}I", *district_starts),
+    ]
+
+    write_sections(path, HEADER.pack(MAGIC, VERSION, 0, len(rows), len(district_keys), num_slots, *(len(section) for section in sections)), sections)
+
+class SchoolSnapshot:
+    """Read-only, memory-mapped snapshot of the Schools table from write_snapshot().
+
+    Only the header is read when it is opened; pages are faulted in as lookups touch them,
+    so memory grows with the schools actually served.
+    """
+
+    def __init__(self, path):
+        self._mmap, counts, views = map_sections(path, HEADER, MAGIC, VERSION, len(SECTIONS))
+        _, self.num_rows, self.num_districts, self.num_slots = counts
+        sections = dict(zip(SECTIONS, views))
+
+        self.version = bytes(sections["data_version"]).decode("utf-8")
+        self._keys = StringColumn(sections["key_offsets"].cast("I"), sections["keys"])
+        self._documents = StringColumn(sections["document_offsets"].cast("Q"), sections["documents"])
+        self._slots = sections["slots"].cast("I")
+        self._district_keys = StringColumn(sections["district_key_offsets"].cast("I"), sections["district_keys"])
+        self._district_starts = sections["district_starts"].cast("I")
+        self.size = len(self._mmap)
+
+    def __len__(self):
+        return self.num_rows
+
+    def school_id(self, row):
+        return str(self._keys[row], "utf-8")
+
+    def document(self, row):
+        return str(self._documents[row], "utf-8")
+
+    def find(self, school_id):
+        """Row of a school, or None if the snapshot doesn't have it."""
+        key = school_id.encode("utf-8")
+        mask = self.num_slots - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            row = self._slots[slot] - 1
+            if row < 0:
+                return None
+            if self._keys[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def get(self, school_id):
+        """JSON document of a school, or None if the snapshot doesn't have it."""
+        row = self.find(school_id)
+        return None if row is None else self.document(row)
+
+    def district_rows(self, district_id):
+        """Rows of a district's schools, sorted by school_id (empty if it has none)."""
+        key = district_id.encode("utf-8")
+        i = bisect_left(self._district_keys, key)
+        if i == len(self._district_keys) or self._district_keys[i] != key:
+            return range(0)
+        return range(self._district_starts[i], self._district_starts[i + 1])
+
+    def rows_after(self, rows, school_id):
+        """The part of a district's rows whose school_id sorts after school_id."""
+        return range(bisect_right(self._keys, school_id.encode("utf-8"), rows.start, rows.stop), rows.stop)
+
+class StringColumn:
+    """Sequence of the byte strings of a column stored as offsets into a blob."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+def project(document, fields):
+    """Keep only the top-level attributes in fields of a JSON document, as a ProjectionExpression would."""
+    school = json.loads(document)
+    return {field: school[field] for field in fields if field in school}
+
+class SnapshotLoader:
+    """Keep a Lambda's schools snapshot in step with the Schools table.
+
+    The snapshot is served only while its version is the data version the seeder last stamped
+    in the table. Otherwise current() returns None, so callers read DynamoDB, and a newer
+    snapshot is fetched from S3 at each check until one matches. opener opens the downloaded
+    file; any artifact the seeder stamps with its data version (a .version) can be loaded.
+    Without a logger, messages go to the school-snapshot logger.
+    """
+
+    def __init__(self, dynamodb, table_name, directory, s3=None, bucket=None, key=None, check_seconds=60, logger=None, opener=SchoolSnapshot):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.path = os.path.join(directory, os.path.basename(key or "schools_snapshot.bin"))
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.check_seconds = check_seconds
+        self.logger = logger or get_logger("school-snapshot")
+        self.opener = opener
+
+        self.snapshot = None
+        self.etag = None
+        self.table_version = None
+        self.fresh = False
+        self.checked_at = float("-inf")
+
+    def current(self, timer=NULL_TIMER):
+        """The snapshot if it matches the table's data version, else None."""
+        self.refresh(timer)
+        return self.snapshot if self.fresh else None
+
+    def latest(self, timer=NULL_TIMER):
+        """The newest snapshot loaded, even if the table has moved past it (None if none could be loaded)."""
+        self.refresh(timer)
+        return self.snapshot
+
+    def refresh(self, timer=NULL_TIMER):
+        now = time.monotonic()
+        if now - self.checked_at >= self.check_seconds:
+            self.checked_at = now
+            self.check(timer)
+
+    def check(self, timer):
+        try:
+            with timer.phase("data_version_check"):
+                item = self.dynamodb.get_item(TableName=self.table_name, Key={"school_id": {"S": DATA_VERSION_KEY}}).get("Item", {})
+        except (BotoCoreError, ClientError) as e:
+            self.logger.warning(f"Could not read the data version, keeping the snapshot state: {str(e)}")
+            return
+        table_version = self.table_version = item.get("data_version", {}).get("S")
+
+        if self.snapshot is None or self.snapshot.version != table_version:
+            try:
+                with timer.phase("snapshot_load"):
+                    self.load()
+            except Exception:
+                self.logger.exception(f"Could not load {os.path.basename(self.path)}")
+
+        fresh = self.snapshot is not None and self.snapshot.version == table_version
+        if fresh != self.fresh:
+            self.logger.info(f"{os.path.basename(self.path)} {self.snapshot.version if self.snapshot else None} "
+                             f"{'matches' if fresh else 'does not match'} data version {table_version}")
+        self.fresh = fresh
+
+    def load(self):
+        """Open the snapshot, downloading it first when it is missing locally or changed in S3."""
+        if self.bucket:
+            etag = self.s3.head_object(Bucket=self.bucket, Key=self.key)["ETag"]
+            if etag == self.etag and self.snapshot is not None:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # A mapped snapshot keeps its own copy of the file it was opened from
+            self.s3.download_file(self.bucket, self.key, f"{self.path}.partial")
+            os.replace(f"{self.path}.partial", self.path)
+            self.etag = etag
+        elif self.snapshot is not None:
+            return
+
+        start_time = time.perf_counter()
+        self.snapshot = self.opener(self.path)
+        self.logger.info(f"Opened {os.path.basename(self.path)} {self.snapshot.version} ({len(self.snapshot)} schools, "
+                         f"{self.snapshot.size / 1024 / 1024:.1f} MB) in {time.perf_counter() - start_time:.3f}s")
@@ -0,0 +1,108 @@
+import base64
+import gzip
+import json
+
+# orjson and brotli are optional: without them responses are encoded with json and compressed with gzip only
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (the encoding overhead isn't worth it)
+MIN_COMPRESS_SIZE = 1024
+
+def deserialize_value(value):
+    """Convert a low-level DynamoDB attribute value to native Python (floats and ints, not Decimals)."""
+    (kind, data), = value.items()
+    if kind == 'S' or kind == 'BOOL':
+        return data
+    if kind == 'N':
+        return parse_number(data)
+    if kind == 'M':
+        return {k: deserialize_value(v) for k, v in data.items()}
+    if kind == 'L':
+        return [deserialize_value(v) for v in data]
+    if kind == 'NULL':
+        return None
+    if kind == 'SS':
+        return list(data)
+    if kind == 'NS':
+        return [parse_number(n) for n in data]
+    if kind == 'B':
+        return base64.b64encode(data).decode('ascii')
+    if kind == 'BS':
+        return [base64.b64encode(b).decode('ascii') for b in data]
+    raise TypeError(f"Unsupported DynamoDB type {kind}")
+
+# Integers orjson can encode; larger ones are returned as floats, as the Decimal encoder used to
+MIN_INT64, MAX_INT64 = -2 ** 63, 2 ** 63 - 1
+
+def parse_number(data):
+    try:
+        number = int(data)
+    except ValueError:
+        return float(data)
+    return number if MIN_INT64 <= number <= MAX_INT64 else float(number)
+
+def deserialize_item(item):
+    return {k: deserialize_value(v) for k, v in item.items()}
+
+def dumps(obj):
+    """Encode native Python data as compact JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def header(event, name):
+    """Case-insensitive lookup of a request header in an API Gateway proxy event."""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+def accepted_encodings(event):
+    """Content codings the client accepts, ignoring those it refuses with q=0."""
+    encodings = set()
+    for part in (header(event, 'Accept-Encoding') or '').split(','):
+        encoding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+def compress_response(response, event):
+    """Compress a proxy response body with br or gzip if the client accepts it.
+
+    Needs binary media types on the REST API so API Gateway decodes the base64 body.
+    """
+    body = response.get('body')
+    if not body or len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, data = 'br', brotli.compress(body.encode('utf-8'), quality=4)
+    elif 'gzip' in encodings:
+        encoding, data = 'gzip', gzip.compress(body.encode('utf-8'), compresslevel=5)
+    else:
+        return response
+
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True,
+    }
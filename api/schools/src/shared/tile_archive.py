@@ -0,0 +1,259 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import struct
+from bisect import bisect_right
+
+# PMTiles version 3 (https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md): a header,
+# a root directory, JSON metadata, leaf directories and the tile data, in one file that can be
+# read with a few byte-range requests
+MAGIC = b"PMTiles"
+VERSION = 3
+HEADER_SIZE = 127
+
+# The header and root directory are fetched together in the first request
+ROOT_FETCH_SIZE = 16384
+
+COMPRESSION_NONE = 1
+COMPRESSION_GZIP = 2
+TILE_TYPE_MVT = 1
+
+# Header fields after the magic, in file order
+HEADER_FORMAT = "<7sB" + "Q" * 11 + "BBBBBB" + "iiii" + "Bii"
+HEADER_FIELDS = (
+    "root_offset", "root_length", "metadata_offset", "metadata_length",
+    "leaf_offset", "leaf_length", "data_offset", "data_length",
+    "addressed_tiles", "tile_entries", "tile_contents",
+    "clustered", "internal_compression", "tile_compression", "tile_type", "min_zoom", "max_zoom",
+    "min_lon_e7", "min_lat_e7", "max_lon_e7", "max_lat_e7",
+    "center_zoom", "center_lon_e7", "center_lat_e7",
+)
+
+
+def zxy_to_tile_id(z, x, y):
+    """Position of a tile along the Hilbert curve of its zoom level, after every lower zoom."""
+    tile_id = ((1 << (2 * z)) - 1) // 3
+    n = 1 << z
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - x, s - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def serialize_directory(entries):
+    """Gzip-compressed directory of (tile_id, offset, length, run_length) entries sorted by tile_id."""
+    out = bytearray()
+    write_varint(out, len(entries))
+    last_id = 0
+    for tile_id, _, _, _ in entries:
+        write_varint(out, tile_id - last_id)
+        last_id = tile_id
+    for _, _, _, run_length in entries:
+        write_varint(out, run_length)
+    for _, _, length, _ in entries:
+        write_varint(out, length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        # 0 means "right after the previous entry", which is most entries in a clustered archive
+        if i > 0 and offset == entries[i - 1][1] + entries[i - 1][2]:
+            write_varint(out, 0)
+        else:
+            write_varint(out, offset + 1)
+    return gzip.compress(bytes(out), mtime=0)
+
+
+def deserialize_directory(data):
+    """Parallel (tile_ids, offsets, lengths, run_lengths) lists of a directory from serialize_directory()."""
+    data = gzip.decompress(data)
+    count, pos = read_varint(data, 0)
+
+    tile_ids, run_lengths, lengths, offsets = [], [], [], []
+    tile_id = 0
+    for _ in range(count):
+        delta, pos = read_varint(data, pos)
+        tile_id += delta
+        tile_ids.append(tile_id)
+    for column in (run_lengths, lengths):
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            column.append(value)
+    for i in range(count):
+        value, pos = read_varint(data, pos)
+        offsets.append(offsets[i - 1] + lengths[i - 1] if value == 0 and i > 0 else value - 1)
+    return tile_ids, offsets, lengths, run_lengths
+
+
+class TileArchiveWriter:
+    """Write tiles in ascending tile_id order into a PMTiles archive.
+
+    Tile data is spooled to <path>.data as tiles are added. Identical tiles are stored once,
+    and consecutive tile ids with identical content share one run-length entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data_path = f"{path}.data"
+        self.data_file = open(self.data_path, "wb")
+        self.entries = []
+        self.contents = {}
+        self.addressed_tiles = 0
+
+    def add(self, tile_id, data):
+        if self.entries and tile_id < self.entries[-1][0] + self.entries[-1][3]:
+            raise ValueError(f"Tile {tile_id} added out of order")
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        location = self.contents.get(digest)
+        if location is None:
+            location = (self.data_file.tell(), len(data))
+            self.data_file.write(data)
+            self.contents[digest] = location
+        self.addressed_tiles += 1
+
+        last = self.entries[-1] if self.entries else None
+        if last and tile_id == last[0] + last[3] and (last[1], last[2]) == location:
+            self.entries[-1] = (last[0], last[1], last[2], last[3] + 1)
+        else:
+            self.entries.append((tile_id, location[0], location[1], 1))
+
+    def build_directories(self):
+        """Root directory and leaf directories, with leaves as large as needed to fit the root in the first fetch."""
+        root = serialize_directory(self.entries)
+        if len(root) <= ROOT_FETCH_SIZE - HEADER_SIZE:
+            return root, b""
+
+        leaf_size = 4096
+        while True:
+            leaves = bytearray()
+            root_entries = []
+            for start in range(0, len(self.entries), leaf_size):
+                leaf = serialize_directory(self.entries[start:start + leaf_size])
+                # A run length of 0 marks an entry pointing at a leaf directory
+                root_entries.append((self.entries[start][0], len(leaves), len(leaf), 0))
+                leaves += leaf
+            root = serialize_directory(root_entries)
+            if len(root) <= ROOT_FETCH_SIZE - HEADER_SIZE:
+                return root, bytes(leaves)
+            leaf_size *= 2
+
+    def finish(self, metadata, min_zoom, max_zoom, bounds, center_zoom=None):
+        """Write the archive. bounds is (min_lon, min_lat, max_lon, max_lat)."""
+        self.data_file.close()
+        data_length = os.path.getsize(self.data_path)
+        root, leaves = self.build_directories()
+        metadata = gzip.compress(json.dumps(metadata, separators=(",", ":")).encode("utf-8"), mtime=0)
+
+        root_offset = HEADER_SIZE
+        metadata_offset = root_offset + len(root)
+        leaf_offset = metadata_offset + len(metadata)
+        data_offset = leaf_offset + len(leaves)
+
+        min_lon, min_lat, max_lon, max_lat = bounds
+        e7 = lambda degrees: int(round(degrees * 1e7))
+        header = struct.pack(
+            HEADER_FORMAT, MAGIC, VERSION,
+            root_offset, len(root), metadata_offset, len(metadata),
+            leaf_offset, len(leaves), data_offset, data_length,
+            self.addressed_tiles, len(self.entries), len(self.contents),
+            # Tile data is written in tile_id order, so the archive is clustered
+            1, COMPRESSION_GZIP, COMPRESSION_GZIP, TILE_TYPE_MVT, min_zoom, max_zoom,
+            e7(min_lon), e7(min_lat), e7(max_lon), e7(max_lat),
+            min_zoom if center_zoom is None else center_zoom, e7((min_lon + max_lon) / 2), e7((min_lat + max_lat) / 2),
+        )
+
+        with open(self.path, "wb") as archive, open(self.data_path, "rb") as data_file:
+            archive.write(header)
+            archive.write(root)
+            archive.write(metadata)
+            archive.write(leaves)
+            shutil.copyfileobj(data_file, archive, 1024 * 1024)
+        os.remove(self.data_path)
+
+
+class TileArchiveReader:
+    """Look up tiles in a PMTiles archive through a read_range(offset, length) callable.
+
+    The header and root directory come from the first range request. Leaf directories are
+    fetched on first use and kept, so a warm reader needs one range request per tile.
+    """
+
+    def __init__(self, read_range):
+        self.read_range = read_range
+
+        head = read_range(0, ROOT_FETCH_SIZE)
+        magic, version, *fields = struct.unpack(HEADER_FORMAT, head[:HEADER_SIZE])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a PMTiles version 3 archive")
+        self.header = dict(zip(HEADER_FIELDS, fields))
+        if self.header["internal_compression"] != COMPRESSION_GZIP:
+            raise ValueError("Only gzip-compressed directories are supported")
+
+        root_offset, root_length = self.header["root_offset"], self.header["root_length"]
+        self.root = deserialize_directory(head[root_offset:root_offset + root_length])
+        self.leaves = {}
+
+    @property
+    def tile_compression(self):
+        return self.header["tile_compression"]
+
+    def metadata(self):
+        data = self.read_range(self.header["metadata_offset"], self.header["metadata_length"])
+        return json.loads(gzip.decompress(data) if self.header["internal_compression"] == COMPRESSION_GZIP else data)
+
+    def find_tile(self, z, x, y):
+        """(offset, length) of a tile's data in the archive, or None if the archive has no such tile."""
+        if not self.header["min_zoom"] <= z <= self.header["max_zoom"]:
+            return None
+        tile_id = zxy_to_tile_id(z, x, y)
+
+        directory = self.root
+        for _ in range(4):
+            tile_ids, offsets, lengths, run_lengths = directory
+            i = bisect_right(tile_ids, tile_id) - 1
+            if i < 0:
+                return None
+            if run_lengths[i] == 0:
+                directory = self.leaf(offsets[i], lengths[i])
+                continue
+            if tile_id < tile_ids[i] + run_lengths[i]:
+                return self.header["data_offset"] + offsets[i], lengths[i]
+            return None
+        raise ValueError("Directory nesting too deep")
+
+    def leaf(self, offset, length):
+        directory = self.leaves.get(offset)
+        if directory is None:
+            directory = deserialize_directory(self.read_range(self.header["leaf_offset"] + offset, length))
+            self.leaves[offset] = directory
+        return directory
+
+    def get_tile(self, z, x, y):
+        location = self.find_tile(z, x, y)
+        return None if location is None else self.read_range(*location)
@@ -5,6 +5,9 @@ data "aws_region" "current" {}
 resource "aws_api_gateway_rest_api" "schools_api" {
   name        = "SchoolsAPI"
   description = "API Gateway REST API for SchoolsAPI"
+
+  # Lets the Lambdas return gzip/br compressed bodies (base64 encoded, isBase64Encoded = true)
+  binary_media_types = ["*/*"]
 }
 
 # Log Group
@@ -32,6 +35,12 @@ resource "aws_api_gateway_deployment" "schools_api_deployment" {
       aws_api_gateway_method.school_id_options_method,
       aws_api_gateway_method.get_schools_nearby_method,
       aws_api_gateway_method.nearby_options_method,
+      aws_api_gateway_method.get_schools_by_ids_method,
+      aws_api_gateway_method.batch_options_method,
+      aws_api_gateway_method.get_district_tile_method,
+      aws_api_gateway_method.tile_options_method,
+      aws_api_gateway_method.search_schools_method,
+      aws_api_gateway_method.search_options_method,
     ]))
   }
 
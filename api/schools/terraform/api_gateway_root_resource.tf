@@ -14,6 +14,9 @@ resource "aws_api_gateway_integration" "root_options_integration" {
   http_method = aws_api_gateway_method.root_options_method.http_method
   type        = "MOCK"
 
+  # The API treats every media type as binary, so preflight bodies are converted back for the template
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -111,6 +114,8 @@ resource "aws_api_gateway_integration" "school_id_options_integration" {
   http_method = aws_api_gateway_method.school_id_options_method.http_method
   type        = "MOCK"
 
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -129,6 +134,62 @@ resource "aws_api_gateway_method_response" "school_id_options_response" {
   }
 }
 
+##################################################
+# API Gateway: GET Schools By IDs Method (Root "/batch")
+##################################################
+resource "aws_api_gateway_resource" "batch_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_rest_api.schools_api.root_resource_id
+  path_part   = "batch"
+}
+
+resource "aws_api_gateway_method" "get_schools_by_ids_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.batch_resource.id
+  http_method   = "GET"
+  authorization = "CUSTOM"
+  authorizer_id = aws_api_gateway_authorizer.custom_authorizer.id
+
+  request_parameters = {
+    "method.request.querystring.ids"    = true
+    "method.request.querystring.fields" = false
+  }
+
+  api_key_required = false
+}
+
+resource "aws_api_gateway_integration" "get_schools_by_ids_lambda_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.schools_api.id
+  resource_id             = aws_api_gateway_resource.batch_resource.id
+  http_method             = aws_api_gateway_method.get_schools_by_ids_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = "arn:aws:apigateway:${data.aws_region.current.name}:lambda:path/2015-03-31/functions/${aws_lambda_function.get_school_by_id_lambda.arn}/invocations"
+}
+
+##################################################
+# API Gateway: OPTIONS Schools By IDs Method (Root "/batch")
+##################################################
+resource "aws_api_gateway_method" "batch_options_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.batch_resource.id
+  http_method   = "OPTIONS"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "batch_options_integration" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  resource_id = aws_api_gateway_resource.batch_resource.id
+  http_method = aws_api_gateway_method.batch_options_method.http_method
+  type        = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
+
 ##################################################
 # API Gateway: GET School Nearby Method (Root "/nearby")
 ##################################################
@@ -183,6 +244,8 @@ resource "aws_api_gateway_integration" "nearby_options_integration" {
   http_method = aws_api_gateway_method.nearby_options_method.http_method
   type        = "MOCK"
 
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -216,3 +279,138 @@ resource "aws_api_gateway_integration" "nearby_options_integration" {
 #   selection_pattern = ""
 # }
 
+
+##################################################
+# API Gateway: GET District Tile Method (Root "/tiles/{z}/{x}/{y}")
+##################################################
+resource "aws_api_gateway_resource" "tiles_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_rest_api.schools_api.root_resource_id
+  path_part   = "tiles"
+}
+
+resource "aws_api_gateway_resource" "tile_z_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_resource.tiles_resource.id
+  path_part   = "{z}"
+}
+
+resource "aws_api_gateway_resource" "tile_x_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_resource.tile_z_resource.id
+  path_part   = "{x}"
+}
+
+resource "aws_api_gateway_resource" "tile_y_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_resource.tile_x_resource.id
+  path_part   = "{y}"
+}
+
+resource "aws_api_gateway_method" "get_district_tile_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.tile_y_resource.id
+  http_method   = "GET"
+  authorization = "CUSTOM"
+  authorizer_id = aws_api_gateway_authorizer.custom_authorizer.id
+
+  request_parameters = {
+    "method.request.path.z" = true
+    "method.request.path.x" = true
+    "method.request.path.y" = true
+  }
+
+  api_key_required = false
+}
+
+resource "aws_api_gateway_integration" "get_district_tile_lambda_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.schools_api.id
+  resource_id             = aws_api_gateway_resource.tile_y_resource.id
+  http_method             = aws_api_gateway_method.get_district_tile_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = "arn:aws:apigateway:${data.aws_region.current.name}:lambda:path/2015-03-31/functions/${aws_lambda_function.get_district_tile_lambda.arn}/invocations"
+}
+
+##################################################
+# API Gateway: OPTIONS District Tile Method (Root "/tiles/{z}/{x}/{y}")
+##################################################
+resource "aws_api_gateway_method" "tile_options_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.tile_y_resource.id
+  http_method   = "OPTIONS"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "tile_options_integration" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  resource_id = aws_api_gateway_resource.tile_y_resource.id
+  http_method = aws_api_gateway_method.tile_options_method.http_method
+  type        = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
+
+##################################################
+# API Gateway: GET Search Schools Method (Root "/search")
+##################################################
+resource "aws_api_gateway_resource" "search_resource" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  parent_id   = aws_api_gateway_rest_api.schools_api.root_resource_id
+  path_part   = "search"
+}
+
+resource "aws_api_gateway_method" "search_schools_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.search_resource.id
+  http_method   = "GET"
+  authorization = "CUSTOM"
+  authorizer_id = aws_api_gateway_authorizer.custom_authorizer.id
+
+  request_parameters = {
+    "method.request.querystring.q"           = true
+    "method.request.querystring.limit"       = false
+    "method.request.querystring.state"       = false
+    "method.request.querystring.district_id" = false
+    "method.request.querystring.lat"         = false
+    "method.request.querystring.lng"         = false
+  }
+
+  api_key_required = false
+}
+
+resource "aws_api_gateway_integration" "search_schools_lambda_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.schools_api.id
+  resource_id             = aws_api_gateway_resource.search_resource.id
+  http_method             = aws_api_gateway_method.search_schools_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = "arn:aws:apigateway:${data.aws_region.current.name}:lambda:path/2015-03-31/functions/${aws_lambda_function.search_schools_lambda.arn}/invocations"
+}
+
+##################################################
+# API Gateway: OPTIONS Search Schools Method (Root "/search")
+##################################################
+resource "aws_api_gateway_method" "search_options_method" {
+  rest_api_id   = aws_api_gateway_rest_api.schools_api.id
+  resource_id   = aws_api_gateway_resource.search_resource.id
+  http_method   = "OPTIONS"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "search_options_integration" {
+  rest_api_id = aws_api_gateway_rest_api.schools_api.id
+  resource_id = aws_api_gateway_resource.search_resource.id
+  http_method = aws_api_gateway_method.search_options_method.http_method
+  type        = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
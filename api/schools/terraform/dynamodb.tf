@@ -13,6 +13,16 @@ resource "aws_dynamodb_table" "schools" {
     type = "S"
   }
 
+  attribute {
+    name = "geohash_prefix"
+    type = "S"
+  }
+
+  attribute {
+    name = "geohash"
+    type = "S"
+  }
+
   # Global Secondary Index for querying by district_id
   global_secondary_index {
     name            = "DistrictIndex"
@@ -20,6 +30,15 @@ resource "aws_dynamodb_table" "schools" {
     projection_type = "ALL"
   }
 
+  # Global Secondary Index for radius and k-nearest searches: the seeder writes a 9-character
+  # geohash and its 4-character prefix on every school with coordinates
+  global_secondary_index {
+    name            = "GeohashIndex"
+    hash_key        = "geohash_prefix"
+    range_key       = "geohash"
+    projection_type = "ALL"
+  }
+
   tags = {
     Environment = "production"
     Name        = "SchoolsTable"
@@ -132,13 +132,23 @@ resource "aws_iam_policy" "get_school_by_id_lambda_policy" {
       Effect = "Allow",
       Action = [
         "dynamodb:GetItem",
+        "dynamodb:BatchGetItem",
         "dynamodb:Query",
         "dynamodb:Scan"
       ],
       Resource = [
         "${aws_dynamodb_table.schools.arn}"
       ]
-    }]
+      }, {
+      Effect = "Allow",
+      Action = [
+        "s3:GetObject"
+      ],
+      Resource = [
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.schools_snapshot_file.key}"
+      ]
+      }
+    ]
   })
 }
 
@@ -168,7 +178,16 @@ resource "aws_iam_policy" "get_schools_by_district_lambda_policy" {
         "${aws_dynamodb_table.schools.arn}",
         "${aws_dynamodb_table.schools.arn}/index/DistrictIndex"
       ]
-    }]
+      }, {
+      Effect = "Allow",
+      Action = [
+        "s3:GetObject"
+      ],
+      Resource = [
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.schools_snapshot_file.key}"
+      ]
+      }
+    ]
   })
 }
 
@@ -196,7 +215,8 @@ resource "aws_iam_policy" "get_schools_nearby_lambda_policy" {
       ],
       Resource = [
         "${aws_dynamodb_table.schools.arn}",
-        "${aws_dynamodb_table.schools.arn}/index/DistrictIndex"
+        "${aws_dynamodb_table.schools.arn}/index/DistrictIndex",
+        "${aws_dynamodb_table.schools.arn}/index/GeohashIndex"
       ]
       }, {
       Effect = "Allow",
@@ -204,6 +224,79 @@ resource "aws_iam_policy" "get_schools_nearby_lambda_policy" {
         "sagemaker:InvokeEndpoint"
       ],
       Resource = "arn:aws:sagemaker:us-east-1:314146313891:endpoint/school-district-query-endpoint-v1-0-9"
+      }, {
+      Effect = "Allow",
+      Action = [
+        "s3:GetObject"
+      ],
+      Resource = [
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.district_grid_file.key}",
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.district_records_file.key}"
+      ]
+      }
+    ]
+  })
+}
+
+resource "aws_iam_policy" "get_district_tile_lambda_policy" {
+  name = "SchoolsGetDistrictTileLambdaPolicy"
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Action = [
+        "logs:CreateLogGroup",
+        "logs:CreateLogStream",
+        "logs:PutLogEvents"
+      ]
+      Effect = "Allow"
+      Resource = [
+        aws_cloudwatch_log_group.get_district_tile_log_group.arn,       # Restrict to specific log group
+        "${aws_cloudwatch_log_group.get_district_tile_log_group.arn}:*" # Allow access to log streams in the group
+      ]
+      }, {
+      Effect = "Allow",
+      Action = [
+        "s3:GetObject"
+      ],
+      Resource = [
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.district_tiles_file.key}"
+      ]
+      }
+    ]
+  })
+}
+
+resource "aws_iam_policy" "search_schools_lambda_policy" {
+  name = "SchoolsSearchLambdaPolicy"
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Action = [
+        "logs:CreateLogGroup",
+        "logs:CreateLogStream",
+        "logs:PutLogEvents"
+      ]
+      Effect = "Allow"
+      Resource = [
+        aws_cloudwatch_log_group.search_schools_log_group.arn,       # Restrict to specific log group
+        "${aws_cloudwatch_log_group.search_schools_log_group.arn}:*" # Allow access to log streams in the group
+      ]
+      }, {
+      Effect = "Allow",
+      Action = [
+        "dynamodb:GetItem"
+      ],
+      Resource = [
+        "${aws_dynamodb_table.schools.arn}"
+      ]
+      }, {
+      Effect = "Allow",
+      Action = [
+        "s3:GetObject"
+      ],
+      Resource = [
+        "arn:aws:s3:::${aws_s3_bucket.schools_data_bucket.bucket}/${aws_s3_object.school_search_file.key}"
+      ]
       }
     ]
   })
@@ -226,3 +319,13 @@ resource "aws_iam_role_policy_attachment" "get_schools_nearby_lambda_attach_poli
   role       = aws_iam_role.lambda_exec.name
   policy_arn = aws_iam_policy.get_schools_nearby_lambda_policy.arn
 }
+
+resource "aws_iam_role_policy_attachment" "get_district_tile_lambda_attach_policy" {
+  role       = aws_iam_role.lambda_exec.name
+  policy_arn = aws_iam_policy.get_district_tile_lambda_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "search_schools_lambda_attach_policy" {
+  role       = aws_iam_role.lambda_exec.name
+  policy_arn = aws_iam_policy.search_schools_lambda_policy.arn
+}
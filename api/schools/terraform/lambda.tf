@@ -10,9 +10,15 @@ resource "aws_lambda_function" "get_school_by_id_lambda" {
   filename         = "${path.module}/../dist/get-school-by-id.zip"
   source_code_hash = filebase64sha256("${path.module}/../dist/get-school-by-id.zip")
 
+  # Room for the schools snapshot pages a warm container maps (about 45 MB for 130k schools)
+  memory_size = 256
+
   environment {
     variables = {
-      TABLE_NAME = aws_dynamodb_table.schools.name
+      TABLE_NAME              = aws_dynamodb_table.schools.name
+      USE_SCHOOLS_SNAPSHOT    = "true"
+      SCHOOLS_SNAPSHOT_BUCKET = aws_s3_bucket.schools_data_bucket.bucket
+      SCHOOLS_SNAPSHOT_KEY    = aws_s3_object.schools_snapshot_file.key
     }
   }
 
@@ -46,9 +52,15 @@ resource "aws_lambda_function" "get_schools_by_district_lambda" {
   filename         = "${path.module}/../dist/get-schools-by-district.zip"
   source_code_hash = filebase64sha256("${path.module}/../dist/get-schools-by-district.zip")
 
+  # Room for the schools snapshot pages a warm container maps (about 45 MB for 130k schools)
+  memory_size = 256
+
   environment {
     variables = {
-      TABLE_NAME = aws_dynamodb_table.schools.name
+      TABLE_NAME              = aws_dynamodb_table.schools.name
+      USE_SCHOOLS_SNAPSHOT    = "true"
+      SCHOOLS_SNAPSHOT_BUCKET = aws_s3_bucket.schools_data_bucket.bucket
+      SCHOOLS_SNAPSHOT_KEY    = aws_s3_object.schools_snapshot_file.key
     }
   }
 
@@ -82,10 +94,17 @@ resource "aws_lambda_function" "get_schools_nearby_lambda" {
   filename         = "${path.module}/../dist/get-schools-nearby.zip"
   source_code_hash = filebase64sha256("${path.module}/../dist/get-schools-nearby.zip")
 
+  # Room for the district grid and records loaded at init
+  memory_size = 512
+
   environment {
     variables = {
       TABLE_NAME              = aws_dynamodb_table.schools.name
       SAGEMAKER_ENDPOINT_NAME = aws_sagemaker_endpoint.school_district_endpoint_v1_0_9.name
+      LOCAL_DISTRICT_LOOKUP   = "true"
+      DISTRICT_DATA_BUCKET    = aws_s3_bucket.schools_data_bucket.bucket
+      DISTRICT_GRID_KEY       = aws_s3_object.district_grid_file.key
+      DISTRICT_RECORDS_KEY    = aws_s3_object.district_records_file.key
     }
   }
 
@@ -106,3 +125,81 @@ resource "aws_lambda_permission" "get_schools_nearby_invoke_permission" {
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_api_gateway_rest_api.schools_api.execution_arn}/*/*"
 }
+
+##################################################
+# Lambda: Get District Tile
+##################################################
+resource "aws_lambda_function" "get_district_tile_lambda" {
+  function_name = "SchoolsGetDistrictTileFunction"
+  handler       = "get-district-tile.lambda_handler"
+  runtime       = "python3.13"
+  role          = aws_iam_role.lambda_exec.arn
+
+  filename         = "${path.module}/../dist/get-district-tile.zip"
+  source_code_hash = filebase64sha256("${path.module}/../dist/get-district-tile.zip")
+
+  environment {
+    variables = {
+      TILES_BUCKET = aws_s3_bucket.schools_data_bucket.bucket
+      TILES_KEY    = aws_s3_object.district_tiles_file.key
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+}
+
+resource "aws_cloudwatch_log_group" "get_district_tile_log_group" {
+  name              = "/aws/lambda/SchoolsGetDistrictTileFunction"
+  retention_in_days = 7
+}
+
+resource "aws_lambda_permission" "get_district_tile_invoke_permission" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.get_district_tile_lambda.arn
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_api_gateway_rest_api.schools_api.execution_arn}/*/*"
+}
+
+##################################################
+# Lambda: Search Schools
+##################################################
+resource "aws_lambda_function" "search_schools_lambda" {
+  function_name = "SchoolsSearchFunction"
+  handler       = "search-schools.lambda_handler"
+  runtime       = "python3.13"
+  role          = aws_iam_role.lambda_exec.arn
+
+  filename         = "${path.module}/../dist/search-schools.zip"
+  source_code_hash = filebase64sha256("${path.module}/../dist/search-schools.zip")
+
+  # Room for the search index pages a warm container maps (about 50 MB for 130k schools)
+  memory_size = 256
+
+  environment {
+    variables = {
+      TABLE_NAME          = aws_dynamodb_table.schools.name
+      SEARCH_INDEX_BUCKET = aws_s3_bucket.schools_data_bucket.bucket
+      SEARCH_INDEX_KEY    = aws_s3_object.school_search_file.key
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+}
+
+resource "aws_cloudwatch_log_group" "search_schools_log_group" {
+  name              = "/aws/lambda/SchoolsSearchFunction"
+  retention_in_days = 7
+}
+
+resource "aws_lambda_permission" "search_schools_invoke_permission" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.search_schools_lambda.arn
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_api_gateway_rest_api.schools_api.execution_arn}/*/*"
+}
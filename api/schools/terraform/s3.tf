@@ -44,3 +44,43 @@ resource "aws_s3_object" "spatial_index_dat_file" {
     ignore_changes = [etag] # Ignore changes to etag to avoid redeploying the file unless it's manually changed
   }
 }
+
+resource "aws_s3_object" "district_grid_file" {
+  bucket = aws_s3_bucket.schools_data_bucket.bucket
+  key    = "district_grid.bin"
+  source = "${path.module}/../data/output/district_grid.bin"
+
+  etag = filemd5("${path.module}/../data/output/district_grid.bin")
+}
+
+resource "aws_s3_object" "district_records_file" {
+  bucket = aws_s3_bucket.schools_data_bucket.bucket
+  key    = "district_records.json"
+  source = "${path.module}/../data/output/district_records.json"
+
+  etag = filemd5("${path.module}/../data/output/district_records.json")
+}
+
+resource "aws_s3_object" "schools_snapshot_file" {
+  bucket = aws_s3_bucket.schools_data_bucket.bucket
+  key    = "schools_snapshot.bin"
+  source = "${path.module}/../data/output/schools_snapshot.bin"
+
+  etag = filemd5("${path.module}/../data/output/schools_snapshot.bin")
+}
+
+resource "aws_s3_object" "school_search_file" {
+  bucket = aws_s3_bucket.schools_data_bucket.bucket
+  key    = "school_search.bin"
+  source = "${path.module}/../data/output/school_search.bin"
+
+  etag = filemd5("${path.module}/../data/output/school_search.bin")
+}
+
+resource "aws_s3_object" "district_tiles_file" {
+  bucket = aws_s3_bucket.schools_data_bucket.bucket
+  key    = "district_tiles.pmtiles"
+  source = "${path.module}/../data/output/district_tiles.pmtiles"
+
+  etag = filemd5("${path.module}/../data/output/district_tiles.pmtiles")
+}
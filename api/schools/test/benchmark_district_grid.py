@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+from rtree import index
+from shapely.geometry import Point
+
+# Import the grid from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+from district_grid import DistrictGrid, BOUNDARY, OUTSIDE
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Compare the district grid against the R-tree lookup path.")
+parser.add_argument("--parquet", default="../data/output/school_districts.parquet", help="Path to school_districts.parquet.")
+parser.add_argument("--grid", default="../data/output/district_grid.bin", help="Path to district_grid.bin.")
+parser.add_argument("--points", type=int, default=20000, help="Number of random points to query.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the query points.")
+args = parser.parse_args()
+
+gdf = gpd.read_parquet(args.parquet)
+geometries = gdf.geometry.to_numpy()
+grid = DistrictGrid.load(args.grid)
+
+# R-tree path, as served by app.py
+rtree_idx = index.Index()
+for idx, bounds in enumerate(gdf.bounds.to_numpy()):
+    rtree_idx.insert(idx, tuple(bounds))
+
+def rtree_lookup(lat, lng):
+    point = Point(lng, lat)
+    for idx in rtree_idx.intersection(point.bounds):
+        if geometries[idx].contains(point):
+            return idx
+    return OUTSIDE
+
+def grid_lookup(lat, lng):
+    idx = grid.lookup(lat, lng)
+    return rtree_lookup(lat, lng) if idx == BOUNDARY else idx
+
+# Sample points uniformly over the extent of the districts
+rng = np.random.default_rng(args.seed)
+minx, miny, maxx, maxy = gdf.total_bounds
+lats = rng.uniform(miny, maxy, args.points)
+lngs = rng.uniform(minx, maxx, args.points)
+
+results = {}
+for name, lookup in (("rtree", rtree_lookup), ("grid", grid_lookup)):
+    start = time.perf_counter()
+    results[name] = [lookup(lat, lng) for lat, lng in zip(lats, lngs)]
+    elapsed = time.perf_counter() - start
+    print(f"{name:>6}: {elapsed / args.points * 1e6:8.1f} us/query")
+
+labels = grid.lookup_many(lats, lngs)
+mismatches = sum(a != b for a, b in zip(results["rtree"], results["grid"]))
+print(f"Grid cells: {len(grid.starts)} ({grid.starts.nbytes * 3 / 1e6:.1f} MB), max level {grid.max_level}")
+print(f"Hit rate: {np.mean(labels != BOUNDARY):.1%} ({np.mean(labels >= 0):.1%} inside a district, {np.mean(labels == OUTSIDE):.1%} outside)")
+print(f"Mismatches against the R-tree path: {mismatches}")
@@ -0,0 +1,82 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlparse
+
+import boto3
+
+# Import the grid from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+from district_grid import DistrictGrid, BOUNDARY, OUTSIDE
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Compare in-process district lookups against the SageMaker endpoint on the same points.")
+parser.add_argument("--grid", default="../data/output/district_grid.bin", help="Path to district_grid.bin.")
+parser.add_argument("--records", default="../data/output/district_records.json", help="Path to district_records.json.")
+parser.add_argument("--endpoint-name", help="SageMaker endpoint to call (uses the default AWS profile and region).")
+parser.add_argument("--url", default="http://localhost:8080", help="Base URL of a local district service, used without --endpoint-name.")
+parser.add_argument("--points", type=int, default=2000, help="Number of random points to query.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the query points.")
+args = parser.parse_args()
+
+grid = DistrictGrid.load(args.grid)
+with open(args.records) as records_file:
+    records = json.load(records_file)
+
+if args.endpoint_name:
+    sagemaker_runtime = boto3.client("sagemaker-runtime")
+
+    def call_endpoint(lat, lng):
+        response = sagemaker_runtime.invoke_endpoint(
+            EndpointName=args.endpoint_name,
+            ContentType="application/json",
+            Body=json.dumps({"lat": lat, "lng": lng}),
+        )
+        return json.loads(response["Body"].read().decode("utf-8"))
+else:
+    target = urlparse(args.url)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+
+    def call_endpoint(lat, lng):
+        connection.request("POST", "/invocations", body=json.dumps({"lat": lat, "lng": lng}), headers={"Content-Type": "application/json"})
+        return json.loads(connection.getresponse().read())
+
+# Same resolution order as get-schools-nearby with LOCAL_DISTRICT_LOOKUP enabled
+def local_lookup(lat, lng):
+    idx = grid.lookup(lat, lng)
+    if idx >= 0:
+        return records[idx]
+    if idx == OUTSIDE:
+        return {}
+    return call_endpoint(lat, lng)
+
+# Points across the contiguous United States
+rng = random.Random(args.seed)
+points = [(rng.uniform(25, 49), rng.uniform(-124, -67)) for _ in range(args.points)]
+
+# Warm up the connection and the endpoint
+call_endpoint(*points[0])
+
+results = {}
+print(f"{'path':>10} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+for name, lookup in (("sagemaker", call_endpoint), ("local", local_lookup)):
+    latencies = []
+    results[name] = []
+    for lat, lng in points:
+        start = time.perf_counter()
+        results[name].append(lookup(lat, lng).get("GEOID"))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    print(f"{name:>10} {sum(latencies) / len(latencies):>8.3f} {p50:>8.3f} {p99:>8.3f}")
+
+fallbacks = sum(grid.lookup(lat, lng) == BOUNDARY for lat, lng in points)
+mismatches = sum(a != b for a, b in zip(results["sagemaker"], results["local"]))
+print(f"Resolved locally: {1 - fallbacks / len(points):.1%} ({fallbacks} SageMaker fallbacks)")
+print(f"Mismatches against the SageMaker path: {mismatches}")
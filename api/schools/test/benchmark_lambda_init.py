@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Measure the cold-start init time of the schools Lambdas, each imported in a fresh interpreter.")
+parser.add_argument("--src", default=os.path.join(os.path.dirname(__file__), "..", "src"), help="Source directory to load the handlers from (e.g. a checkout of an older version, to compare).")
+parser.add_argument("--lambdas", default="get-school-by-id,get-schools-by-district,get-schools-nearby,get-district-tile", help="Comma-separated Lambdas to measure.")
+parser.add_argument("--runs", type=int, default=10, help="Cold starts measured per Lambda.")
+args = parser.parse_args()
+
+src_dir = os.path.abspath(args.src)
+
+# Enough configuration for every handler to initialize; no AWS call is made at init
+env = {
+    **os.environ,
+    "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+    "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "benchmark"),
+    "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "benchmark"),
+    "TABLE_NAME": "Schools",
+    "SAGEMAKER_ENDPOINT_NAME": "schools-benchmark",
+    "TILES_BUCKET": "schools-benchmark",
+    "LOCAL_DISTRICT_LOOKUP": "false",
+    "METRICS_SAMPLE_RATE": "0",
+}
+
+# Imports the handler the way the Lambda runtime does, then reports the wall time on the last line
+IMPORT_SCRIPT = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+name, path = sys.argv[1], sys.argv[2]
+spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({"wall_ms": (time.perf_counter() - start) * 1000}))
+"""
+
+def cold_start(name):
+    """Wall time of one import, and the handler's init metric record if it prints one."""
+    lambda_dir = os.path.join(src_dir, name)
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT, name, os.path.join(lambda_dir, f"{name}.py")],
+        # The Lambda zips hold the handler and the shared modules side by side
+        env={**env, "PYTHONPATH": os.pathsep.join([lambda_dir, os.path.join(src_dir, "shared")])},
+        capture_output=True, text=True, check=True,
+    )
+
+    init_record = None
+    for line in result.stdout.splitlines():
+        record = json.loads(line) if line.startswith("{") else {}
+        if str(record.get("operation", "")).endswith("_init"):
+            init_record = record
+    return json.loads(result.stdout.splitlines()[-1])["wall_ms"], init_record
+
+print(f"{'lambda':>24} {'wall p50 ms':>12} {'wall max ms':>12}  init phases (p50 ms)")
+for name in args.lambdas.split(","):
+    walls, phases = [], {}
+    for _ in range(args.runs):
+        wall_ms, init_record = cold_start(name)
+        walls.append(wall_ms)
+        for key, value in (init_record or {}).items():
+            if key.endswith("_ms"):
+                phases.setdefault(key[:-3], []).append(value)
+
+    breakdown = ", ".join(f"{phase} {statistics.median(values):.1f}" for phase, values in phases.items()) or "-"
+    print(f"{name:>24} {statistics.median(walls):>12.1f} {max(walls):>12.1f}  {breakdown}")
@@ -0,0 +1,107 @@
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# Import the serializers from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+import serialization
+from serialization import compress_response, deserialize_item, dumps
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Compare the Lambda response serialization paths on a synthetic district.")
+parser.add_argument("--schools", type=int, default=2000, help="Number of schools in the district payload.")
+parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per path.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the payload.")
+args = parser.parse_args()
+
+# The per-Lambda encoder this benchmark compares against
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super().default(obj)
+
+def make_school(rng, i):
+    # Roughly the shape of an NCES school record
+    return {
+        "school_id": f"{rng.randint(10 ** 11, 10 ** 12 - 1)}",
+        "district_id": "3400001",
+        "name": f"School {i}",
+        "street": f"{rng.randint(1, 9999)} Main Street",
+        "city": "Springfield",
+        "state": "NJ",
+        "zip": f"{rng.randint(7000, 8999):05d}",
+        "phone": f"(555) {rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "lat": Decimal(str(round(rng.uniform(38.9, 41.4), 6))),
+        "lng": Decimal(str(round(rng.uniform(-75.6, -73.9), 6))),
+        "enrollment": Decimal(rng.randint(50, 3000)),
+        "teachers": Decimal(str(round(rng.uniform(5, 200), 1))),
+        "student_teacher_ratio": Decimal(str(round(rng.uniform(8, 25), 2))),
+        "free_lunch": Decimal(rng.randint(0, 1500)),
+        "reduced_lunch": Decimal(rng.randint(0, 300)),
+        "grades": {"low": "KG", "high": rng.choice(["05", "08", "12"])},
+        "level": rng.choice(["Elementary", "Middle", "High"]),
+        "charter": rng.random() < 0.1,
+        "magnet": rng.random() < 0.05,
+        "title_i": rng.random() < 0.4,
+        "locale": rng.choice(["City: Large", "Suburb: Large", "Town: Fringe", "Rural: Distant"]),
+        "enrollment_by_grade": [Decimal(rng.randint(0, 250)) for _ in range(13)],
+    }
+
+rng = random.Random(args.seed)
+serializer = TypeSerializer()
+low_level_items = [{k: serializer.serialize(v) for k, v in make_school(rng, i).items()} for i in range(args.schools)]
+
+type_deserializer = TypeDeserializer()
+
+def decimal_path():
+    # Resource-style reads (Decimal values) encoded through DecimalEncoder.default()
+    items = [{k: type_deserializer.deserialize(v) for k, v in item.items()} for item in low_level_items]
+    return json.dumps(items, cls=DecimalEncoder)
+
+def native_json_path():
+    serialization.orjson, orjson = None, serialization.orjson
+    try:
+        return dumps([deserialize_item(item) for item in low_level_items])
+    finally:
+        serialization.orjson = orjson
+
+def native_path():
+    return dumps([deserialize_item(item) for item in low_level_items])
+
+def timed(function):
+    function()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        result = function()
+    return (time.perf_counter() - start) / args.repeat * 1000, result
+
+paths = [("Decimal + DecimalEncoder", decimal_path), ("native + json", native_json_path)]
+if serialization.orjson is not None:
+    paths.append(("native + orjson", native_path))
+else:
+    print("orjson is not installed, skipping the orjson path")
+
+print(f"{args.schools} schools, {args.repeat} repetitions")
+print(f"{'path':>26} {'ms':>8} {'KB':>8}")
+for name, function in paths:
+    elapsed, body = timed(function)
+    print(f"{name:>26} {elapsed:>8.2f} {len(body) / 1024:>8.1f}")
+
+# Response compression of the fastest body
+body = native_path()
+encodings = ["gzip"] + (["br"] if serialization.brotli is not None else [])
+for encoding in encodings:
+    event = {"headers": {"Accept-Encoding": encoding}}
+    elapsed, response = timed(lambda: compress_response({"statusCode": 200, "body": body}, event))
+    size = len(base64.b64decode(response["body"]))
+    print(f"{encoding:>26} {elapsed:>8.2f} {size / 1024:>8.1f}")
+
+assert json.loads(decimal_path()) == json.loads(native_path()), "Serialization paths disagree"
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Import the simplified levels from the SageMaker container code
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "sagemaker-school-district"))
+from simplified_geometries import SimplifiedGeometries, column_name
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Compare coarse-to-fine simplified containment tests against full resolution.")
+parser.add_argument("--parquet", default="../data/output/school_districts.parquet", help="Path to school_districts.parquet.")
+parser.add_argument("--tolerances", default="0.01,0.001", help="Tolerances to simplify at when the file has no simplified columns.")
+parser.add_argument("--points", type=int, default=100000, help="Number of random points to query.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the query points.")
+args = parser.parse_args()
+
+gdf = gpd.read_parquet(args.parquet)
+geometries = gdf.geometry.to_numpy()
+
+simplified = SimplifiedGeometries.from_geodataframe(gdf)
+if simplified is None:
+    print("No simplified columns in the file, simplifying now")
+    for tolerance in (float(t) for t in args.tolerances.split(",")):
+        gdf[column_name(tolerance)] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    simplified = SimplifiedGeometries.from_geodataframe(gdf)
+
+print(f"Full resolution: {shapely.get_num_coordinates(geometries).sum()} vertices")
+for tolerance, (_, level, _) in zip(simplified.tolerances, simplified.levels):
+    print(f"Tolerance {tolerance:g}: {shapely.get_num_coordinates(level).sum()} vertices")
+
+# Sample points uniformly over the extent of the districts, with their bounding-box candidates
+rng = np.random.default_rng(args.seed)
+minx, miny, maxx, maxy = gdf.total_bounds
+lngs = rng.uniform(minx, maxx, args.points)
+lats = rng.uniform(miny, maxy, args.points)
+points = shapely.points(lngs, lats)
+tree = shapely.STRtree(geometries)
+
+# Lowest district first, like the batch path, so overlapping districts resolve the same way
+candidates = [np.sort(tree.query(point)) for point in points]
+
+def first_match(contains):
+    return [next((idx for idx in c if contains(idx, point)), -1) for c, point in zip(candidates, points)]
+
+def timed(name, function, reference=None):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    mismatches = "" if reference is None else f", {sum(a != b for a, b in zip(result, reference))} mismatches"
+    print(f"{name:>28}: {elapsed / args.points * 1e6:8.1f} us/point{mismatches}")
+    return result
+
+def exact(idx, point):
+    return geometries[idx].contains(point)
+
+# Single-point path, as in query_district
+print("Single points")
+reference = timed("full, unprepared", lambda: first_match(exact))
+timed("simplified, unprepared full", lambda: first_match(lambda idx, point: simplified.contains(idx, point, exact)), reference)
+shapely.prepare(geometries)
+timed("full, prepared", lambda: first_match(exact), reference)
+timed("simplified, prepared full", lambda: first_match(lambda idx, point: simplified.contains(idx, point, exact)), reference)
+
+# Batch path, as in match_districts_exact
+def batch_full():
+    point_idx, district_idx = tree.query(points, predicate="within")
+    return point_idx, district_idx
+
+def batch_simplified():
+    point_idx, district_idx = tree.query(points)
+    within = simplified.contains_xy(district_idx, lngs[point_idx], lats[point_idx], lambda idx, x, y: shapely.contains_xy(geometries[idx], x, y))
+    return point_idx[within], district_idx[within]
+
+def first_per_point(pairs):
+    point_idx, district_idx = pairs
+    matches = np.full(args.points, -1)
+    order = np.lexsort((district_idx, point_idx))
+    first = np.unique(point_idx[order], return_index=True)[1]
+    matches[point_idx[order][first]] = district_idx[order][first]
+    return matches
+
+print("Batch")
+timed("full, STRtree within", lambda: first_per_point(batch_full()), reference)
+timed("simplified, contains_xy", lambda: first_per_point(batch_simplified()), reference)
+
+# Share of candidate tests each level answers
+point_idx, district_idx = tree.query(points)
+pending = np.ones(len(point_idx), dtype=bool)
+for tolerance, (band, _, boundaries) in zip(simplified.tolerances, simplified.levels):
+    near = pending & shapely.dwithin(boundaries[district_idx], points[point_idx], band)
+    print(f"Tolerance {tolerance:g} answers {np.mean(pending & ~near):.1%} of candidate tests")
+    pending = near
+print(f"Full resolution answers {np.mean(pending):.1%} of candidate tests")
@@ -0,0 +1,378 @@
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import runpy
+import sys
+import tempfile
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+APP_DIR = os.path.join(SRC_DIR, "sagemaker-school-district")
+sys.path.insert(0, os.path.join(SRC_DIR, "shared"))
+sys.path.insert(0, APP_DIR)
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Benchmark the schools service offline, against synthetic data, moto and a Flask test client.")
+parser.add_argument("--work-dir", help="Directory for the synthetic data and artifacts (defaults to a temporary directory).")
+parser.add_argument("--districts", type=int, default=300, help="Number of synthetic districts.")
+parser.add_argument("--schools", type=int, default=2000, help="Number of synthetic schools.")
+parser.add_argument("--requests", type=int, default=1000, help="Timed requests per district service case.")
+parser.add_argument("--lambda-requests", type=int, default=100, help="Timed requests per Lambda case (moto answers in milliseconds, not microseconds).")
+parser.add_argument("--batch-size", type=int, default=1000, help="Points per batch district query.")
+parser.add_argument("--batches", type=int, default=20, help="Timed batch district queries.")
+parser.add_argument("--warmup", type=int, default=20, help="Untimed requests before each case.")
+parser.add_argument("--repeat", type=int, default=3, help="Timed passes per case; the pass with the lowest median is kept.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the data and the query points.")
+parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results.")
+parser.add_argument("--baseline", help="Results of an earlier run to compare against; regressions make the run fail.")
+parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before a case counts as a regression.")
+parser.add_argument("--gate", default="p50_ms,throughput", help="Comma-separated metrics compared against the baseline (p50_ms, p95_ms, p99_ms, throughput).")
+args = parser.parse_args()
+
+# Extent of the synthetic districts, in degrees
+EXTENT = (-80.0, 36.0, -70.0, 42.0)
+
+# Samples a case needs before its tail percentiles are compared against the baseline
+MIN_TAIL_SAMPLES = 100
+
+# Offline AWS: moto serves S3 and DynamoDB in-process, and the Lambdas skip their sampled metrics
+os.environ.update(AWS_DEFAULT_REGION="us-east-1", AWS_ACCESS_KEY_ID="benchmark", AWS_SECRET_ACCESS_KEY="benchmark")
+os.environ.pop("AWS_PROFILE", None)
+os.environ.setdefault("METRICS_SAMPLE_RATE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+rng = np.random.default_rng(args.seed)
+work_dir = args.work_dir or tempfile.mkdtemp(prefix="schools-benchmark-")
+os.makedirs(os.path.join(work_dir, "sources"), exist_ok=True)
+os.makedirs(os.path.join(work_dir, "output"), exist_ok=True)
+
+def make_districts():
+    # Voronoi cells with jittered boundaries, so polygon tests see realistic vertex counts
+    minx, miny, maxx, maxy = EXTENT
+    seeds = shapely.multipoints(np.column_stack([rng.uniform(minx, maxx, args.districts), rng.uniform(miny, maxy, args.districts)]))
+    extent = shapely.box(*EXTENT)
+    cells = shapely.intersection(shapely.get_parts(shapely.voronoi_polygons(seeds, extend_to=extent)), extent)
+
+    districts = []
+    for cell in cells:
+        coords = shapely.get_coordinates(shapely.segmentize(cell.exterior, 0.002))
+        coords[1:-1] += rng.normal(0, 0.0004, coords[1:-1].shape)
+        coords[-1] = coords[0]
+        polygon = shapely.make_valid(shapely.Polygon(coords))
+        if polygon.geom_type not in ("Polygon", "MultiPolygon"):
+            polygon = max(shapely.get_parts(polygon), key=lambda part: part.area)
+        districts.append(polygon)
+
+    return gpd.GeoDataFrame({
+        "GEOID": [f"{i:07d}" for i in range(len(districts))],
+        "NAME": [f"District {i}" for i in range(len(districts))],
+    }, geometry=districts, crs="EPSG:4269")
+
+def make_schools(districts):
+    # Roughly the shape of an NCES school record, in the district that contains it
+    minx, miny, maxx, maxy = EXTENT
+    lngs, lats = rng.uniform(minx, maxx, args.schools), rng.uniform(miny, maxy, args.schools)
+    point_idx, district_idx = shapely.STRtree(districts.geometry.to_numpy()).query(shapely.points(lngs, lats), predicate="within")
+    district_of = dict(zip(point_idx, district_idx))
+
+    return [{
+        "school_id": f"{100000000000 + i}",
+        "district_id": districts.GEOID[district_of[i]] if i in district_of else "0000000",
+        "name": f"School {i}",
+        "street": f"{rng.integers(1, 9999)} Main Street",
+        "city": "Springfield",
+        "state": "NJ",
+        "lat": round(float(lats[i]), 6),
+        "lng": round(float(lngs[i]), 6),
+        "enrollment": int(rng.integers(50, 3000)),
+        "student_teacher_ratio": round(float(rng.uniform(8, 25)), 2),
+        "grades": {"low": "KG", "high": str(rng.choice(["05", "08", "12"]))},
+        "level": str(rng.choice(["Elementary", "Middle", "High"])),
+    } for i in range(args.schools)]
+
+def random_points(count):
+    minx, miny, maxx, maxy = EXTENT
+    return rng.uniform(miny, maxy, count), rng.uniform(minx, maxx, count)
+
+def summarize(latencies, operations, elapsed):
+    """Throughput in operations per second and latency percentiles in milliseconds (None without latencies)."""
+    latencies = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist() if len(latencies) else (None, None, None)
+    return {
+        "count": len(latencies) or operations,
+        "throughput": operations / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+    }
+
+def timed_case(name, function, inputs, operations_per_call=1, before_each=None, warmup=None):
+    """Time function on every input, after untimed calls on warmup (by default, the first --warmup inputs)."""
+    if warmup is None:
+        warmup, inputs = inputs[:args.warmup], inputs[args.warmup:]
+    for value in warmup:
+        if before_each:
+            before_each()
+        function(value)
+
+    # Like timeit, keep the least disturbed pass: on a shared machine the slower ones measure the neighbours
+    passes = []
+    for _ in range(args.repeat):
+        gc.collect()
+        latencies = []
+        for value in inputs:
+            if before_each:
+                before_each()
+            start = time.perf_counter()
+            function(value)
+            latencies.append(time.perf_counter() - start)
+        passes.append(latencies)
+    latencies = min(passes, key=np.median)
+
+    results[name] = summarize(latencies, operations_per_call * len(latencies), sum(latencies))
+    report(name)
+
+def report(name):
+    result = results[name]
+    percentiles = " ".join(f"{result[key]:>8.2f}" if result[key] is not None else f"{'-':>8}" for key in ("p50_ms", "p95_ms", "p99_ms"))
+    print(f"{name:>28} {result['count']:>7} {result['throughput']:>12.1f} {percentiles}")
+
+def load_lambda(name):
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(SRC_DIR, name, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    # The handlers print their init timings as metric records
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+def expect(response, status=200):
+    if response["statusCode"] != status:
+        raise RuntimeError(f"Unexpected status {response['statusCode']}: {response.get('body')}")
+
+results = {}
+
+# Synthetic districts, built into artifacts by the same steps as main.py
+import main
+
+print(f"Building {args.districts} districts and {args.schools} schools in {work_dir}")
+districts = make_districts()
+shapefile_path = os.path.join(work_dir, "sources", "districts.shp")
+districts.to_file(shapefile_path)
+
+output = lambda name: os.path.join(work_dir, "output", name)
+with contextlib.redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    main.convert_shapefile_to_geoparquet(shapefile_path, output("school_districts.parquet"))
+    main.build_geoparquet_index(output("school_districts.parquet"), output("spatial_index"))
+    main.build_packed_index(output("school_districts.parquet"), output("spatial_index.packed"))
+    main.build_district_grid(output("school_districts.parquet"), output("district_grid.bin"))
+    main.build_district_records(output("school_districts.parquet"), output("district_records.json"))
+    build_seconds = time.perf_counter() - start
+
+schools = make_schools(gpd.read_parquet(output("school_districts.parquet")))
+schools_path = os.path.join(work_dir, "sources", "schools.json")
+with open(schools_path, "w") as schools_file:
+    json.dump(schools, schools_file)
+
+from moto import mock_aws
+import boto3
+
+mock = mock_aws()
+mock.start()
+
+# The artifacts bucket the district service loads from
+s3 = boto3.client("s3")
+s3.create_bucket(Bucket="schools-benchmark")
+for name in os.listdir(os.path.join(work_dir, "output")):
+    s3.upload_file(output(name), "schools-benchmark", name)
+
+# The Schools table and its indexes, as in terraform/dynamodb.tf
+boto3.client("dynamodb").create_table(
+    TableName="Schools",
+    BillingMode="PAY_PER_REQUEST",
+    AttributeDefinitions=[
+        {"AttributeName": "school_id", "AttributeType": "S"},
+        {"AttributeName": "district_id", "AttributeType": "S"},
+        {"AttributeName": "geohash_prefix", "AttributeType": "S"},
+        {"AttributeName": "geohash", "AttributeType": "S"},
+    ],
+    KeySchema=[{"AttributeName": "school_id", "KeyType": "HASH"}],
+    GlobalSecondaryIndexes=[
+        {"IndexName": "DistrictIndex", "KeySchema": [{"AttributeName": "district_id", "KeyType": "HASH"}], "Projection": {"ProjectionType": "ALL"}},
+        {"IndexName": "GeohashIndex", "KeySchema": [{"AttributeName": "geohash_prefix", "KeyType": "HASH"}, {"AttributeName": "geohash", "KeyType": "RANGE"}], "Projection": {"ProjectionType": "ALL"}},
+    ],
+)
+
+print(f"{'case':>28} {'count':>7} {'ops/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+# Seeding, through the seeder script itself
+seed_argv = ["seed_dynamodb.py", "--region", "us-east-1", "--file", schools_path, "--restart",
+             "--checkpoint", os.path.join(work_dir, "seed.checkpoint"), "--manifest", os.path.join(work_dir, "seed.manifest.json"),
+             "--snapshot", os.path.join(work_dir, "schools_snapshot.bin"), "--search-index", os.path.join(work_dir, "school_search.bin"),
+             "--district-records", output("district_records.json")]
+saved_argv, sys.argv = sys.argv, seed_argv
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        runpy.run_path(os.path.join(SRC_DIR, "seed-dynamodb", "seed_dynamodb.py"), run_name="__main__")
+        elapsed = time.perf_counter() - start
+finally:
+    sys.argv = saved_argv
+results["seed"] = summarize([], len(schools), elapsed)
+report("seed")
+
+# District service, in-process behind Flask's test client
+os.environ.update(S3_BUCKET="schools-benchmark", S3_KEY="school_districts.parquet", ARTIFACT_CACHE_DIR=os.path.join(work_dir, "artifacts"))
+os.environ.setdefault("SPATIAL_INDEX_BACKEND", "packed")
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+client = app.app.test_client()
+
+def invoke(body):
+    response = client.post("/invocations", data=body, content_type="application/json")
+    if response.status_code != 200:
+        raise RuntimeError(f"Unexpected status {response.status_code}: {response.data[:200]}")
+    return response.data
+
+lats, lngs = random_points(args.requests + args.warmup)
+timed_case("district_query", invoke, [json.dumps({"lat": lat, "lng": lng}) for lat, lng in zip(lats, lngs)])
+
+batches = []
+for _ in range(args.batches + args.warmup):
+    lats, lngs = random_points(args.batch_size)
+    batches.append(json.dumps({"points": list(zip(lats.tolist(), lngs.tolist()))}))
+timed_case("district_batch", invoke, batches, operations_per_call=args.batch_size)
+
+# The Lambdas, against the seeded table
+os.environ.update(TABLE_NAME="Schools", SAGEMAKER_ENDPOINT_NAME="schools-benchmark", LOCAL_DISTRICT_LOOKUP="false")
+get_school_by_id = load_lambda("get-school-by-id")
+get_schools_by_district = load_lambda("get-schools-by-district")
+get_schools_nearby = load_lambda("get-schools-nearby")
+
+class LocalSageMakerRuntime:
+    """Stand-in for the sagemaker-runtime client that answers from the in-process district service."""
+
+    def invoke_endpoint(self, EndpointName, ContentType, Body, **kwargs):
+        return {"Body": io.BytesIO(invoke(Body))}
+
+get_schools_nearby.sagemaker_runtime = LocalSageMakerRuntime()
+
+school_ids = [school["school_id"] for school in schools]
+random.seed(args.seed)
+timed_case("school_by_id", lambda school_id: expect(get_school_by_id.lambda_handler({"pathParameters": {"school_id": school_id}}, None)),
+           random.choices(school_ids, k=args.lambda_requests + args.warmup))
+timed_case("schools_by_ids", lambda ids: expect(get_school_by_id.lambda_handler({"queryStringParameters": {"ids": ",".join(ids)}}, None)),
+           [random.sample(school_ids, 100) for _ in range(args.lambda_requests // 10 + args.warmup)], operations_per_call=100)
+
+district_ids = sorted({school["district_id"] for school in schools})
+timed_case("schools_by_district", lambda geoid: expect(get_schools_by_district.lambda_handler({"queryStringParameters": {"district_id": geoid}}, None)),
+           random.choices(district_ids, k=args.lambda_requests + args.warmup))
+
+# The same reads served from the schools snapshot the seeder wrote
+os.environ.update(USE_SCHOOLS_SNAPSHOT="true", SCHOOLS_SNAPSHOT_DIR=work_dir)
+snapshot_by_id = load_lambda("get-school-by-id")
+snapshot_by_district = load_lambda("get-schools-by-district")
+timed_case("school_by_id_snapshot", lambda school_id: expect(snapshot_by_id.lambda_handler({"pathParameters": {"school_id": school_id}}, None)),
+           random.choices(school_ids, k=args.requests + args.warmup))
+timed_case("schools_by_ids_snapshot", lambda ids: expect(snapshot_by_id.lambda_handler({"queryStringParameters": {"ids": ",".join(ids)}}, None)),
+           [random.sample(school_ids, 100) for _ in range(args.requests // 10 + args.warmup)], operations_per_call=100)
+timed_case("schools_by_district_snapshot", lambda geoid: expect(snapshot_by_district.lambda_handler({"queryStringParameters": {"district_id": geoid}}, None)),
+           random.choices(district_ids, k=args.requests + args.warmup))
+
+# Name search, one request per keystroke of a school or district name
+os.environ.update(SEARCH_INDEX_DIR=work_dir)
+search_schools = load_lambda("search-schools")
+with open(output("district_records.json")) as records_file:
+    district_names = {record["GEOID"]: record["NAME"] for record in json.load(records_file)}
+typed = []
+while len(typed) < args.requests + args.warmup:
+    school = random.choice(schools)
+    name = school["name"] if random.random() < 0.8 else district_names.get(school["district_id"], school["name"])
+    typed.extend(name[:length] for length in range(1, len(name) + 1))
+lats, lngs = random_points(len(typed))
+timed_case("search_prefix", lambda query: expect(search_schools.lambda_handler({"queryStringParameters": {"q": query}}, None)), typed)
+timed_case("search_near", lambda query: expect(search_schools.lambda_handler({"queryStringParameters": query}, None)),
+           [{"q": query, "lat": f"{lat:.6f}", "lng": f"{lng:.6f}"} for query, lat, lng in zip(typed, lats, lngs)])
+
+def nearby(query):
+    event = {"httpMethod": "GET", "headers": {"origin": get_schools_nearby.ALLOWED_ORIGINS[0]}, "queryStringParameters": query}
+    response = get_schools_nearby.lambda_handler(event, None)
+    if response["statusCode"] not in (200, 404):
+        raise RuntimeError(f"Unexpected status {response['statusCode']}: {response.get('body')}")
+
+def clear_nearby_caches():
+    get_schools_nearby.district_cache.clear()
+    get_schools_nearby.schools_cache.clear()
+    get_schools_nearby.cells_cache.clear()
+
+# The same points cold (every cache cleared before each request) and warm (after one pass over them)
+lats, lngs = random_points(args.lambda_requests)
+nearby_queries = [{"lat": f"{lat:.6f}", "lng": f"{lng:.6f}"} for lat, lng in zip(lats, lngs)]
+warmup_queries = nearby_queries[:args.warmup]
+timed_case("nearby_cold", nearby, nearby_queries, before_each=clear_nearby_caches, warmup=warmup_queries)
+timed_case("nearby_cached", nearby, nearby_queries, warmup=nearby_queries)
+
+# District lookups answered from the grid, as with LOCAL_DISTRICT_LOOKUP enabled
+from district_grid import DistrictGrid
+with open(output("district_records.json")) as records_file:
+    get_schools_nearby.district_lookup = (DistrictGrid.load(output("district_grid.bin")), json.load(records_file))
+timed_case("nearby_grid_cold", nearby, nearby_queries, before_each=clear_nearby_caches, warmup=warmup_queries)
+
+timed_case("nearby_k10", nearby, [{**query, "k": "10"} for query in nearby_queries], before_each=clear_nearby_caches,
+           warmup=[{**query, "k": "10"} for query in warmup_queries])
+
+# Response serialization of the largest district's schools
+from serialization import compress_response, dumps
+largest = max(district_ids, key=lambda geoid: sum(school["district_id"] == geoid for school in schools))
+payload = [school for school in schools if school["district_id"] == largest]
+gzip_event = {"headers": {"Accept-Encoding": "gzip"}}
+timed_case("serialization", lambda _: compress_response({"statusCode": 200, "body": dumps(payload)}, gzip_event), range(args.requests // 10 + args.warmup))
+
+mock.stop()
+
+# Save the results with enough context to tell runs apart
+run = {
+    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+    "parameters": {key: value for key, value in vars(args).items() if key not in ("work_dir", "output", "baseline")},
+    "build_seconds": build_seconds,
+    "results": results,
+}
+with open(args.output, "w") as output_file:
+    json.dump(run, output_file, indent=2)
+print(f"Results written to {args.output}")
+
+if args.baseline:
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("parameters") != run["parameters"]:
+        print("Warning: the baseline was recorded with different parameters")
+
+    regressions = []
+    for name, result in results.items():
+        for metric in args.gate.split(","):
+            previous = baseline.get("results", {}).get(name, {}).get(metric)
+            current = result[metric]
+            if previous is None or current is None or (metric in ("p95_ms", "p99_ms") and result["count"] < MIN_TAIL_SAMPLES):
+                continue
+            # Latencies regress upwards, throughput downwards
+            change = current / previous - 1 if metric != "throughput" else previous / current - 1
+            if change > args.tolerance:
+                regressions.append(f"{name} {metric}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%} against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import shapely
+
+# Import the grid from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+from district_grid import BOUNDARY, OUTSIDE, DistrictGrid
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Check that a saved and memory-mapped district grid agrees with exact containment.")
+parser.add_argument("--districts", type=int, default=60, help="Number of synthetic districts.")
+parser.add_argument("--points", type=int, default=20000, help="Number of random points looked up.")
+parser.add_argument("--max-level", type=int, default=12, help="Finest grid level built.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the districts and points.")
+args = parser.parse_args()
+
+rng = np.random.default_rng(args.seed)
+
+# Voronoi cells over a state-sized area, with some dropped to leave gaps between districts
+extent = shapely.box(-80, 38, -74, 42)
+seeds = shapely.multipoints(np.column_stack([rng.uniform(-80, -74, args.districts), rng.uniform(38, 42, args.districts)]))
+cells = shapely.intersection(shapely.get_parts(shapely.voronoi_polygons(seeds, extend_to=extent)), extent)
+geometries = cells[rng.random(len(cells)) < 0.8]
+
+# One district with a hole, so interior cells can't be taken from the bounding box alone
+hole = shapely.buffer(shapely.centroid(geometries[0]), 0.05)
+geometries[0] = shapely.difference(geometries[0], hole)
+
+# Points across the districts and their surroundings
+lats = rng.uniform(37.5, 42.5, args.points)
+lngs = rng.uniform(-80.5, -73.5, args.points)
+points = shapely.points(lngs, lats)
+
+with tempfile.TemporaryDirectory() as work_dir:
+    path = os.path.join(work_dir, "district_grid.bin")
+    built = DistrictGrid.build(geometries, args.max_level)
+    built.save(path)
+    grid = DistrictGrid.load(path)
+
+    assert (grid.max_level, grid.num_districts) == (args.max_level, len(geometries))
+    assert np.array_equal(grid.starts, built.starts)
+    assert np.array_equal(grid.ends, built.ends)
+    assert np.array_equal(grid.labels, built.labels)
+
+    # Ranges are sorted and disjoint, which the binary search relies on
+    assert np.all(grid.starts < grid.ends)
+    assert np.all(grid.ends[:-1] <= grid.starts[1:])
+
+    labels = grid.lookup_many(lats, lngs)
+    assert [grid.lookup(lat, lng) for lat, lng in zip(lats, lngs)] == labels.tolist(), "lookup() and lookup_many() disagree"
+
+    # A labelled point is inside that district, and an OUTSIDE point is in none
+    for point, label in zip(points, labels):
+        if label >= 0:
+            assert geometries[label].contains(point), f"{point} is labelled {label} but isn't inside it"
+        elif label == OUTSIDE:
+            assert not shapely.intersects(geometries, point).any(), f"{point} is labelled OUTSIDE but touches a district"
+        else:
+            assert label == BOUNDARY, f"unexpected label {label}"
+
+    # Otherwise every point falls through to the polygon test and nothing above was checked
+    resolved = np.mean(labels != BOUNDARY)
+    assert resolved > 0, "no point was resolved by the grid"
+
+print(f"District grid agrees with exact containment for {args.points} points over {len(geometries)} districts "
+      f"({resolved:.1%} resolved by the grid)")
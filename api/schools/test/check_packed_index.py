@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+from rtree import index
+
+# Import the packed index from the district service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "sagemaker-school-district"))
+from packed_index import PackedIndex
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Check that a saved and memory-mapped packed index returns the R-tree's candidates.")
+parser.add_argument("--items", type=int, default=2000, help="Number of random boxes indexed.")
+parser.add_argument("--queries", type=int, default=2000, help="Number of random query boxes.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the boxes.")
+args = parser.parse_args()
+
+rng = np.random.default_rng(args.seed)
+
+def random_boxes(count, max_size):
+    minx = rng.uniform(-125, -67, count)
+    miny = rng.uniform(25, 49, count)
+    return np.column_stack([minx, miny, minx + rng.uniform(0, max_size, count), miny + rng.uniform(0, max_size, count)])
+
+bounds = random_boxes(args.items, 2)
+
+# Points and zero-area boxes are queried like the endpoint's point lookups
+queries = np.concatenate([random_boxes(args.queries // 2, 3), random_boxes(args.queries - args.queries // 2, 0)])
+
+rtree_idx = index.Index()
+for idx, box in enumerate(bounds):
+    rtree_idx.insert(idx, tuple(box))
+
+with tempfile.TemporaryDirectory() as work_dir:
+    path = os.path.join(work_dir, "spatial_index.packed")
+    built = PackedIndex.build(bounds)
+    built.save(path)
+    loaded = PackedIndex.load(path)
+
+    assert loaded.num_items == args.items
+    assert loaded.node_size == built.node_size
+    assert loaded.level_bounds == built.level_bounds
+    assert np.array_equal(loaded.boxes, built.boxes)
+    assert np.array_equal(loaded.indices, built.indices)
+
+    # Every item is a leaf exactly once
+    assert sorted(loaded.indices[:loaded.num_items]) == list(range(args.items))
+
+    for query in queries:
+        expected = sorted(rtree_idx.intersection(tuple(query)))
+        assert sorted(built.intersection(query)) == expected, f"built index differs from the R-tree for {tuple(query)}"
+        assert sorted(loaded.intersection(query)) == expected, f"loaded index differs from the R-tree for {tuple(query)}"
+
+    # An index of one item is a single root leaf
+    single = PackedIndex.build(bounds[:1])
+    single.save(path)
+    assert PackedIndex.load(path).intersection(bounds[0]) == [0]
+
+    # Other files are rejected instead of being misread
+    with open(path, "wb") as other_file:
+        other_file.write(b"\0" * 64)
+    try:
+        PackedIndex.load(path)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a file without the packed index header was loaded")
+
+print(f"Packed index matches the R-tree for {len(queries)} queries over {args.items} boxes")
@@ -0,0 +1,146 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+
+# Import the search index from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+import school_search
+from geohash import haversine_km
+from school_search import SearchIndex, normalize, write_search_index
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Check that a written and memory-mapped search index returns what a brute-force matcher does.")
+parser.add_argument("--schools", type=int, default=400, help="Number of synthetic schools.")
+parser.add_argument("--queries", type=int, default=300, help="Number of random queries, each run with and without filters and a point.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the schools and queries.")
+args = parser.parse_args()
+
+rng = random.Random(args.seed)
+
+# Normalization the index and the brute-force matcher below both rely on
+assert normalize("St. Mary's  École-Élémentaire") == ["st", "marys", "ecole", "elementaire"]
+assert normalize("P.S. 101 (Bronx)") == ["p", "s", "101", "bronx"]
+assert normalize("  ---  ") == []
+
+FIRST = ["Lincoln", "Washington", "Jefferson", "St. Mary's", "O'Neil", "École", "Martin Luther King", "Lakeview", "Lake", "Roosevelt", "P.S. 101"]
+LAST = ["Elementary", "Middle", "High", "Academy", "Charter School", "Junior High", "Prep"]
+DISTRICTS = {f"{i:07d}": name for i, name in enumerate(["Lakeside Unified", "Hillcrest County", "Montréal Regional", "Lincoln Park", "Riverside City"])}
+STATES = ["NY", "CA", "TX", "New Mexico"]
+
+# Schools clustered within about 100 km, so searches around a point never reach MAX_RADIUS_KM
+schools = []
+for i in range(args.schools):
+    district_id = rng.choice([*DISTRICTS, None])
+    lat, lng = (None, None) if rng.random() < 0.1 else (40 + rng.uniform(-0.5, 0.5), -74 + rng.uniform(-0.5, 0.5))
+    schools.append({
+        "school_id": f"s{i}",
+        "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "district_id": district_id,
+        "district_name": DISTRICTS.get(district_id),
+        "state": rng.choice(STATES),
+        "lat": lat,
+        "lng": lng,
+    })
+documents = {school["school_id"]: json.dumps({"school_id": school["school_id"], "name": school["name"]}, separators=(",", ":")) for school in schools}
+
+def brute_force(query, limit, district_id=None, state=None, lat=None, lng=None):
+    """(school_id, distance_km or None) of the matches of a query, ranked the way search() documents."""
+    words = normalize(query)
+    if not words:
+        return []
+
+    matches = []
+    for school in schools:
+        terms = normalize(school["name"]) + normalize(school["district_name"] or "")
+        if not all(any(term.startswith(word) for term in terms) for word in words):
+            continue
+        if district_id and school["district_id"] != district_id:
+            continue
+        if state and (school["state"] or "").casefold().split() != state.casefold().split():
+            continue
+        matches.append(school)
+
+    name = lambda school: " ".join(normalize(school["name"])).encode("utf-8")
+    document = lambda school: documents[school["school_id"]].encode("utf-8")
+    if lat is not None:
+        distance = lambda school: math.inf if school["lat"] is None else haversine_km(lat, lng, school["lat"], school["lng"])
+        ranked = sorted(matches, key=lambda school: (distance(school), name(school), document(school)))
+        return [(school["school_id"], None if math.isinf(distance(school)) else distance(school)) for school in ranked[:limit]]
+
+    phrase = " ".join(words).encode("utf-8")
+    ranked = sorted(matches, key=lambda school: (not name(school).startswith(phrase), name(school), document(school)))
+    return [(school["school_id"], None) for school in ranked[:limit]]
+
+def random_query():
+    vocabulary = [word for text in FIRST + LAST + list(DISTRICTS.values()) for word in normalize(text)]
+    kind = rng.random()
+    if kind < 0.1:
+        return rng.choice(["", "zz", "'", "lincoln zz", "xyzzy"])
+    if kind < 0.3:
+        # A whole name, as typed with its punctuation
+        return rng.choice(schools)["name"]
+    words = rng.sample(vocabulary, rng.choice([1, 1, 2, 2, 3]))
+    # Keystroke prefixes of the last word, as autocomplete sends them
+    words[-1] = words[-1][:rng.randint(1, len(words[-1]))]
+    return " ".join(word.upper() if rng.random() < 0.2 else word for word in words)
+
+with tempfile.TemporaryDirectory() as work_dir:
+    path = os.path.join(work_dir, "school_search.bin")
+    write_search_index(path, [
+        (school["name"], school["district_name"], school["district_id"], school["state"], school["lat"], school["lng"], documents[school["school_id"]])
+        for school in schools
+    ], "2026-01-01T00:00:00Z")
+    index = SearchIndex(path)
+
+    assert index.version == "2026-01-01T00:00:00Z"
+    assert len(index) == len(schools)
+
+    # Every row's document reads back, and a distance is appended as valid JSON
+    assert sorted(index.document(row) for row in range(len(index))) == sorted(documents.values())
+    assert json.loads(index.document(0, 1.23456))["distance_km"] == 1.235
+
+    def search(*search_args, **kwargs):
+        results = index.search(*search_args, **kwargs)
+        return [(json.loads(index.document(row))["school_id"], distance) for row, distance in results]
+
+    def same(results, expected):
+        return len(results) == len(expected) and all(
+            school_id == expected_id and (distance is None) == (expected_distance is None)
+            and (distance is None or abs(distance - expected_distance) < 1e-9)
+            for (school_id, distance), (expected_id, expected_distance) in zip(results, expected)
+        )
+
+    checked = 0
+    for _ in range(args.queries):
+        query = random_query()
+        limit = rng.choice([1, 5, 10, 50])
+        point = (40 + rng.uniform(-0.6, 0.6), -74 + rng.uniform(-0.6, 0.6))
+        filters = {"district_id": rng.choice([*DISTRICTS, "0000099"])} if rng.random() < 0.5 else {"state": rng.choice(STATES + ["ny", "new  mexico"])}
+
+        # With every match of the rarest word ranked, results equal the brute-force ranking
+        for kwargs in ({}, filters, {"lat": point[0], "lng": point[1]}, {**filters, "lat": point[0], "lng": point[1]}):
+            expected = brute_force(query, limit, **kwargs)
+            results = search(query, limit, **kwargs)
+            assert same(results, expected), f"search({query!r}, {limit}, {kwargs}) returned {results}, expected {expected}"
+            checked += 1
+
+    # Force the scans used for common prefixes: in name order they are exact while under MAX_SCANNED_ROWS,
+    # and around a point they return the nearest matches that have coordinates
+    school_search.MAX_CANDIDATES = 0
+    for _ in range(args.queries):
+        query = random_query()
+        limit = rng.choice([1, 5, 10, 50])
+        point = (40 + rng.uniform(-0.6, 0.6), -74 + rng.uniform(-0.6, 0.6))
+
+        expected = brute_force(query, limit)
+        assert same(search(query, limit), expected), f"name scan of {query!r} differs from the brute-force ranking"
+
+        located = [match for match in brute_force(query, len(schools), lat=point[0], lng=point[1]) if match[1] is not None]
+        assert same(search(query, limit, lat=point[0], lng=point[1]), located[:limit]), f"scan around {point} for {query!r} differs"
+        checked += 2
+
+print(f"Search index matches the brute-force matcher for {checked} searches over {len(schools)} schools")
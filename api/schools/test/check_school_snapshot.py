@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+# Import the snapshot from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+from district_query import snapshot_district_json
+from school_snapshot import SchoolSnapshot, project, write_snapshot
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Check that a written and memory-mapped schools snapshot reads back every school.")
+parser.add_argument("--schools", type=int, default=3000, help="Number of synthetic schools.")
+parser.add_argument("--districts", type=int, default=40, help="Number of synthetic districts.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the schools.")
+args = parser.parse_args()
+
+rng = random.Random(args.seed)
+
+# School ids of varying length, some non-ASCII, and some schools without a district
+schools = {}
+while len(schools) < args.schools:
+    school_id = f"{rng.randrange(10 ** rng.randint(1, 12))}" + rng.choice(["", "a", "é", "-学校"])
+    district_id = None if rng.random() < 0.05 else f"{rng.randrange(args.districts):07d}"
+    document = json.dumps({"school_id": school_id, "district_id": district_id, "name": f"School {len(schools)}", "enrollment": rng.randrange(2000)},
+                          separators=(",", ":"), ensure_ascii=False)
+    schools[school_id] = (district_id, document)
+
+expected_districts = {}
+for school_id, (district_id, _) in schools.items():
+    if district_id is not None:
+        expected_districts.setdefault(district_id, []).append(school_id)
+sort_key = lambda school_id: school_id.encode("utf-8")
+
+with tempfile.TemporaryDirectory() as work_dir:
+    path = os.path.join(work_dir, "schools_snapshot.bin")
+    write_snapshot(path, ((school_id, district_id, document) for school_id, (district_id, document) in schools.items()), "2026-01-01T00:00:00Z")
+    snapshot = SchoolSnapshot(path)
+
+    assert snapshot.version == "2026-01-01T00:00:00Z"
+    assert len(snapshot) == len(schools)
+    assert snapshot.num_slots >= 2 * len(schools)
+
+    # By id: every school, and ids the snapshot doesn't have
+    for school_id, (_, document) in schools.items():
+        row = snapshot.find(school_id)
+        assert row is not None and snapshot.school_id(row) == school_id, f"{school_id} isn't found"
+        assert snapshot.get(school_id) == document, f"{school_id} reads back differently"
+    for school_id in ("", "missing", "0" * 20, "_data_version"):
+        if school_id not in schools:
+            assert snapshot.get(school_id) is None, f"{school_id!r} was never written but was found"
+
+    # District ranges: exactly the district's schools, in school_id byte order
+    for district_id, school_ids in expected_districts.items():
+        rows = snapshot.district_rows(district_id)
+        assert [snapshot.school_id(row) for row in rows] == sorted(school_ids, key=sort_key), f"district {district_id} differs"
+    assert snapshot.district_rows("no such district") == range(0)
+    assert sum(len(snapshot.district_rows(district_id)) for district_id in expected_districts) == sum(map(len, expected_districts.values()))
+
+    # rows_after: the district's rows after any school_id, whether or not the district has it
+    for district_id, school_ids in list(expected_districts.items())[:10]:
+        rows = snapshot.district_rows(district_id)
+        ordered = sorted(school_ids, key=sort_key)
+        for after in ordered + ["", "5", "99999999999999", "￿"]:
+            expected = [school_id for school_id in ordered if sort_key(school_id) > sort_key(after)]
+            assert [snapshot.school_id(row) for row in snapshot.rows_after(rows, after)] == expected, f"rows_after({after!r}) differs"
+
+    # Paging a district with cursors returns every school once, as one unpaged read does
+    district_id = max(expected_districts, key=lambda district_id: len(expected_districts[district_id]))
+    count, schools_json, next_cursor = snapshot_district_json(snapshot, district_id)
+    assert next_cursor is None and count == len(expected_districts[district_id])
+    paged, cursor = [], None
+    while True:
+        count, page_json, cursor = snapshot_district_json(snapshot, district_id, limit=7, cursor=cursor)
+        paged.extend(json.loads(page_json))
+        if cursor is None:
+            break
+    assert paged == json.loads(schools_json)
+
+    # Projections keep only the requested top-level attributes
+    school_id = next(iter(schools))
+    assert project(snapshot.get(school_id), ["name", "absent"]) == {"name": json.loads(schools[school_id][1])["name"]}
+
+    # Duplicate ids are rejected instead of shadowing one another
+    try:
+        write_snapshot(os.path.join(work_dir, "duplicate.bin"), [("a", "1", "{}"), ("a", "2", "{}")], "v")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a snapshot with a duplicate school_id was written")
+
+    # An empty snapshot opens and finds nothing
+    write_snapshot(os.path.join(work_dir, "empty.bin"), [], "v")
+    empty = SchoolSnapshot(os.path.join(work_dir, "empty.bin"))
+    assert len(empty) == 0 and empty.get("a") is None and empty.district_rows("1") == range(0)
+
+print(f"Schools snapshot reads back {len(schools)} schools in {len(expected_districts)} districts")
@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+# Import the archive format from the modules shared by the schools service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "shared"))
+from tile_archive import (
+    COMPRESSION_GZIP, ROOT_FETCH_SIZE, TILE_TYPE_MVT, TileArchiveReader, TileArchiveWriter,
+    deserialize_directory, serialize_directory, zxy_to_tile_id,
+)
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Check that a written PMTiles archive reads back every tile it was given.")
+parser.add_argument("--tiles", type=int, default=30000, help="Number of distinct tiles at the highest zoom.")
+parser.add_argument("--max-zoom", type=int, default=10, help="Highest zoom written.")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for the tiles.")
+args = parser.parse_args()
+
+rng = random.Random(args.seed)
+
+# Tile ids from the PMTiles specification and its reference implementation
+TILE_ID_FIXTURES = {
+    (0, 0, 0): 0,
+    (1, 0, 0): 1,
+    (1, 0, 1): 2,
+    (1, 1, 1): 3,
+    (1, 1, 0): 4,
+    (2, 0, 0): 5,
+    (3, 7, 0): 84,
+    (10, 511, 300): 503546,
+    (12, 3423, 1763): 19078479,
+    (20, 2 ** 20 - 1, 2 ** 20 - 1): 1099511627775,
+    (26, 2 ** 26 - 1, 0): 6004799503160660,
+}
+for (z, x, y), tile_id in TILE_ID_FIXTURES.items():
+    assert zxy_to_tile_id(z, x, y) == tile_id, f"zxy_to_tile_id({z}, {x}, {y}) is {zxy_to_tile_id(z, x, y)}, not {tile_id}"
+
+# Every zoom maps its tiles one-to-one onto the ids after those of the lower zooms
+for z in range(6):
+    base = (4 ** z - 1) // 3
+    ids = sorted(zxy_to_tile_id(z, x, y) for x in range(1 << z) for y in range(1 << z))
+    assert ids == list(range(base, base + 4 ** z)), f"zoom {z} doesn't cover its tile ids exactly once"
+
+# Directories survive serialization, including offsets that don't follow the previous entry
+entries = [(0, 0, 10, 1), (3, 10, 5, 2), (9, 100, 7, 1), (10, 15, 5, 0), (2 ** 40, 7, 3, 1)]
+assert list(zip(*deserialize_directory(serialize_directory(entries)))) == entries
+
+# Tiles to write: every tile up to zoom 2, one repeated tile over all of zoom 3 (a single run-length
+# entry), then random tiles of random sizes at the higher zooms, some sharing their content
+tiles = {}
+for z in range(3):
+    for x in range(1 << z):
+        for y in range(1 << z):
+            tiles[(z, x, y)] = f"tile {z}/{x}/{y}".encode("ascii")
+for x in range(8):
+    for y in range(8):
+        tiles[(3, x, y)] = b"ocean"
+shared = [rng.randbytes(rng.randint(1, 300)) for _ in range(50)]
+for z in range(4, args.max_zoom + 1):
+    for _ in range(args.tiles if z == args.max_zoom else 200):
+        x, y = rng.randrange(1 << z), rng.randrange(1 << z)
+        tiles[(z, x, y)] = rng.choice(shared) if rng.random() < 0.1 else rng.randbytes(rng.randint(1, 300))
+
+with tempfile.TemporaryDirectory() as work_dir:
+    path = os.path.join(work_dir, "district_tiles.pmtiles")
+    writer = TileArchiveWriter(path)
+    for tile_id, coordinates in sorted((zxy_to_tile_id(*coordinates), coordinates) for coordinates in tiles):
+        writer.add(tile_id, tiles[coordinates])
+
+    # Tiles must come in tile id order
+    try:
+        writer.add(0, b"late")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a tile added out of order was accepted")
+
+    metadata = {"name": "districts", "vector_layers": [{"id": "districts", "fields": {"GEOID": "String"}}]}
+    writer.finish(metadata, 0, args.max_zoom, (-125.0, 24.5, -66.9, 49.4))
+    assert not os.path.exists(f"{path}.data"), "the spooled tile data was left behind"
+
+    with open(path, "rb") as archive:
+        def read_range(offset, length):
+            archive.seek(offset)
+            return archive.read(length)
+
+        reader = TileArchiveReader(read_range)
+        header = reader.header
+        assert (header["min_zoom"], header["max_zoom"]) == (0, args.max_zoom)
+        assert (header["tile_compression"], header["tile_type"], header["clustered"]) == (COMPRESSION_GZIP, TILE_TYPE_MVT, 1)
+        assert header["addressed_tiles"] == len(tiles)
+        assert header["tile_contents"] == len(set(tiles.values()))
+        assert header["tile_entries"] < len(tiles), "the repeated zoom 3 tile wasn't run-length encoded"
+        assert (header["min_lon_e7"], header["max_lat_e7"]) == (-1250000000, 494000000)
+        assert reader.metadata() == metadata
+
+        # With this many entries the root only fits the first fetch by pointing at leaf directories
+        assert header["root_offset"] + header["root_length"] <= ROOT_FETCH_SIZE
+        if args.tiles >= 30000:
+            assert header["leaf_length"] > 0, "no leaf directories were written"
+
+        for (z, x, y), data in tiles.items():
+            assert reader.get_tile(z, x, y) == data, f"tile {z}/{x}/{y} reads back differently"
+
+        # Tiles that weren't written, and zooms outside the archive, are absent
+        checked = 0
+        while checked < 2000:
+            z = rng.randrange(4, args.max_zoom + 1)
+            x, y = rng.randrange(1 << z), rng.randrange(1 << z)
+            if (z, x, y) not in tiles:
+                assert reader.get_tile(z, x, y) is None, f"tile {z}/{x}/{y} was never written but was found"
+                checked += 1
+        assert reader.get_tile(args.max_zoom + 1, 0, 0) is None
+
+    print(f"PMTiles archive reads back {len(tiles)} tiles ({header['tile_entries']} entries, {header['tile_contents']} contents, "
+          f"{header['leaf_length']} bytes of leaf directories)")
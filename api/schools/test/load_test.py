@@ -0,0 +1,96 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+APP_DIR = os.path.join(SRC_DIR, "sagemaker-school-district")
+
+# Command-line argument parsing
+parser = argparse.ArgumentParser(description="Load test the district service /invocations endpoint.")
+parser.add_argument("--url", default="http://localhost:8080", help="Base URL of a running district service.")
+parser.add_argument("--workers", help="Comma-separated worker counts; starts a local gunicorn server for each one (needs S3_BUCKET and S3_KEY).")
+parser.add_argument("--requests", type=int, default=5000, help="Number of requests per run.")
+parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent client connections.")
+parser.add_argument("--batch", type=int, default=0, help="Points per request; 0 sends single-point requests.")
+args = parser.parse_args()
+
+target = urlparse(args.url)
+
+def random_body():
+    # Points across the contiguous United States
+    points = [(random.uniform(25, 49), random.uniform(-124, -67)) for _ in range(max(args.batch, 1))]
+    if args.batch:
+        return json.dumps({"points": points})
+    return json.dumps({"lat": points[0][0], "lng": points[0][1]})
+
+def send_requests(count):
+    latencies = []
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+    for _ in range(count):
+        body = random_body()
+        start = time.perf_counter()
+        connection.request("POST", "/invocations", body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f"Unexpected status {response.status}")
+        if response.getheader("Connection", "").lower() == "close":
+            connection.close()
+    connection.close()
+    return latencies
+
+def run_load():
+    per_client = [args.requests // args.concurrency] * args.concurrency
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = sorted(latency for result in executor.map(send_requests, per_client) for latency in result)
+    elapsed = time.perf_counter() - start
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.99)
+
+def wait_until_healthy(process, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=5)
+            connection.request("GET", "/ping")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become healthy in time")
+
+print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+for workers in (args.workers.split(",") if args.workers else [None]):
+    server = None
+    if workers:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"{target.hostname}:{target.port or 80}", "app:app"],
+            cwd=APP_DIR,
+            env={**os.environ, "WORKERS": workers, "PYTHONPATH": os.path.join(SRC_DIR, "shared")},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        if server:
+            wait_until_healthy(server)
+        rps, p50, p99 = run_load()
+        print(f"{workers or '-':>8} {rps:>10.0f} {p50:>8.1f} {p99:>8.1f}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()